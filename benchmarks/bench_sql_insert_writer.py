@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for `sql_insert_writer` generation throughput and introspection.
+
+Runs each workload several times against a scratch SQLite database, and
+against PostgreSQL too if `$BENCHMARK_POSTGRES_URL` is set (its tables are
+created and dropped).  Each workload's time is split into looking up table
+metadata (`col_data`) and rendering SQL from it (`render`).
+
+The phases are timed separately, so each workload calls the functions
+behind the `generate_*` entry points, `InsertWriter.col_data_for_tables()`
+and then `render_from_tables()`, `iter_render_from_values()` or
+`batch.render_batch()`, rather than the entry points themselves.  Connecting
+to the database is not included in either phase.
+
+    $ python benchmarks/bench_sql_insert_writer.py --json before.json
+    $ python benchmarks/bench_sql_insert_writer.py --compare before.json
+
+Results are the best of `--repeat` runs, which is the most stable measure
+from one run to the next.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+
+import sqlalchemy
+
+from sql_insert_writer import batch
+from sql_insert_writer.joins import JoinConditionWarning
+from sql_insert_writer.sql_insert_writer import (InsertWriter,
+                                                 iter_render_from_values,
+                                                 render_from_tables)
+
+WIDE_COLUMNS = 1000
+MERGE_SOURCES = 20
+MANY_TUPLES = 100000
+BATCH_TABLES = 1000
+
+
+def table_definitions():
+    """CREATE TABLE statements for every workload"""
+
+    wide_columns = ', '.join('col{} text'.format(i)
+                             for i in range(WIDE_COLUMNS))
+    yield 'CREATE TABLE bench_wide_dest (id integer, {})'.format(wide_columns)
+    yield 'CREATE TABLE bench_wide_src (id integer, {})'.format(wide_columns)
+
+    merge_columns = ', '.join('col{} text'.format(i)
+                              for i in range(MERGE_SOURCES * 5))
+    yield 'CREATE TABLE bench_merge_dest ({})'.format(merge_columns)
+    for source in range(MERGE_SOURCES):
+        source_columns = ', '.join('col{} text'.format(i) for i in
+                                   range(source * 5, source * 5 + 5))
+        yield 'CREATE TABLE bench_merge_src{} ({})'.format(
+            source, source_columns)
+
+    for table in range(BATCH_TABLES):
+        yield ('CREATE TABLE bench_batch{} (id integer, name text, '
+               'kg numeric, born date)'.format(table))
+
+
+def table_names():
+    return [definition.split()[2] for definition in table_definitions()]
+
+
+def create_tables(db_url):
+    engine = sqlalchemy.create_engine(db_url)
+    with engine.begin() as conn:
+        for definition in table_definitions():
+            conn.execute(definition)
+    engine.dispose()
+
+
+def drop_tables(db_url):
+    engine = sqlalchemy.create_engine(db_url)
+    with engine.begin() as conn:
+        for table_name in table_names():
+            conn.execute('DROP TABLE IF EXISTS {}'.format(table_name))
+    engine.dispose()
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return (time.perf_counter() - start, result)
+
+
+def run_workload(db_url, destination_jobs, render):
+    """Times fetching metadata for `destination_jobs`, then rendering it"""
+
+    writer = InsertWriter(db_url)
+    try:
+        (col_data_time, columns) = timed(lambda: writer.col_data_for_tables(
+            batch.job_table_names(destination_jobs)))
+        (render_time, _) = timed(lambda: render(db_url, columns))
+    finally:
+        writer.close()
+    return {'col_data': col_data_time, 'render': render_time}
+
+
+def render_tables(destination, sources):
+    def render(db_url, columns):
+        # The sources have no foreign keys; their JOINs are left to fill in,
+        # and the warnings saying so would bury the report
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', JoinConditionWarning)
+            return render_from_tables(db_url, destination, sources, columns,
+                                      type_cast=True)
+    return render
+
+
+def render_values(db_url, columns):
+    for chunk in iter_render_from_values(db_url, 'bench_batch0', columns,
+                                         number_of_tuples=MANY_TUPLES):
+        pass
+
+
+WORKLOADS = {
+    'wide_table': lambda: (
+        [('bench_wide_dest', ['bench_wide_src'])],
+        render_tables('bench_wide_dest', ['bench_wide_src'])),
+    'many_sources': lambda: (
+        [('bench_merge_dest', ['bench_merge_src{}'.format(i)
+                               for i in range(MERGE_SOURCES)])],
+        render_tables('bench_merge_dest', ['bench_merge_src{}'.format(i)
+                                           for i in range(MERGE_SOURCES)])),
+    'many_tuples': lambda: (
+        [('bench_batch0', [])],
+        render_values),
+    'batch': lambda: (
+        [('bench_batch{}'.format(i), []) for i in range(BATCH_TABLES)],
+        lambda db_url, columns: list(batch.render_batch(
+            db_url, [('bench_batch{}'.format(i), [])
+                     for i in range(BATCH_TABLES)], columns))),
+}
+
+
+def benchmark(db_url, repeat):
+    results = {}
+    for (name, workload) in sorted(WORKLOADS.items()):
+        (jobs, render) = workload()
+        runs = [run_workload(db_url, jobs, render) for _ in range(repeat)]
+        results[name] = {phase: {'best': min(run[phase] for run in runs),
+                                 'median': statistics.median(
+                                     run[phase] for run in runs)}
+                         for phase in ('col_data', 'render')}
+    return results
+
+
+def report(results, baseline=None):
+    print('{:<24} {:<10} {:>10} {:>10} {:>9}'.format(
+        'workload', 'phase', 'best (s)', 'median (s)', 'vs base'))
+    for (database, workloads) in sorted(results.items()):
+        for (name, phases) in sorted(workloads.items()):
+            for (phase, timing) in sorted(phases.items()):
+                comparison = ''
+                try:
+                    before = baseline[database][name][phase]['best']
+                    comparison = '{:.2f}x'.format(timing['best'] / before)
+                except (KeyError, TypeError, ZeroDivisionError):
+                    pass
+                print('{:<24} {:<10} {:>10.4f} {:>10.4f} {:>9}'.format(
+                    '{}/{}'.format(database, name), phase, timing['best'],
+                    timing['median'], comparison))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Runs of each workload (default 5)')
+    parser.add_argument('--json', help='Save results to this file')
+    parser.add_argument('--compare', help='Compare with results saved earlier')
+    args = parser.parse_args(argv)
+
+    databases = {}
+    sqlite_file = tempfile.NamedTemporaryFile(suffix='.sqlite', delete=False)
+    sqlite_file.close()
+    databases['sqlite'] = 'sqlite:///' + sqlite_file.name
+    if os.environ.get('BENCHMARK_POSTGRES_URL'):
+        databases['postgresql'] = os.environ['BENCHMARK_POSTGRES_URL']
+
+    results = {}
+    try:
+        for (database, db_url) in sorted(databases.items()):
+            drop_tables(db_url)
+            create_tables(db_url)
+            try:
+                results[database] = benchmark(db_url, args.repeat)
+            finally:
+                drop_tables(db_url)
+    finally:
+        os.unlink(sqlite_file.name)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as infile:
+            baseline = json.load(infile)
+    report(results, baseline)
+    if args.json:
+        with open(args.json, 'w') as outfile:
+            json.dump(results, outfile, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""Generates INSERT statements for many destination tables at once."""
+
+import os
+
+from sql_insert_writer.matching import ColumnIndex
+from sql_insert_writer.sql_insert_writer import (InsertWriter,
+                                                 iter_render_from_values,
+                                                 render_from_tables)
+
+
+def read_manifest(lines):
+    """
+    Parses a batch manifest into a list of (destination, sources) jobs
+
+    Each line names a destination table, followed by any source tables,
+    separated by whitespace.  Blank lines and `#` comments are ignored.
+
+    >>> read_manifest(['# copy pets', 'pet animal species', '', 'animal'])
+    [('pet', ['animal', 'species']), ('animal', [])]
+    """
+
+    jobs = []
+    for line in lines:
+        table_names = line.split('#')[0].split()
+        if table_names:
+            jobs.append((table_names[0], table_names[1:]))
+    return jobs
+
+
+def job_table_names(jobs):
+    """Names of all the tables in (destination, sources) `jobs`, in order"""
+
+    table_names = []
+    for (destination, sources) in jobs:
+        table_names.append(destination)
+        table_names.extend(sources)
+    return table_names
+
+
+def joined_table_names(jobs):
+    """Names of the source tables of `jobs` with more than one, which are
+    JOINed, in order
+
+    >>> joined_table_names([('pet', ['animal', 'species']), ('owner', ['p'])])
+    ['animal', 'species']
+    """
+
+    return [table_name for (_, sources) in jobs if len(sources) > 1
+            for table_name in sources]
+
+
+def render_batch(db_url,
+                 jobs,
+                 columns,
+                 qualify=False,
+                 type_cast=False,
+                 foreign_keys=None,
+                 match_threshold=None):
+    """
+    Renders an INSERT statement for each of several destination tables.
+
+    Args:
+        db_url (str): Database URL in SQLAlchemy format; used only for dialect
+        jobs (list): (destination, sources) pairs; a destination without
+            sources gets an `INSERT INTO... VALUES` statement
+        columns (dict): Table name: column metadata, as from `col_data()`,
+            for every table in `jobs`
+        qualify (bool): Qualify column names with table name even if only
+            one table
+        type_cast (bool): Cast values to destination data type where needed
+        foreign_keys (dict): Table name: list of `ForeignKey`, as from
+            `keys.foreign_keys()`, for JOINed sources; fills JOIN conditions
+        match_threshold (float): If given, also match source columns named
+            only approximately like destination columns; see
+            `match_source_columns()`
+
+    Yields:
+        tuple: (destination, SQL statement) for each job, in order
+    """
+
+    column_index = None
+    if match_threshold is not None:
+        # One index for the whole batch, however many jobs share a source
+        column_index = ColumnIndex(
+            columns[table_name] for table_name in
+            sorted(set(table_name for (_, sources) in jobs
+                       for table_name in sources)))
+    for (destination, sources) in jobs:
+        if sources:
+            result = render_from_tables(db_url=db_url,
+                                        destination=destination,
+                                        sources=sources,
+                                        columns=columns,
+                                        qualify=qualify,
+                                        type_cast=type_cast,
+                                        foreign_keys=foreign_keys,
+                                        match_threshold=match_threshold,
+                                        column_index=column_index)
+        else:
+            result = ''.join(iter_render_from_values(db_url=db_url,
+                                                     destination=destination,
+                                                     columns=columns,
+                                                     type_cast=type_cast))
+        yield (destination, result)
+
+
+def generate_batch(db_url,
+                   jobs,
+                   qualify=False,
+                   type_cast=False,
+                   cache=None,
+                   schema=None,
+                   concurrency=1,
+                   match_threshold=None):
+    """
+    Generates an INSERT statement for each of several destination tables.
+
+    Metadata for every table named in `jobs` is fetched up front, over a
+    single connection, and shared by all the statements.
+
+    Args:
+        db_url (str): Database URL in SQLAlchemy format
+        jobs (list): (destination, sources) pairs; a destination without
+            sources gets an `INSERT INTO... VALUES` statement
+        qualify (bool): Qualify column names with table name even if only
+            one table
+        type_cast (bool): Cast values to destination data type where needed
+        cache (SchemaCache): Cache of column metadata to consult first
+        schema (Schema): Metadata to use instead of connecting to a database;
+            `db_url` may then be omitted
+        concurrency (int): Number of tables to query metadata for at once;
+            see `InsertWriter`
+        match_threshold (float): If given, also match source columns named
+            only approximately like destination columns; see
+            `match_source_columns()`
+
+    Yields:
+        tuple: (destination, SQL statement) for each job, in order
+    """
+
+    with InsertWriter(db_url, cache=cache, schema=schema,
+                      concurrency=concurrency) as writer:
+        columns = writer.col_data_for_tables(job_table_names(jobs))
+        foreign_keys = writer.foreign_keys_for_tables(joined_table_names(jobs))
+    return render_batch(db_url=writer.db_url,
+                        jobs=jobs,
+                        columns=columns,
+                        qualify=qualify,
+                        type_cast=type_cast,
+                        foreign_keys=foreign_keys,
+                        match_threshold=match_threshold)
+
+
+def batch_file_names(destinations):
+    """
+    File names for statements inserting into each of `destinations`, in
+    order
+
+    Files are named for the destination table; a name already used gets
+    `_2`, or the next unused number, so no two statements share a file.
+
+    >>> batch_file_names(['pet', 'owner', 'pet'])
+    ['pet.sql', 'owner.sql', 'pet_2.sql']
+    >>> batch_file_names(['pet', 'pet', 'pet_2'])
+    ['pet.sql', 'pet_2.sql', 'pet_2_2.sql']
+    """
+
+    file_names = []
+    used = set()
+    for destination in destinations:
+        file_name = destination
+        number = 1
+        while file_name in used:
+            number += 1
+            file_name = '{}_{}'.format(destination, number)
+        used.add(file_name)
+        file_names.append(file_name + '.sql')
+    return file_names
+
+
+def write_statement(path, sql):
+    """Writes one statement to the file at `path`"""
+
+    with open(path, 'w') as outfile:
+        outfile.write(sql + ';\n')
+
+
+def write_batch(results, output_dir):
+    """
+    Writes each of `generate_batch`'s statements to its own file, named as
+    by `batch_file_names()`, like `pet.sql`
+
+    Returns:
+        list: Paths of the files written
+    """
+
+    results = list(results)
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    file_names = batch_file_names(destination for (destination, _) in results)
+    for ((_, sql), file_name) in zip(results, file_names):
+        path = os.path.join(output_dir, file_name)
+        write_statement(path, sql)
+        paths.append(path)
+    return paths
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""On-disk cache of table column metadata."""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from sql_insert_writer.metadata import Table
+
+DEFAULT_TTL = 60 * 60 * 24  # seconds
+
+# Files written in any other format are ignored, and soon overwritten
+CACHE_FORMAT = 2
+
+
+def default_cache_dir():
+    """Directory for cache files; honors $XDG_CACHE_HOME"""
+    base = (os.environ.get('XDG_CACHE_HOME') or
+            os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(base, 'sql_insert_writer')
+
+
+class SchemaCache(object):
+    """
+    Keeps the column metadata returned by `col_data()` on disk between runs.
+
+    One JSON file is kept per database URL, named for a hash of the URL
+    so that passwords do not end up in file names.
+
+    Args:
+        directory (str): Where to keep cache files; defaults to
+            `$XDG_CACHE_HOME/sql_insert_writer`
+        ttl (float): Seconds before a cached table is considered stale;
+            None to never expire
+    """
+
+    def __init__(self, directory=None, ttl=DEFAULT_TTL):
+        self.directory = directory or default_cache_dir()
+        self.ttl = ttl
+
+    def _path(self, db_url):
+        digest = hashlib.sha1(db_url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest + '.json')
+
+    def _load(self, db_url):
+        try:
+            with open(self._path(db_url)) as infile:
+                contents = json.load(infile)
+        except (IOError, ValueError):  # missing or corrupt file
+            return {}
+        if contents.get('format') != CACHE_FORMAT:
+            return {}
+        return contents['tables']
+
+    def _save(self, db_url, entries):
+        os.makedirs(self.directory, exist_ok=True)
+        (handle, temp_path) = tempfile.mkstemp(dir=self.directory,
+                                               suffix='.tmp')
+        with os.fdopen(handle, 'w') as outfile:
+            json.dump({'format': CACHE_FORMAT, 'tables': entries}, outfile)
+        os.replace(temp_path, self._path(db_url))
+
+    def _fresh(self, entry):
+        if self.ttl is None:
+            return True
+        return (time.time() - entry['fetched']) < self.ttl
+
+    def get(self, db_url, table_names):
+        """
+        Returns dict of table name: cached columns
+
+        Tables not cached, or cached longer ago than `ttl`, are omitted.
+        """
+
+        entries = self._load(db_url)
+        result = {}
+        for table_name in table_names:
+            entry = entries.get(table_name)
+            if entry and self._fresh(entry):
+                result[table_name] = Table.from_rows(table_name,
+                                                     entry['columns'])
+        return result
+
+    def put(self, db_url, col_data_by_table):
+        """Stores dict of table name: `Table`, as returned by `col_data()`"""
+
+        entries = self._load(db_url)
+        now = time.time()
+        for (table_name, columns) in col_data_by_table.items():
+            entries[table_name] = {
+                'fetched': now,
+                'columns': columns.to_rows()
+            }
+        self._save(db_url, entries)
+
+    def invalidate(self, db_url, table_names=None):
+        """Forgets cached metadata for `table_names`, or for all of `db_url`"""
+
+        if table_names is None:
+            try:
+                os.remove(self._path(db_url))
+            except OSError:
+                pass
+            return
+        entries = self._load(db_url)
+        for table_name in table_names:
+            entries.pop(table_name, None)
+        self._save(db_url, entries)
@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+"""
+Decides which columns of an `INSERT INTO... SELECT FROM` need casting, by
+sampling the source tables' values.
+
+Declared types are first sorted into families.  Where the database converts
+between two types on its own (as from `integer` to `bigint`, or anything to
+`text`), no cast is needed.  Where it cannot, as from `text` to `date`, the
+column is cast.  Either way, a sample of the source values is checked, and
+columns with values that will not convert are flagged.  Types outside the
+known families are cast, as `--cast` always has.
+"""
+
+import re
+import time
+from collections import OrderedDict, namedtuple
+from datetime import date, datetime
+from datetime import time as time_of_day
+from decimal import Decimal, InvalidOperation
+
+from sql_insert_writer.sql_insert_writer import (PG_TABLE_OID,
+                                                 db_engine_name,
+                                                 merge_source_columns)
+
+DEFAULT_SAMPLE_SIZE = 1000
+
+DEFAULT_TIME_BUDGET = 5.0  # seconds
+
+# What sampling found out about one destination column's source values
+CastAdvice = namedtuple('CastAdvice', ['column_name', 'source_table_name',
+                                       'source_column_name', 'source_type',
+                                       'data_type', 'cast', 'sampled',
+                                       'failures', 'example'])
+
+TYPE_FAMILIES = {
+    'integer': ('smallint', 'integer', 'int', 'bigint', 'tinyint',
+                'mediumint', 'int2', 'int4', 'int8', 'smallserial', 'serial',
+                'bigserial'),
+    'decimal': ('numeric', 'decimal', 'real', 'double precision', 'double',
+                'float', 'float4', 'float8'),
+    'text': ('text', 'character varying', 'varchar', 'character', 'char',
+             'nchar', 'nvarchar', 'clob', 'tinytext', 'mediumtext',
+             'longtext'),
+    'boolean': ('boolean', 'bool'),
+    'date': ('date', ),
+    'timestamp': ('timestamp', 'timestamp without time zone',
+                  'timestamp with time zone', 'timestamptz', 'datetime'),
+    'time': ('time', 'time without time zone', 'time with time zone'),
+}
+
+FAMILY_OF_TYPE = {type_name: family
+                  for (family, type_names) in TYPE_FAMILIES.items()
+                  for type_name in type_names}
+
+# (source family, destination family) pairs the database converts by itself
+IMPLICIT_CONVERSIONS = {('integer', 'decimal'), ('decimal', 'integer'),
+                        ('date', 'timestamp'), ('timestamp', 'date')}
+
+INTEGER_LIMITS = {'smallint': 2 ** 15, 'int2': 2 ** 15, 'smallserial': 2 ** 15,
+                  'integer': 2 ** 31, 'int': 2 ** 31, 'int4': 2 ** 31,
+                  'serial': 2 ** 31}
+
+INTEGER_PATTERN = re.compile(r'^\s*[+-]?\d+\s*$')
+DATE_PATTERN = re.compile(r'^\s*(\d{4})-(\d{1,2})-(\d{1,2})')
+TIMESTAMP_PATTERN = re.compile(
+    r'^\s*\d{4}-\d{1,2}-\d{1,2}([ T]\d{1,2}:\d{2}(:\d{2}(\.\d+)?)?)?'
+    r'\s*(Z|[+-]\d{2}(:?\d{2})?)?\s*$')
+TIME_PATTERN = re.compile(r'^\s*\d{1,2}:\d{2}(:\d{2}(\.\d+)?)?\s*$')
+BOOLEAN_WORDS = {'t', 'tr', 'tru', 'true', 'y', 'ye', 'yes', 'on', '1',
+                 'f', 'fa', 'fal', 'fals', 'false', 'n', 'no', 'off', '0'}
+
+
+def type_family(data_type):
+    """
+    Family of a declared data type, or None if unknown
+
+    >>> type_family('character varying(20)')
+    'text'
+    >>> type_family('USER-DEFINED') is None
+    True
+    """
+
+    return FAMILY_OF_TYPE.get(data_type.split('(')[0].strip().lower())
+
+
+def valid_integer(value, data_type):
+    if isinstance(value, str):
+        if not INTEGER_PATTERN.match(value):
+            return False
+        number = int(value)
+    else:
+        try:
+            number = round(Decimal(value))
+        except (InvalidOperation, TypeError, ValueError, OverflowError):
+            return False
+    limit = INTEGER_LIMITS.get(data_type.split('(')[0].strip().lower(),
+                               2 ** 63)
+    return -limit <= number < limit
+
+
+def valid_decimal(value, data_type):
+    try:
+        Decimal(value.strip() if isinstance(value, str) else value)
+    except (InvalidOperation, TypeError, ValueError):
+        return False
+    return True
+
+
+def valid_date_text(value):
+    match = DATE_PATTERN.match(value)
+    if not match:
+        return False
+    try:
+        date(*(int(part) for part in match.groups()))
+    except ValueError:
+        return False
+    return True
+
+
+def valid_date(value, data_type):
+    if isinstance(value, date):
+        return True
+    return (isinstance(value, str) and valid_date_text(value) and
+            TIMESTAMP_PATTERN.match(value) is not None)
+
+
+def valid_timestamp(value, data_type):
+    return valid_date(value, data_type)
+
+
+def valid_time(value, data_type):
+    if isinstance(value, (time_of_day, datetime)):
+        return True
+    return isinstance(value, str) and TIME_PATTERN.match(value) is not None
+
+
+def valid_boolean(value, data_type):
+    # MySQL's BOOLEAN is TINYINT(1), and SQLite has none, so any integer
+    # would be stored; only 0 and 1 read back as booleans
+    if isinstance(value, (bool, int)):
+        return value in (0, 1)
+    return (isinstance(value, str) and
+            value.strip().lower() in BOOLEAN_WORDS)
+
+
+def valid_boolean_postgresql(value, data_type):
+    # `int::boolean` takes any integer, nonzero being true
+    if isinstance(value, int):
+        return True
+    return valid_boolean(value, data_type)
+
+
+validators = {
+    'integer': valid_integer,
+    'decimal': valid_decimal,
+    'date': valid_date,
+    'timestamp': valid_timestamp,
+    'time': valid_time,
+    'boolean': valid_boolean,
+}
+
+# Dialect: type family: validator, where the dialect converts other values
+dialect_validators = {
+    'postgresql': {'boolean': valid_boolean_postgresql},
+}
+
+
+def validator_for(db_type, data_type):
+    """
+    Function checking whether a value converts to `data_type` in `db_type`,
+    or None if values of that type are not checked
+
+    >>> validator_for('postgresql', 'boolean')(2, 'boolean')
+    True
+    >>> validator_for('mysql', 'boolean')(2, 'boolean')
+    False
+    """
+
+    family = type_family(data_type)
+    return dialect_validators.get(db_type, {}).get(family,
+                                                   validators.get(family))
+
+
+def needs_cast(source_type, data_type):
+    """
+    Whether a value of `source_type` must be cast to be inserted into a
+    column of `data_type`
+
+    >>> needs_cast('integer', 'bigint')
+    False
+    >>> needs_cast('text', 'date')
+    True
+    """
+
+    if source_type == data_type:
+        return False
+    (source_family, family) = (type_family(source_type),
+                               type_family(data_type))
+    if source_family is None or family is None:
+        return True
+    return not (source_family == family or family == 'text' or
+                (source_family, family) in IMPLICIT_CONVERSIONS)
+
+
+def sample_rows_postgresql(db, table_name, column_names, sample_size):
+    """Samples rows with `TABLESAMPLE`, reading only some of the table's
+    pages, when the planner's row estimate makes that worthwhile"""
+
+    qry = '''SELECT c.reltuples AS estimate
+             FROM (SELECT CAST(:table_name AS text) AS table_name) AS n
+             JOIN pg_catalog.pg_class c ON (c.oid = {})'''.format(
+        PG_TABLE_OID)
+    rows = db.query(qry, table_name=table_name).all()
+    estimate = rows[0].estimate if rows else 0
+    sample_clause = ''
+    if estimate > sample_size * 2:
+        # Pages are sampled whole, so ask for twice the rows needed
+        sample_clause = ' TABLESAMPLE SYSTEM ({:.6f})'.format(
+            100.0 * sample_size * 2 / estimate)
+    qry = 'SELECT {} FROM {}{} LIMIT :sample_size'.format(
+        ', '.join(column_names), table_name, sample_clause)
+    return db.query(qry, sample_size=sample_size)
+
+
+def sample_rows_limit(db, table_name, column_names, sample_size):
+    """Samples the first rows a scan comes upon"""
+
+    qry = 'SELECT {} FROM {} LIMIT :sample_size'.format(
+        ', '.join(column_names), table_name)
+    return db.query(qry, sample_size=sample_size)
+
+
+sample_functions = {
+    'postgresql': sample_rows_postgresql,
+    'sqlite': sample_rows_limit,
+    'mysql': sample_rows_limit,
+}
+
+
+def infer_casts(db,
+                destination,
+                sources,
+                columns,
+                sample_size=DEFAULT_SAMPLE_SIZE,
+                time_budget=DEFAULT_TIME_BUDGET,
+                source_columns=None):
+    """
+    Decides which destination columns need their source values cast.
+
+    Source tables are sampled one at a time, in order, each once for all
+    of its columns worth checking; once `time_budget` is spent, the
+    remaining tables are not sampled.
+
+    Args:
+        db: A `records.Database`, or stand-in
+        destination (str): Name of table to INSERT into
+        sources (list): Names of tables to select from, in order of preference
+        columns (dict): Table name: `Table`, as from `col_data()`, for the
+            destination and all sources
+        sample_size (int): Most rows to sample from each source table
+        time_budget (float): Seconds to spend sampling, checked between tables
+        source_columns (dict): Result of `merge_source_columns()` or
+            `match_source_columns()`, if already computed
+
+    Returns:
+        OrderedDict: Destination column name: `CastAdvice`, for each column
+            with a source column of another type
+    """
+
+    db_type = db_engine_name(db.db_url)
+    sample_function = sample_functions.get(db_type)
+    if not sample_function:
+        raise NotImplementedError('{} not supported'.format(db_type))
+
+    if source_columns is None:
+        source_columns = merge_source_columns(sources, columns)
+    advice = OrderedDict()
+    for dest_col in columns[destination]:
+        source_col = source_columns.get(dest_col.column_name)
+        if source_col and source_col.data_type != dest_col.data_type:
+            advice[dest_col.column_name] = CastAdvice(
+                column_name=dest_col.column_name,
+                source_table_name=source_col.table_name,
+                source_column_name=source_col.column_name,
+                source_type=source_col.data_type,
+                data_type=dest_col.data_type,
+                cast=needs_cast(source_col.data_type, dest_col.data_type),
+                sampled=0, failures=0, example=None)
+
+    start = time.perf_counter()
+    for table_name in sources:
+        checked = [item for item in advice.values()
+                   if item.source_table_name == table_name and
+                   type_family(item.data_type) in validators]
+        if not checked:
+            continue
+        if time.perf_counter() - start >= time_budget:
+            break
+        rows = sample_function(
+            db, table_name, [item.source_column_name for item in checked],
+            sample_size).all()
+        for item in checked:
+            validator = validator_for(db_type, item.data_type)
+            values = [getattr(row, item.source_column_name) for row in rows]
+            failed = [value for value in values if value is not None and
+                      not validator(value, item.data_type)]
+            advice[item.column_name] = item._replace(
+                sampled=len(values), failures=len(failed),
+                example=failed[0] if failed else None)
+    return advice
+
+
+def example_text(value, length=40):
+    """
+    A value, shortened for a one-line comment
+
+    >>> example_text('x' * 50)
+    "'xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx...'"
+    """
+
+    text = repr(value)
+    if len(text) > length + 2:
+        text = text[:length + 1] + '...' + text[-1]
+    return text
+
+
+def cast_plan(advice):
+    """
+    What to render, given `infer_casts()`'s advice
+
+    Returns:
+        tuple: (cast_columns, notes): the set of destination columns to
+            cast, and dict of destination column name: note on the values
+            that will not convert, for `render_from_tables()`
+    """
+
+    cast_columns = set(item.column_name for item in advice.values()
+                       if item.cast)
+    notes = {item.column_name: '{} of {} sampled values will not convert, '
+                               'like {}'.format(item.failures, item.sampled,
+                                                example_text(item.example))
+             for item in advice.values() if item.failures}
+    return (cast_columns, notes)
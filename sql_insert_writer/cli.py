@@ -1,13 +1,27 @@
 # -*- coding: utf-8 -*-
 """Console script for sql_insert_writer."""
 
+import os
+import warnings
+
 import click
-from sql_insert_writer import sql_insert_writer
+from sql_insert_writer import (batch, casts, data, matching, migration,
+                               parameterized, partition, sql_insert_writer)
+from sql_insert_writer.cache import DEFAULT_TTL, SchemaCache
+from sql_insert_writer.explain import describe_estimate, describe_outcome
+from sql_insert_writer.incremental import watch as watch_outputs
+from sql_insert_writer.profiling import Profiler
+from sql_insert_writer.schema import Schema, load_schema
+from sql_insert_writer.server import ServerError, send_request
+from sql_insert_writer.server import serve as run_server
+from sql_insert_writer.shards import (DEFAULT_WORKERS, display_url,
+                                      generate_for_shards, read_shard_list,
+                                      shard_report)
 
 
 @click.command()
 @click.version_option()
-@click.argument('destination')
+@click.argument('destination', required=False)
 @click.argument('sources', nargs=-1)
 @click.option('-d', '--db',
               envvar='DATABASE_URL',
@@ -22,24 +36,563 @@ from sql_insert_writer import sql_insert_writer
 @click.option('--cast/--no-cast',
               default=False,
               help='CAST values as destination data type')
-def main(destination, sources, db, tuples, qualify, cast):
+@click.option('--sample-casts',
+              is_flag=True,
+              help='Like --cast, but sample the source tables first, casting '
+                   'only columns that need it and flagging values that will '
+                   'not convert')
+@click.option('--sample-size',
+              type=click.IntRange(min=1),
+              default=casts.DEFAULT_SAMPLE_SIZE,
+              help='With --sample-casts, most rows to sample from each source')
+@click.option('--sample-seconds',
+              type=float,
+              default=casts.DEFAULT_TIME_BUDGET,
+              help='With --sample-casts, seconds to spend sampling before '
+                   'casting the remaining columns unchecked')
+@click.option('--approximate',
+              is_flag=True,
+              help='Also select source columns named only like destination '
+                   'columns, as cust_id for customer_id; comments show how '
+                   'closely each matched')
+@click.option('--match-threshold',
+              type=float,
+              default=matching.DEFAULT_THRESHOLD,
+              help='With --approximate, lowest confidence, from 0 to 1, to '
+                   'accept a match at')
+@click.option('--cache/--no-cache',
+              default=False,
+              help='Keep table metadata in an on-disk cache between runs')
+@click.option('--cache-ttl',
+              type=float,
+              default=DEFAULT_TTL,
+              help='Seconds before cached table metadata is fetched again')
+@click.option('--cache-dir',
+              envvar='SQL_INSERT_WRITER_CACHE_DIR',
+              type=click.Path(file_okay=False),
+              help='Directory for the metadata cache')
+@click.option('--refresh-schema',
+              is_flag=True,
+              help='Fetch table metadata again, updating the cache')
+@click.option('-o', '--output',
+              type=click.File('w'),
+              default='-',
+              help='File to write SQL to (default stdout)')
+@click.option('-m', '--manifest',
+              type=click.File('r'),
+              help='File listing a destination table and its source tables '
+                   'on each line; generates a statement for each line')
+@click.option('--output-dir',
+              type=click.Path(file_okay=False),
+              help='With --manifest, write each statement to its own file')
+@click.option('--schema-file',
+              type=click.Path(exists=True, dir_okay=False),
+              help='Read table definitions from this DDL script or JSON '
+                   'snapshot instead of the database')
+@click.option('--save-schema',
+              type=click.File('w'),
+              help='Save a JSON snapshot of the tables used, for '
+                   '--schema-file')
+@click.option('-j', '--concurrency',
+              type=click.IntRange(min=1),
+              default=1,
+              help='Query metadata for this many tables at once')
+@click.option('--data',
+              'data_file',
+              type=click.File('r'),
+              help='CSV or JSON lines file of rows to INSERT')
+@click.option('--data-format',
+              type=click.Choice(data.DATA_FORMATS),
+              help='Format of --data file; guessed from its name by default')
+@click.option('--batch-size',
+              type=click.IntRange(min=1),
+              default=data.DEFAULT_BATCH_SIZE,
+              help='Rows per INSERT statement, with --data')
+@click.option('--bulk-load',
+              is_flag=True,
+              help='Write a COPY (PostgreSQL) or LOAD DATA (MySQL) statement, '
+                   'or a single-transaction script (SQLite), for --data')
+@click.option('--chunks',
+              type=click.IntRange(min=1),
+              help='Split INSERT... SELECT into this many statements, each '
+                   'for a range of the first source table\'s key')
+@click.option('--chunk-key',
+              help='Column of the first source table to split --chunks on '
+                   '(default: its primary key)')
+@click.option('--partition-by',
+              type=click.Choice(partition.PARTITION_METHODS),
+              default='range',
+              help='Split --chunks by ranges of the key (default), or by '
+                   'buckets of its hash, which need no query to find')
+@click.option('--run',
+              is_flag=True,
+              help='Run the --chunks statements against the database, '
+                   'several at once, instead of writing them out')
+@click.option('--workers',
+              type=click.IntRange(min=1),
+              default=partition.DEFAULT_WORKERS,
+              help='With --run, most statements to run at once')
+@click.option('--fk-order',
+              is_flag=True,
+              help='With --manifest, order statements so each table is loaded '
+                   'after the tables its foreign keys reference, in levels '
+                   'whose statements may run concurrently')
+@click.option('--incremental',
+              is_flag=True,
+              help='With --manifest and --output-dir, rewrite only the files '
+                   'whose tables have changed since the last run')
+@click.option('--watch',
+              type=float,
+              help='Like --incremental, then check for changes again every '
+                   'this many seconds, until interrupted')
+@click.option('--shards',
+              type=click.File('r'),
+              help='File listing a database URL on each line; generates the '
+                   'statements against each, rendering once for each '
+                   'distinct set of table definitions')
+@click.option('--shard-workers',
+              type=click.IntRange(min=1),
+              default=DEFAULT_WORKERS,
+              help='With --shards, query this many databases at once')
+@click.option('--params',
+              'paramstyle',
+              type=click.Choice(parameterized.PARAMSTYLES),
+              help='Write a statement with a parameter for each column, in '
+                   'this DB-API paramstyle, for executemany(); "prepare" '
+                   'writes a PostgreSQL PREPARE statement')
+@click.option('--explain',
+              is_flag=True,
+              help='Show the database\'s plan for the INSERT... SELECT, with '
+                   'its estimated rows and cost, on stderr')
+@click.option('--analyze',
+              is_flag=True,
+              help='Like --explain, then run the statement in a transaction '
+                   'that is rolled back, reporting rows and time taken')
+@click.option('--execute',
+              is_flag=True,
+              help='Like --explain, then run and commit the statement, '
+                   'reporting rows inserted and time taken')
+@click.option('--serve',
+              type=click.Path(dir_okay=False),
+              help='Run as a server on this Unix socket, keeping connections '
+                   'and table metadata warm; --db is its default database')
+@click.option('--server',
+              type=click.Path(dir_okay=False),
+              envvar='SQL_INSERT_WRITER_SERVER',
+              help='Have the server on this Unix socket generate the SQL')
+@click.option('--profile',
+              is_flag=True,
+              help='Print time spent in each phase, and queries and rows '
+                   'fetched, to stderr')
+def main(destination, sources, db, tuples, qualify, cast, sample_casts,
+         sample_size, sample_seconds, approximate, match_threshold, cache,
+         cache_ttl, cache_dir, refresh_schema, output, manifest, output_dir,
+         schema_file, save_schema, concurrency, data_file, data_format,
+         batch_size, bulk_load, chunks, chunk_key, partition_by, run, workers,
+         fk_order, incremental, watch, shards, shard_workers, paramstyle,
+         explain, analyze, execute, serve, server, profile):
     """Console script for sql_insert_writer."""
-    if sources:
+    if serve:
+        try:
+            run_server(serve, db_url=db, concurrency=concurrency)
+        except ServerError as err:
+            raise click.ClickException(str(err))
+        return
+
+    if manifest:
+        if destination:
+            raise click.UsageError('Name tables in --manifest or as '
+                                   'arguments, not both')
         if tuples > 1:
-            raise click.BadOptionUsage('Use --tuples only when no source tables specified')
-        result = sql_insert_writer.generate_from_tables(
-            db_url=db,
-            destination=destination,
-            sources=sources,
-            qualify=qualify,
-            type_cast=cast)
+            raise click.BadOptionUsage('Use --tuples only without --manifest')
+        jobs = batch.read_manifest(manifest)
+    elif destination:
+        if sources and tuples > 1:
+            raise click.BadOptionUsage('Use --tuples only when no source '
+                                       'tables specified')
+        jobs = [(destination, list(sources)), ]
     else:
-        result = sql_insert_writer.generate_from_values(
-            db_url=db,
-            destination=destination,
-            number_of_tuples=tuples,
-            type_cast=cast)
-    click.echo(result)
+        raise click.UsageError('Missing argument "destination".')
+    if data_file and (manifest or sources or tuples > 1):
+        raise click.BadOptionUsage('Use --data only with a single '
+                                   'destination table')
+    if bulk_load and (manifest or sources or tuples > 1 or cast):
+        raise click.BadOptionUsage('Use --bulk-load only with a single '
+                                   'destination table')
+    if (chunks or chunk_key) and (manifest or not sources or schema_file):
+        raise click.BadOptionUsage('Use --chunks only with source tables and '
+                                   'a live database')
+    if sample_casts and (manifest or not sources or chunks or schema_file or
+                         shards or server):
+        raise click.BadOptionUsage('Use --sample-casts only with source '
+                                   'tables and a live database')
+    if not 0 <= match_threshold <= 1:
+        raise click.BadParameter('must be from 0 to 1',
+                                 param_hint='--match-threshold')
+    if approximate and (not (sources or manifest) or fk_order or shards or
+                        server or incremental or watch is not None):
+        raise click.BadOptionUsage('Use --approximate only for INSERT... '
+                                   'SELECT statements, without --fk-order, '
+                                   '--shards, --server, --incremental or '
+                                   '--watch')
+    if run and not chunks:
+        raise click.BadOptionUsage('Use --run only with --chunks')
+    if fk_order and (not manifest or schema_file):
+        raise click.BadOptionUsage('Use --fk-order only with --manifest and a '
+                                   'live database')
+    if paramstyle and (manifest or sources or tuples > 1 or data_file or
+                       bulk_load):
+        raise click.BadOptionUsage('Use --params only with a single '
+                                   'destination table')
+    if (explain or analyze or execute) and (manifest or not sources or
+                                            chunks or schema_file or shards or
+                                            server):
+        raise click.BadOptionUsage('Use --explain, --analyze or --execute '
+                                   'only with source tables and a live '
+                                   'database')
+    if analyze and execute:
+        raise click.BadOptionUsage('Use --analyze or --execute, not both')
+    if watch is not None and watch < 0:
+        raise click.BadParameter('must not be negative', param_hint='--watch')
+    if (incremental or watch is not None) and (
+            not output_dir or fk_order or schema_file):
+        raise click.BadOptionUsage('Use --incremental or --watch only with '
+                                   '--manifest, --output-dir and a live '
+                                   'database')
+    if shards and (tuples > 1 or data_file or bulk_load or chunks or
+                   fk_order or paramstyle or incremental or
+                   watch is not None or schema_file or save_schema or server):
+        raise click.BadOptionUsage('Use --shards only for INSERT statements '
+                                   'from live databases')
+    if output_dir and not manifest:
+        raise click.BadOptionUsage('Use --output-dir only with --manifest')
+    if (cache or refresh_schema) and not (db or shards or server):
+        raise click.BadOptionUsage('Use --cache or --refresh-schema only '
+                                   'with --db or --shards')
+
+    if server:
+        if (manifest or data_file or bulk_load or chunks or fk_order or
+                paramstyle or schema_file or save_schema or incremental or
+                watch is not None):
+            raise click.BadOptionUsage('Use --server only for a single '
+                                       'statement from a live database')
+        if cache or concurrency > 1 or profile:
+            # The server fetches metadata over its own connections
+            raise click.BadOptionUsage('Use --cache, --concurrency or '
+                                       '--profile only without --server')
+        try:
+            result = send_request(server, {'db': db,
+                                           'destination': destination,
+                                           'sources': list(sources),
+                                           'tuples': tuples,
+                                           'qualify': qualify,
+                                           'cast': cast,
+                                           'refresh': refresh_schema})
+        except (ServerError, OSError) as err:
+            raise click.ClickException(str(err))
+        click.echo(result, file=output)
+        return
+
+    db_urls = read_shard_list(shards) if shards else [db, ]
+    schema_cache = None
+    if cache or refresh_schema:
+        schema_cache = SchemaCache(directory=cache_dir, ttl=cache_ttl)
+        if refresh_schema:
+            for db_url in db_urls:
+                schema_cache.invalidate(db_url, batch.job_table_names(jobs))
+
+    schema = None
+    if schema_file:
+        # Any database URL given serves only to name the dialect
+        schema = load_schema(
+            schema_file,
+            dialect=sql_insert_writer.db_engine_name(db) if db else None)
+
+    profiler = Profiler()
+    if shards:
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            (groups, errors) = generate_for_shards(db_urls,
+                                                   jobs,
+                                                   qualify=qualify,
+                                                   type_cast=cast,
+                                                   cache=schema_cache,
+                                                   max_workers=shard_workers,
+                                                   profiler=profiler)
+        reports = shard_report(groups, len(db_urls))
+        for (number, (group, report)) in enumerate(zip(groups, reports), 1):
+            if output_dir:
+                group_dir = os.path.join(output_dir,
+                                         'output_{}'.format(number))
+                batch.write_batch(group.results, group_dir)
+                shard_list = os.path.join(group_dir, 'shards.txt')
+                with open(shard_list, 'w') as outfile:
+                    for db_url in group.db_urls:
+                        outfile.write(display_url(db_url) + '\n')
+            else:
+                click.echo(report + '\n', file=output)
+                for (_, result) in group.results:
+                    click.echo(result + ';', file=output)
+                click.echo(file=output)
+        for warning in caught:
+            click.echo('Warning: {}'.format(warning.message), err=True)
+        for (db_url, err) in errors.items():
+            click.echo('Error: {}: {}'.format(display_url(db_url), err),
+                       err=True)
+        if profile:
+            click.echo(profiler.report(), err=True)
+        if errors:
+            raise click.ClickException('{} of {} databases failed'.format(
+                len(errors), len(db_urls)))
+        return
+
+    if incremental or watch is not None:
+        with sql_insert_writer.InsertWriter(db,
+                                            cache=schema_cache,
+                                            concurrency=concurrency,
+                                            profiler=profiler) as writer:
+            passes = watch_outputs(writer, jobs, output_dir,
+                                   interval=watch,
+                                   qualify=qualify,
+                                   type_cast=cast,
+                                   force=refresh_schema,
+                                   passes=None if watch is not None else 1)
+            try:
+                for paths in passes:
+                    for path in paths:
+                        click.echo('Wrote {}'.format(path), err=True)
+            except sql_insert_writer.BadDBNameError as err:
+                raise click.ClickException(str(err))
+            except KeyboardInterrupt:
+                pass
+        if profile:
+            click.echo(profiler.report(), err=True)
+        return
+
+    # Kept open until the command finishes, to measure its statement
+    writer = sql_insert_writer.InsertWriter(db,
+                                            cache=schema_cache,
+                                            schema=schema,
+                                            concurrency=concurrency,
+                                            profiler=profiler)
+    click.get_current_context().call_on_close(writer.close)
+    columns = writer.col_data_for_tables(batch.job_table_names(jobs))
+    if save_schema:
+        Schema(dialect=sql_insert_writer.db_engine_name(writer.db_url),
+               tables=columns).write(save_schema)
+    if chunks:
+        try:
+            key = partition.choose_key(writer.db, sources[0], chunk_key)
+        except partition.NoKeyError as err:
+            raise click.BadOptionUsage(str(err))
+        if partition_by == 'range':
+            boundaries = partition.key_boundaries(writer.db, sources[0],
+                                                  key, chunks)
+    foreign_keys = writer.foreign_keys_for_tables(
+        batch.joined_table_names(jobs))
+    threshold = match_threshold if approximate else None
+    source_columns = confidences = None
+    if sources and not chunks:
+        with profiler.phase('merge'):
+            if approximate:
+                matched = sql_insert_writer.match_source_columns(
+                    destination, sources, columns, threshold)
+                (source_columns, confidences) = matched
+            else:
+                source_columns = sql_insert_writer.merge_source_columns(
+                    sources, columns)
+    cast_columns = notes = None
+    if sample_casts:
+        with profiler.phase('sample'):
+            advice = casts.infer_casts(writer.db, destination, sources,
+                                       columns, sample_size=sample_size,
+                                       time_budget=sample_seconds,
+                                       source_columns=source_columns)
+        (cast_columns, notes) = casts.cast_plan(advice)
+    if fk_order:
+        destinations = sorted(set(job[0] for job in jobs))
+        try:
+            job_levels = migration.order_jobs(
+                jobs, writer.foreign_keys_for_tables(destinations))
+        except migration.CyclicDependencyError as err:
+            raise click.UsageError(str(err))
+
+    # Warnings, like JOINs left to fill in, are shown plainly on stderr
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        if fk_order:
+            with profiler.phase('render'):
+                results = list(migration.render_migration(
+                    db_url=writer.db_url,
+                    job_levels=job_levels,
+                    columns=columns,
+                    qualify=qualify,
+                    type_cast=cast,
+                    foreign_keys=foreign_keys))
+            if output_dir:
+                batch.write_batch(
+                    migration.level_file_names(results, len(job_levels)),
+                    output_dir)
+            else:
+                for piece in migration.migration_script(results,
+                                                        len(job_levels)):
+                    click.echo(piece, file=output, nl=False)
+        elif manifest:
+            results = batch.render_batch(db_url=writer.db_url,
+                                         jobs=jobs,
+                                         columns=columns,
+                                         qualify=qualify,
+                                         type_cast=cast,
+                                         foreign_keys=foreign_keys,
+                                         match_threshold=threshold)
+            with profiler.phase('render'):
+                results = list(results)
+            profiler.count('bytes_rendered',
+                           sum(len(result) for (_, result) in results))
+            if output_dir:
+                batch.write_batch(results, output_dir)
+            else:
+                for (job_destination, result) in results:
+                    click.echo(result + ';', file=output)
+        elif chunks:
+            key_expr = partition.key_expression(sources, key, qualify)
+            if partition_by == 'hash':
+                conditions = partition.hash_conditions(key_expr, chunks,
+                                                       writer.db_url)
+            else:
+                conditions = partition.range_conditions(key_expr, boundaries,
+                                                        writer.db_url)
+            with profiler.phase('render'):
+                statements = partition.render_partitioned(
+                    db_url=writer.db_url,
+                    destination=destination,
+                    sources=sources,
+                    columns=columns,
+                    conditions=conditions,
+                    qualify=qualify,
+                    type_cast=cast,
+                    foreign_keys=foreign_keys,
+                    match_threshold=threshold)
+            for statement in statements:
+                profiler.count('bytes_rendered', len(statement))
+                if not run:
+                    click.echo(statement, file=output)
+            if run:
+                with profiler.phase('run'):
+                    parts = partition.run_partitioned(
+                        writer.db_url, statements, workers=workers,
+                        progress=lambda part: click.echo(
+                            part_progress(part, len(statements)), err=True))
+                failed = [part.number for part in parts if part.error]
+        elif bulk_load:
+            pieces = data.iter_render_bulk_load(
+                db_url=writer.db_url,
+                destination=destination,
+                columns=columns,
+                data_file=data_file,
+                data_format=data_format or data.guess_data_format(
+                    data_file.name if data_file else ''),
+                batch_size=batch_size)
+            try:
+                for chunk in profiler.iter_phase('render', pieces):
+                    click.echo(chunk, file=output, nl=False)
+            except ValueError as err:
+                raise click.UsageError(str(err))
+            except sql_insert_writer.BadDBNameError as err:
+                raise click.ClickException(str(err))
+        elif data_file:
+            rows = data.read_rows(
+                data_file,
+                data_format or data.guess_data_format(data_file.name))
+            statements = data.iter_render_from_data(db_url=writer.db_url,
+                                                    destination=destination,
+                                                    columns=columns,
+                                                    rows=rows,
+                                                    batch_size=batch_size,
+                                                    type_cast=cast)
+            try:
+                for statement in profiler.iter_phase('render', statements):
+                    click.echo(statement, file=output)
+            except (ValueError, sql_insert_writer.BadDBNameError) as err:
+                raise click.ClickException(str(err))
+        elif paramstyle:
+            with profiler.phase('render'):
+                try:
+                    result = parameterized.render_parameterized(
+                        db_url=writer.db_url,
+                        destination=destination,
+                        columns=columns,
+                        paramstyle=paramstyle,
+                        type_cast=cast)
+                except ValueError as err:
+                    raise click.BadOptionUsage(str(err))
+            profiler.count('bytes_rendered', len(result))
+            click.echo(result, file=output)
+        elif sources:
+            with profiler.phase('render'):
+                result = sql_insert_writer.render_from_tables(
+                    db_url=writer.db_url,
+                    destination=destination,
+                    sources=sources,
+                    columns=columns,
+                    qualify=qualify,
+                    type_cast=cast,
+                    source_columns=source_columns,
+                    foreign_keys=foreign_keys,
+                    cast_columns=cast_columns,
+                    notes=notes,
+                    confidences=confidences)
+            profiler.count('bytes_rendered', len(result))
+            click.echo(result, file=output)
+            for (column_name, note) in sorted((notes or {}).items()):
+                click.echo('Warning: {}: {}'.format(column_name, note),
+                           err=True)
+            if explain or analyze or execute:
+                measure(writer, result, analyze=analyze, execute=execute)
+        else:
+            # Streamed, since many --tuples make for a very large statement
+            pieces = sql_insert_writer.iter_render_from_values(
+                db_url=writer.db_url,
+                destination=destination,
+                columns=columns,
+                number_of_tuples=tuples,
+                type_cast=cast)
+            for chunk in profiler.iter_phase('render', pieces):
+                click.echo(chunk, file=output, nl=False)
+            click.echo(file=output)
+    for warning in caught:
+        click.echo('Warning: {}'.format(warning.message), err=True)
+
+    if profile:
+        click.echo(profiler.report(), err=True)
+    if run and failed:
+        raise click.ClickException('Parts {} failed; run them again'.format(
+            ', '.join(str(number) for number in failed)))
+
+
+def part_progress(part, count):
+    """One line reporting a finished `partition.PartResult`"""
+
+    if part.error:
+        return 'Part {} of {} failed after {:.2f} s: {}'.format(
+            part.number, count, part.seconds, part.error)
+    return 'Part {} of {}: {} rows in {:.2f} s'.format(
+        part.number, count, part.rowcount, part.seconds)
+
+
+def measure(writer, sql, analyze=False, execute=False):
+    """Reports `sql`'s plan on stderr, and what running it did if asked"""
+
+    from sqlalchemy.exc import DBAPIError
+    try:
+        for line in describe_estimate(writer.explain(sql)):
+            click.echo(line, err=True)
+        if analyze:
+            click.echo(describe_outcome(writer.analyze(sql)), err=True)
+        elif execute:
+            click.echo(describe_outcome(writer.execute(sql)), err=True)
+    except DBAPIError as err:
+        raise click.ClickException(str(err.orig))
 
 
 if __name__ == "__main__":
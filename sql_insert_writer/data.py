@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+"""Generates statements loading the rows of a CSV or JSON lines file."""
+
+import csv
+import json
+import math
+import os
+from decimal import Decimal
+
+from sql_insert_writer.sql_insert_writer import (INDENT, BadDBNameError,
+                                                 INSERT_FROM_VALUES_TEMPLATE,
+                                                 VALUES_TUPLE_TEMPLATE,
+                                                 InsertWriter, cast,
+                                                 db_engine_name, no_value,
+                                                 remove_last)
+
+DEFAULT_BATCH_SIZE = 100
+
+DATA_FORMATS = ('csv', 'jsonl')
+
+
+def guess_data_format(path):
+    """
+    Guesses a data file's format from its name
+
+    >>> guess_data_format('pets.ndjson')
+    'jsonl'
+    """
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.json', '.jsonl', '.ndjson'):
+        return 'jsonl'
+    return 'csv'
+
+
+def read_rows(infile, data_format='csv'):
+    """
+    Yields each row of a data file as a dict of column name: value
+
+    Args:
+        infile (file): Open data file
+        data_format (str): 'csv', with a header row naming the columns
+            (empty fields are read as NULL); or 'jsonl', one JSON object
+            per line
+    """
+
+    if data_format == 'csv':
+        for row in csv.DictReader(infile):
+            yield {key: (value if value != '' else None)
+                   for (key, value) in row.items()}
+    elif data_format == 'jsonl':
+        for line in infile:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        raise ValueError('Unknown data format {}'.format(data_format))
+
+
+def literal(value, db_url):
+    """
+    Renders a Python value as a SQL literal in `db_url`'s dialect
+
+    >>> literal("O'Hara", 'postgresql://')
+    "'O''Hara'"
+    >>> literal(2.5, 'mysql://')
+    '2.5'
+    >>> literal(True, 'sqlite://'), literal(None, 'sqlite://')
+    ('1', 'NULL')
+    >>> literal(float('-inf'), 'postgresql://')
+    "'-Infinity'"
+    """
+
+    engine_name = db_engine_name(db_url)
+    if value is None:
+        return 'NULL'
+    if isinstance(value, bool):
+        if engine_name == 'sqlite':
+            return '1' if value else '0'
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, (float, Decimal)) and not math.isfinite(value):
+        # Only PostgreSQL has literals for these, and quoted at that
+        if engine_name != 'postgresql':
+            raise ValueError('{} has no SQL literal in {}'.format(
+                value, engine_name))
+        if math.isnan(value):
+            return "'NaN'"
+        return "'Infinity'" if value > 0 else "'-Infinity'"
+    if isinstance(value, (int, float, Decimal)):
+        return str(value)
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    value = str(value).replace("'", "''")
+    if engine_name == 'mysql':  # backslash is an escape character
+        value = value.replace('\\', '\\\\')
+    return "'{}'".format(value)
+
+
+def check_fields(destination, dest_columns, row):
+    """Raises `BadDBNameError` for a key of `row` that is not a column of
+    the destination, as a misspelled header would be"""
+
+    for field in row:
+        if dest_columns.column(field) is None:
+            raise BadDBNameError('No column {} in table {}'.format(
+                field, destination))
+
+
+def render_values_tuple(db_url, dest_columns, row, type_cast=False):
+    """Renders one `row` dict as an annotated VALUES tuple"""
+
+    source_column_block = []
+    for dest_col in dest_columns:
+        if dest_col.column_name in row:
+            source_expr = literal(row[dest_col.column_name], db_url)
+        else:
+            source_expr = no_value(db_url)
+        if type_cast:
+            source_expr = cast(source_expr,
+                               new_type=dest_col.data_type,
+                               db_url=db_url)
+        source_column_block.append('{}{},  -- ==> {}'.format(
+            INDENT, source_expr, dest_col.column_name))
+    source_column_block = '\n'.join(source_column_block)
+    source_column_block = remove_last(source_column_block, ',')
+    return VALUES_TUPLE_TEMPLATE.format(
+        source_column_block=source_column_block)
+
+
+def iter_render_from_data(db_url,
+                          destination,
+                          columns,
+                          rows,
+                          batch_size=DEFAULT_BATCH_SIZE,
+                          type_cast=False):
+    """
+    Renders `INSERT INTO... VALUES` statements holding `rows`.
+
+    Rows are consumed one at a time, and at most `batch_size` are held in
+    memory, so `rows` may be arbitrarily long.
+
+    Args:
+        db_url (str): Database URL in SQLAlchemy format; used only for dialect
+        destination (str): Name of table to INSERT into
+        columns (dict): Table name: column metadata, as from `col_data()`,
+            including the destination
+        rows (iterable): Dicts of column name: value; columns of the
+            destination missing from a row get a default value; a key
+            that is not a column of the destination raises `BadDBNameError`
+        batch_size (int): Most rows in each statement
+        type_cast (bool): Cast values to destination data type
+
+    Yields:
+        str: SQL statements, each ending with `;`
+    """
+
+    dest_columns = columns[destination]
+    dest_column_block = ',\n'.join(INDENT + dest_col.column_name
+                                   for dest_col in dest_columns)
+    batch = []
+    for row in rows:
+        check_fields(destination, dest_columns, row)
+        batch.append(render_values_tuple(db_url, dest_columns, row,
+                                         type_cast))
+        if len(batch) == batch_size:
+            yield INSERT_FROM_VALUES_TEMPLATE.format(
+                destination=destination,
+                dest_column_block=dest_column_block,
+                source_column_blocks=',\n'.join(batch)) + ';'
+            batch = []
+    if batch:
+        yield INSERT_FROM_VALUES_TEMPLATE.format(
+            destination=destination,
+            dest_column_block=dest_column_block,
+            source_column_blocks=',\n'.join(batch)) + ';'
+
+
+def iter_generate_from_data(db_url,
+                            destination,
+                            rows,
+                            batch_size=DEFAULT_BATCH_SIZE,
+                            type_cast=False,
+                            cache=None,
+                            schema=None):
+    """
+    Generates `INSERT INTO... VALUES` statements holding `rows`.
+
+    Args:
+        db_url (str): Database URL in SQLAlchemy format
+        destination (str): Name of table to INSERT into
+        rows (iterable): Dicts of column name: value, as from `read_rows()`
+        batch_size (int): Most rows in each statement
+        type_cast (bool): Cast values to destination data type
+        cache (SchemaCache): Cache of column metadata to consult first
+        schema (Schema): Metadata to use instead of connecting to a database;
+            `db_url` may then be omitted
+
+    Yields:
+        str: SQL statements, each ending with `;`
+    """
+
+    with InsertWriter(db_url, cache=cache, schema=schema) as writer:
+        columns = writer.col_data_for_tables([destination, ])
+    return iter_render_from_data(db_url=writer.db_url,
+                                 destination=destination,
+                                 columns=columns,
+                                 rows=rows,
+                                 batch_size=batch_size,
+                                 type_cast=type_cast)
+
+
+COPY_TEMPLATE = '''
+COPY {destination} (
+{column_block}
+)
+FROM STDIN WITH (FORMAT csv{header_option});'''
+
+LOAD_DATA_TEMPLATE = '''
+LOAD DATA LOCAL INFILE {path}
+INTO TABLE {destination}
+FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"'
+LINES TERMINATED BY '\\n'
+{ignore_header}(
+{column_block}
+);'''
+
+
+def bulk_load_columns(destination, dest_columns, header=None):
+    """
+    Renders the annotated column list of a COPY or LOAD DATA statement
+
+    Columns are listed in the order of the data file's fields: the order of
+    `header` if given, else the destination's own column order.  Each is
+    annotated as in the INSERT statements, with its field number added.
+
+    >>> from sql_insert_writer.metadata import Table
+    >>> pet = Table.from_rows('pet', [['id', 'integer'], ['kg', 'numeric']])
+    >>> print(bulk_load_columns('pet', pet, ['id', 'kg']))
+      id,  -- ==> id (field 1)
+      kg  -- ==> kg (field 2)
+    """
+
+    if header is None:
+        column_names = [dest_col.column_name for dest_col in dest_columns]
+    else:
+        dest_column_names = {dest_col.column_name for dest_col in dest_columns}
+        for field in header:
+            if field not in dest_column_names:
+                raise BadDBNameError('No column {} in table {}'.format(
+                    field, destination))
+        column_names = header
+    column_block = ['{0}{1},  -- ==> {1} (field {2})'.format(
+        INDENT, column_name, number)
+        for (number, column_name) in enumerate(column_names, 1)]
+    return remove_last('\n'.join(column_block), ',')
+
+
+def iter_render_bulk_load(db_url,
+                          destination,
+                          columns,
+                          data_file=None,
+                          data_format='csv',
+                          batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Renders a script loading a data file through the database's bulk path.
+
+    PostgreSQL gets `COPY... FROM STDIN`, followed by the data itself if
+    `data_file` is given; MySQL gets `LOAD DATA LOCAL INFILE` naming
+    `data_file`; SQLite, which has neither, gets multi-row INSERTs of the
+    data in a single transaction.
+
+    Args:
+        db_url (str): Database URL in SQLAlchemy format; used only for dialect
+        destination (str): Name of table to load
+        columns (dict): Table name: column metadata, as from `col_data()`,
+            including the destination
+        data_file (file): Open data file; its header row names the columns
+            loaded.  Required for SQLite.
+        data_format (str): 'csv'; or, for SQLite only, 'jsonl'
+        batch_size (int): Most rows in each SQLite INSERT statement
+
+    Yields:
+        str: Successive pieces of the script
+    """
+
+    engine_name = db_engine_name(db_url)
+    dest_columns = columns[destination]
+
+    if engine_name == 'sqlite':
+        if data_file is None:
+            raise ValueError('Bulk loading into SQLite needs a data file')
+        yield 'BEGIN TRANSACTION;\n'
+        for statement in iter_render_from_data(
+                db_url=db_url,
+                destination=destination,
+                columns=columns,
+                rows=read_rows(data_file, data_format),
+                batch_size=batch_size):
+            yield statement + '\n'
+        yield 'COMMIT;\n'
+        return
+
+    if data_format != 'csv':
+        raise ValueError('Bulk loading into {} needs CSV data'.format(
+            engine_name))
+    header = next(csv.reader(data_file)) if data_file else None
+    column_block = bulk_load_columns(destination, dest_columns, header)
+
+    if engine_name == 'postgresql':
+        # The header was consumed above; the rest of the file follows inline
+        yield COPY_TEMPLATE.format(destination=destination,
+                                   column_block=column_block,
+                                   header_option='') + '\n'
+        if data_file:
+            line = '\n'
+            for line in data_file:
+                yield line
+            # The end-of-data marker must start a line of its own
+            if not line.endswith('\n'):
+                yield '\n'
+            yield '\\.\n'
+    elif engine_name == 'mysql':
+        path = data_file.name if data_file else destination + '.csv'
+        yield LOAD_DATA_TEMPLATE.format(
+            path=literal(path, db_url),
+            destination=destination,
+            ignore_header='IGNORE 1 LINES\n' if header else '',
+            column_block=column_block) + '\n'
+    else:
+        raise NotImplementedError('{} not supported'.format(engine_name))
+
+
+def iter_generate_bulk_load(db_url,
+                            destination,
+                            data_file=None,
+                            data_format='csv',
+                            batch_size=DEFAULT_BATCH_SIZE,
+                            cache=None,
+                            schema=None):
+    """
+    Generates a script loading a data file through the database's bulk path.
+
+    See `iter_render_bulk_load()`.
+
+    Args:
+        db_url (str): Database URL in SQLAlchemy format
+        destination (str): Name of table to load
+        data_file (file): Open data file, whose header row names the columns
+        data_format (str): 'csv'; or, for SQLite only, 'jsonl'
+        batch_size (int): Most rows in each SQLite INSERT statement
+        cache (SchemaCache): Cache of column metadata to consult first
+        schema (Schema): Metadata to use instead of connecting to a database;
+            `db_url` may then be omitted
+
+    Yields:
+        str: Successive pieces of the script
+    """
+
+    with InsertWriter(db_url, cache=cache, schema=schema) as writer:
+        columns = writer.col_data_for_tables([destination, ])
+    return iter_render_bulk_load(db_url=writer.db_url,
+                                 destination=destination,
+                                 columns=columns,
+                                 data_file=data_file,
+                                 data_format=data_format,
+                                 batch_size=batch_size)
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""Measures generated statements against the database: EXPLAIN estimates,
+and timed runs, committed or rolled back."""
+
+import json
+import time
+from collections import namedtuple
+
+from sql_insert_writer.sql_insert_writer import db_engine_name
+
+# The planner's view of a statement; `rows` and `cost` are None where the
+# database does not estimate them
+Estimate = namedtuple('Estimate', ['rows', 'cost', 'plan'])
+
+# What running a statement did
+Outcome = namedtuple('Outcome', ['rows', 'seconds', 'committed'])
+
+
+def plan_lines(result):
+    """The first column of each row of an EXPLAIN's result"""
+
+    return [str(row[0]) for row in result]
+
+
+def pg_rows(plan):
+    """
+    Rows a PostgreSQL plan node produces; for an INSERT, those its input
+    produces, since the insert itself returns none
+
+    >>> pg_rows({'Node Type': 'ModifyTable', 'Plan Rows': 0,
+    ...          'Plans': [{'Node Type': 'Seq Scan', 'Plan Rows': 1200}]})
+    1200
+    """
+
+    key = 'Actual Rows' if 'Actual Rows' in plan else 'Plan Rows'
+    if plan['Node Type'] == 'ModifyTable' and plan.get('Plans'):
+        return plan['Plans'][0][key]
+    return plan[key]
+
+
+def pg_plan(conn, sql, options):
+    plan = conn.execute('EXPLAIN ({}, FORMAT JSON) {}'.format(options,
+                                                              sql)).scalar()
+    if isinstance(plan, str):  # not decoded by every driver
+        plan = json.loads(plan)
+    return plan[0]
+
+
+def estimate_postgresql(conn, sql):
+    plan = pg_plan(conn, sql, 'COSTS')['Plan']
+    text = plan_lines(conn.execute('EXPLAIN ' + sql))
+    return Estimate(pg_rows(plan), plan['Total Cost'], text)
+
+
+def find_values(document, key):
+    """All values of `key` in a nested JSON `document`, in document order"""
+
+    if isinstance(document, dict):
+        for (name, value) in document.items():
+            if name == key:
+                yield value
+            else:
+                for found in find_values(value, key):
+                    yield found
+    elif isinstance(document, list):
+        for item in document:
+            for found in find_values(item, key):
+                yield found
+
+
+def estimate_mysql(conn, sql):
+    document = json.loads(conn.execute('EXPLAIN FORMAT=JSON ' +
+                                       sql).scalar())
+    costs = list(find_values(document, 'query_cost'))
+    # The last table joined produces the statement's rows
+    rows = list(find_values(document, 'rows_produced_per_join'))
+    text = ['\t'.join(str(value) for value in row)
+            for row in conn.execute('EXPLAIN ' + sql)]
+    return Estimate(int(rows[-1]) if rows else None,
+                    float(costs[0]) if costs else None, text)
+
+
+def estimate_sqlite(conn, sql):
+    # SQLite's planner shares its plan, but not its estimates
+    text = [row.detail for row in conn.execute('EXPLAIN QUERY PLAN ' + sql)]
+    return Estimate(None, None, text)
+
+
+estimate_functions = {
+    'postgresql': estimate_postgresql,
+    'sqlite': estimate_sqlite,
+    'mysql': estimate_mysql,
+}
+
+
+def estimate(conn, db_url, sql):
+    """
+    EXPLAINs `sql` without running it
+
+    Args:
+        conn: A SQLAlchemy connection
+        db_url (str): Database URL in SQLAlchemy format; used only for dialect
+        sql (str): A single SQL statement
+
+    Returns:
+        Estimate: Rows the statement will produce, the planner's cost, and
+            the plan as lines of text
+    """
+
+    db_type = db_engine_name(db_url)
+    estimate_function = estimate_functions.get(db_type)
+    if not estimate_function:
+        raise NotImplementedError('{} not supported'.format(db_type))
+    return estimate_function(conn, sql)
+
+
+def run(conn, sql, commit=False):
+    """
+    Runs `sql` in a transaction of its own, committed only if `commit`
+
+    Returns:
+        Outcome: Rows affected, and seconds taken
+    """
+
+    transaction = conn.begin()
+    try:
+        start = time.perf_counter()
+        rows = conn.execute(sql).rowcount
+        seconds = time.perf_counter() - start
+        if commit:
+            transaction.commit()
+        else:
+            transaction.rollback()
+    except Exception:
+        transaction.rollback()
+        raise
+    return Outcome(rows, seconds, commit)
+
+
+def analyze(conn, db_url, sql):
+    """
+    Runs `sql` in a transaction that is then rolled back, leaving no trace
+
+    PostgreSQL runs it under `EXPLAIN ANALYZE`, which reports the time the
+    statement itself took; elsewhere it is simply timed.
+
+    Returns:
+        Outcome: Rows the statement affected, and seconds taken
+    """
+
+    if db_engine_name(db_url) != 'postgresql':
+        return run(conn, sql, commit=False)
+    transaction = conn.begin()
+    try:
+        plan = pg_plan(conn, sql, 'ANALYZE')
+    finally:
+        transaction.rollback()
+    return Outcome(pg_rows(plan['Plan']), plan['Execution Time'] / 1000.0,
+                   False)
+
+
+def describe_estimate(result):
+    """
+    Lines reporting an `Estimate`
+
+    >>> describe_estimate(Estimate(1200, 35.5, ['Seq Scan on animal']))
+    ['Seq Scan on animal', 'Estimated rows: 1200; cost: 35.50']
+    """
+
+    lines = list(result.plan)
+    if result.rows is None:
+        lines.append('Estimated rows and cost: not available')
+    else:
+        lines.append('Estimated rows: {}; cost: {:.2f}'.format(
+            result.rows, result.cost or 0))
+    return lines
+
+
+def describe_outcome(result):
+    """
+    A line reporting an `Outcome`
+
+    >>> describe_outcome(Outcome(1187, 0.1234, False))
+    'Rows: 1187 in 0.123 s (rolled back)'
+    """
+
+    return 'Rows: {} in {:.3f} s ({})'.format(
+        result.rows, result.seconds,
+        'committed' if result.committed else 'rolled back')
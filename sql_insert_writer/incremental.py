@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+Regenerates a directory of INSERT statements, rewriting only those whose
+tables have changed.
+
+The directory keeps a state file recording, for each table, its schema
+version token (see `versions.schema_versions()`) and a fingerprint of its
+column metadata, and for each statement file, the fingerprint of what it
+was generated from.  A table whose version token is unchanged is not
+looked up again; one whose token has changed (with SQLite, any table's
+change changes them all) is looked up, and only the statements whose
+tables' fingerprints actually differ are rewritten.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from sql_insert_writer.batch import (batch_file_names, job_table_names,
+                                     joined_table_names, render_batch,
+                                     write_statement)
+from sql_insert_writer.sql_insert_writer import InsertWriter
+from sql_insert_writer.versions import schema_versions
+
+STATE_FILE_NAME = '.sql_insert_writer_state.json'
+
+# State files written in any other format are ignored, regenerating all
+STATE_FORMAT = 1
+
+DEFAULT_INTERVAL = 5.0  # seconds
+
+
+def table_fingerprint(columns):
+    """
+    Hash of a `Table`'s column metadata, as from `col_data()`
+
+    >>> from sql_insert_writer.metadata import Table
+    >>> table_fingerprint(Table.from_rows('pet', [('id', 'integer')]))
+    'c0de3e7948ccd915286224da582fd9cda73318d0'
+    """
+
+    return hashlib.sha1(json.dumps(
+        columns.to_rows()).encode('utf-8')).hexdigest()
+
+
+def job_fingerprint(job, fingerprints, options):
+    """Hash of everything one statement is generated from: its
+    (destination, sources) `job`, its tables' fingerprints, and `options`"""
+
+    (destination, sources) = job
+    key = [destination, list(sources), options,
+           [fingerprints[table_name] for table_name in [destination, ] +
+            list(sources)]]
+    return hashlib.sha1(json.dumps(key).encode('utf-8')).hexdigest()
+
+
+def load_state(output_dir):
+    """The state file of `output_dir` as a dict, or an empty state"""
+
+    try:
+        with open(os.path.join(output_dir, STATE_FILE_NAME)) as infile:
+            state = json.load(infile)
+    except (IOError, ValueError):  # missing or corrupt file
+        state = {}
+    if state.get('format') != STATE_FORMAT:
+        state = {'format': STATE_FORMAT}
+    state.setdefault('tables', {})
+    state.setdefault('outputs', {})
+    return state
+
+
+def save_state(output_dir, state):
+    (handle, temp_path) = tempfile.mkstemp(dir=output_dir, suffix='.tmp')
+    with os.fdopen(handle, 'w') as outfile:
+        json.dump(state, outfile, indent=1, sort_keys=True)
+    os.replace(temp_path, os.path.join(output_dir, STATE_FILE_NAME))
+
+
+def regenerate(writer, jobs, output_dir, qualify=False, type_cast=False,
+               force=False):
+    """
+    Brings the statement files for `jobs` in `output_dir` up to date
+
+    Files are named as by `batch.write_batch()`.  Foreign keys are not
+    fingerprinted; pass `force` after changing them to rewrite every file.
+
+    Args:
+        writer (InsertWriter): Writer for a live database; tables whose
+            version has changed are invalidated in it, and its cache
+        jobs (list): (destination, sources) pairs, as for `render_batch()`
+        output_dir (str): Directory of statement files and the state file
+        qualify (bool): Qualify column names with table name
+        type_cast (bool): Cast values to destination data type where needed
+        force (bool): Look up every table, and rewrite every file
+
+    Returns:
+        list: Paths of the files written
+    """
+
+    os.makedirs(output_dir, exist_ok=True)
+    state = {'format': STATE_FORMAT} if force else load_state(output_dir)
+    known = state.setdefault('tables', {})
+    outputs = state.setdefault('outputs', {})
+    options = {'qualify': qualify, 'type_cast': type_cast}
+
+    table_names = sorted(set(job_table_names(jobs)))
+    with writer.profiler.phase('versions'):
+        versions = schema_versions(writer.db, table_names)
+    stale = [table_name for table_name in table_names
+             if table_name not in known or
+             known[table_name]['version'] != versions.get(table_name)]
+    writer.invalidate(stale)
+    for (table_name, columns) in writer.col_data_for_tables(stale).items():
+        known[table_name] = {'version': versions.get(table_name),
+                             'fingerprint': table_fingerprint(columns)}
+    fingerprints = {table_name: known[table_name]['fingerprint']
+                    for table_name in table_names}
+
+    changed = []
+    file_names = batch_file_names(destination for (destination, _) in jobs)
+    for (job, file_name) in zip(jobs, file_names):
+        fingerprint = job_fingerprint(job, fingerprints, options)
+        if (outputs.get(file_name) != fingerprint or
+                not os.path.exists(os.path.join(output_dir, file_name))):
+            changed.append((job, file_name, fingerprint))
+
+    paths = []
+    if changed:
+        changed_jobs = [job for (job, _, _) in changed]
+        columns = writer.col_data_for_tables(job_table_names(changed_jobs))
+        foreign_keys = writer.foreign_keys_for_tables(
+            joined_table_names(changed_jobs))
+        results = render_batch(db_url=writer.db_url,
+                               jobs=changed_jobs,
+                               columns=columns,
+                               qualify=qualify,
+                               type_cast=type_cast,
+                               foreign_keys=foreign_keys)
+        with writer.profiler.phase('render'):
+            for ((_, sql), (_, file_name, fingerprint)) in zip(results,
+                                                               changed):
+                path = os.path.join(output_dir, file_name)
+                write_statement(path, sql)
+                outputs[file_name] = fingerprint
+                paths.append(path)
+
+    save_state(output_dir, state)
+    return paths
+
+
+def watch(writer, jobs, output_dir, interval=DEFAULT_INTERVAL,
+          qualify=False, type_cast=False, force=False, passes=None):
+    """
+    Calls `regenerate()` every `interval` seconds, indefinitely or for
+    `passes` passes; `force` applies to the first pass only
+
+    Yields:
+        list: Paths of the files written by each pass
+    """
+
+    count = 0
+    while passes is None or count < passes:
+        if count:
+            time.sleep(interval)
+        yield regenerate(writer, jobs, output_dir, qualify=qualify,
+                         type_cast=type_cast, force=force and not count)
+        count += 1
+
+
+def generate_incremental(db_url,
+                         jobs,
+                         output_dir,
+                         qualify=False,
+                         type_cast=False,
+                         cache=None,
+                         concurrency=1,
+                         force=False):
+    """
+    Regenerates the statement files for `jobs` whose tables have changed;
+    see `regenerate()`
+
+    Returns:
+        list: Paths of the files written
+    """
+
+    with InsertWriter(db_url, cache=cache,
+                      concurrency=concurrency) as writer:
+        return regenerate(writer, jobs, output_dir, qualify=qualify,
+                          type_cast=type_cast, force=force)
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""Fills JOIN conditions from the foreign keys linking source tables."""
+
+from collections import OrderedDict, deque
+
+
+class JoinConditionWarning(UserWarning):
+    """No foreign key links a source table to the first source"""
+
+
+def join_graph(table_names, foreign_keys_by_table):
+    """
+    Indexes the foreign keys among `table_names` as an undirected graph
+
+    Returns:
+        dict: Table name: OrderedDict of neighboring table name: list of
+            conditions linking the two, each a list of (column of this
+            table, column of the neighbor) pairs
+
+    >>> from sql_insert_writer.metadata import ForeignKey
+    >>> fks = {'pet': [ForeignKey('pet', ('owner_id',), 'owner', ('id',))]}
+    >>> join_graph(['owner', 'pet'], fks)['owner']['pet']
+    [[('id', 'owner_id')]]
+    """
+
+    graph = OrderedDict((table_name, OrderedDict())
+                        for table_name in table_names)
+    for table_name in table_names:
+        for foreign_key in foreign_keys_by_table.get(table_name, []):
+            ref_table_name = foreign_key.ref_table_name
+            if ref_table_name not in graph or ref_table_name == table_name:
+                continue
+            pairs = list(zip(foreign_key.column_names,
+                             foreign_key.ref_column_names))
+            graph[table_name].setdefault(ref_table_name, []).append(pairs)
+            graph[ref_table_name].setdefault(table_name, []).append(
+                [(ref_col, col) for (col, ref_col) in pairs])
+    return graph
+
+
+def join_tree(table_names, graph):
+    """
+    Plans JOINs from the first of `table_names` to the rest, along the
+    shortest foreign key paths among them (breadth first)
+
+    Each table is joined to one already joined, so the plan's order may
+    differ from that of `table_names`; otherwise it follows that order.
+
+    Returns:
+        tuple: (joins, unreachable): `joins` lists (table name, parent table
+            name, conditions linking them) in order to JOIN them;
+            `unreachable` lists tables with no path to the first
+    """
+
+    position = {}
+    for (number, table_name) in enumerate(table_names):
+        position.setdefault(table_name, number)
+    root = table_names[0]
+    visited = set([root, ])
+    joins = []
+    queue = deque([root, ])
+    while queue:
+        parent = queue.popleft()
+        for neighbor in sorted(graph[parent], key=position.get):
+            conditions = graph[parent][neighbor]
+            if neighbor not in visited:
+                visited.add(neighbor)
+                queue.append(neighbor)
+                joins.append((neighbor, parent,
+                              [[(neighbor_col, parent_col)
+                                for (parent_col, neighbor_col) in pairs]
+                               for pairs in conditions]))
+    unreachable = [table_name for table_name in table_names
+                   if table_name not in visited]
+    return (joins, unreachable)
+
+
+def on_clause(table_name, parent, pairs):
+    """
+    The condition joining `table_name` to `parent` on column `pairs`
+
+    >>> on_clause('pet', 'owner', [('owner_id', 'id')])
+    'owner.id = pet.owner_id'
+    """
+
+    return ' AND '.join('{}.{} = {}.{}'.format(parent, parent_col, table_name,
+                                               col)
+                        for (col, parent_col) in pairs)
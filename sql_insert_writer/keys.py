@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""Looks up tables' primary and foreign keys."""
+
+from collections import OrderedDict
+
+from sql_insert_writer.metadata import ForeignKey
+from sql_insert_writer.sql_insert_writer import (BULK_QUERY_MAX_TABLES,
+                                                 PG_TABLE_OID,
+                                                 db_engine_name,
+                                                 table_name_params)
+
+
+def primary_key_postgresql(db, table_name):
+    """Gets the names of a PostgreSQL table's primary key columns
+
+    The table is found as its column metadata is, so may be
+    schema-qualified, and otherwise follows `search_path`."""
+
+    qry = '''SELECT a.attname AS column_name
+             FROM (SELECT CAST(:table_name AS text) AS table_name) AS n
+             JOIN pg_catalog.pg_constraint con
+               ON (con.conrelid = {} AND con.contype = 'p')
+             CROSS JOIN LATERAL unnest(con.conkey)
+               WITH ORDINALITY AS k (attnum, key_position)
+             JOIN pg_catalog.pg_attribute a
+               ON (a.attrelid = con.conrelid AND a.attnum = k.attnum)
+             ORDER BY k.key_position'''.format(PG_TABLE_OID)
+
+    return [row.column_name for row in db.query(qry, table_name=table_name)]
+
+
+def primary_key_info_schema(db, table_name):
+    """Gets the names of a MySQL table's primary key columns"""
+
+    qry = '''SELECT kcu.column_name
+             FROM information_schema.table_constraints tc
+             JOIN information_schema.key_column_usage kcu
+               ON (kcu.constraint_name = tc.constraint_name
+                   AND kcu.table_schema = tc.table_schema
+                   AND kcu.table_name = tc.table_name)
+             WHERE tc.constraint_type = 'PRIMARY KEY'
+             AND tc.table_schema = DATABASE()
+             AND tc.table_name = :table_name
+             ORDER BY kcu.ordinal_position'''
+
+    return [row.column_name for row in db.query(qry, table_name=table_name)]
+
+
+def primary_key_sqlite(db, table_name):
+    """Gets the names of a SQLite table's primary key columns"""
+
+    qry = '''SELECT name AS column_name
+             FROM pragma_table_info(:table_name)
+             WHERE pk > 0
+             ORDER BY pk'''
+
+    return [row.column_name for row in db.query(qry, table_name=table_name)]
+
+
+primary_key_functions = {
+    'postgresql': primary_key_postgresql,
+    'sqlite': primary_key_sqlite,
+    'mysql': primary_key_info_schema,
+}
+
+
+def primary_key(db, table_name):
+    """Gets the names of a table's primary key columns, in key order
+
+    Returns an empty list if the table has no primary key."""
+
+    db_type = db_engine_name(db.db_url)
+    primary_key_function = primary_key_functions.get(db_type)
+    if not primary_key_function:
+        raise NotImplementedError('{} not supported'.format(db_type))
+    return primary_key_function(db, table_name)
+
+
+def group_foreign_keys(rows):
+    """
+    Groups rows, one per column of each foreign key constraint and ordered
+    by position within it, into dict of table name: list of `ForeignKey`
+    """
+
+    constraints = OrderedDict()
+    for row in rows:
+        constraint = constraints.setdefault(
+            (row.table_name, row.constraint_name, row.ref_table_name),
+            ([], []))
+        constraint[0].append(row.column_name)
+        constraint[1].append(row.ref_column_name)
+
+    result = {}
+    for ((table_name, _, ref_table_name),
+         (column_names, ref_column_names)) in constraints.items():
+        result.setdefault(table_name, []).append(ForeignKey(
+            table_name, tuple(column_names), ref_table_name,
+            tuple(ref_column_names)))
+    return result
+
+
+def foreign_keys_postgresql(db, table_names):
+    """Gets the foreign keys of several PostgreSQL tables in one query
+
+    Tables are found as their column metadata is, so may be
+    schema-qualified, and otherwise follow `search_path`.  A referenced
+    table is named as in `table_names`, if it is among them; otherwise as
+    PostgreSQL names it, qualified only if not on `search_path`."""
+
+    (placeholders, params) = table_name_params(table_names)
+    qry = '''SELECT n.table_name AS table_name,
+                    con.conname AS constraint_name,
+                    a.attname AS column_name,
+                    COALESCE(named.table_name,
+                             con.confrelid::regclass::text) AS ref_table_name,
+                    ra.attname AS ref_column_name
+             FROM unnest(ARRAY[{0}]) AS n (table_name)
+             JOIN pg_catalog.pg_constraint con
+               ON (con.conrelid = {1} AND con.contype = 'f')
+             CROSS JOIN LATERAL unnest(con.conkey, con.confkey)
+               WITH ORDINALITY AS k (attnum, ref_attnum, key_position)
+             JOIN pg_catalog.pg_attribute a
+               ON (a.attrelid = con.conrelid AND a.attnum = k.attnum)
+             JOIN pg_catalog.pg_attribute ra
+               ON (ra.attrelid = con.confrelid AND ra.attnum = k.ref_attnum)
+             LEFT JOIN (SELECT min(n.table_name) AS table_name,
+                               {1} AS oid
+                        FROM unnest(ARRAY[{0}]) AS n (table_name)
+                        GROUP BY 2) AS named
+               ON (named.oid = con.confrelid)
+             ORDER BY n.table_name, con.conname,
+                      k.key_position'''.format(placeholders, PG_TABLE_OID)
+
+    return group_foreign_keys(db.query(qry, **params))
+
+
+def foreign_keys_mysql(db, table_names):
+    """Gets the foreign keys of several MySQL tables in one query
+
+    MySQL names every primary key constraint PRIMARY, so the referenced
+    columns are read from `key_column_usage` directly"""
+
+    (placeholders, params) = table_name_params(table_names)
+    qry = '''SELECT table_name AS table_name,
+                    constraint_name AS constraint_name,
+                    column_name AS column_name,
+                    referenced_table_name AS ref_table_name,
+                    referenced_column_name AS ref_column_name
+             FROM information_schema.key_column_usage
+             WHERE referenced_table_name IS NOT NULL
+             AND table_schema = DATABASE()
+             AND table_name IN ({})
+             ORDER BY table_name, constraint_name,
+                      ordinal_position'''.format(placeholders)
+
+    return group_foreign_keys(db.query(qry, **params))
+
+
+def foreign_keys_sqlite(db, table_names):
+    """Gets the foreign keys of several SQLite tables in one query
+
+    Uses the `pragma_foreign_key_list` table-valued function.  A foreign
+    key declared without columns references the primary key."""
+
+    (placeholders, params) = table_name_params(table_names)
+    selects = ['''SELECT :{0} AS table_name, id AS constraint_name, seq,
+                       "from" AS column_name, "table" AS ref_table_name,
+                       "to" AS ref_column_name
+                FROM pragma_foreign_key_list(:{0})'''.format(name)
+               for name in sorted(params)]
+    qry = '\nUNION ALL\n'.join(selects) + '\nORDER BY table_name, id, seq'
+
+    result = group_foreign_keys(db.query(qry, **params))
+    for (table_name, foreign_keys) in result.items():
+        result[table_name] = [
+            foreign_key._replace(ref_column_names=tuple(
+                primary_key(db, foreign_key.ref_table_name)))
+            if None in foreign_key.ref_column_names else foreign_key
+            for foreign_key in foreign_keys]
+    return result
+
+
+foreign_key_functions = {
+    'postgresql': foreign_keys_postgresql,
+    'sqlite': foreign_keys_sqlite,
+    'mysql': foreign_keys_mysql,
+}
+
+
+def foreign_keys(db, table_names):
+    """Gets the foreign keys of several tables
+
+    Returns dict of table name: list of `ForeignKey`; tables without any
+    foreign keys are omitted."""
+
+    db_type = db_engine_name(db.db_url)
+    foreign_key_function = foreign_key_functions.get(db_type)
+    if not foreign_key_function:
+        raise NotImplementedError('{} not supported'.format(db_type))
+
+    result = {}
+    for start in range(0, len(table_names), BULK_QUERY_MAX_TABLES):
+        result.update(foreign_key_function(
+            db, table_names[start:start + BULK_QUERY_MAX_TABLES]))
+    return result
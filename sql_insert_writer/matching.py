@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""
+Matches destination columns to source columns whose names only resemble
+theirs, like `customer_id` and `cust_id`, or `amount` and `AMT`.
+
+Names are split into lowercase tokens.  Each source column is filed once, in
+an index, under the letter trigrams of its tokens and their first letters.
+A destination column is then compared only with the source columns having
+enough tokens like its own (sharing a trigram, or abbreviating one another),
+and enough of its tokens like theirs, that the match could reach the
+threshold; a column sharing only a common word, like `id`, with a longer
+name is passed over unscored.
+"""
+
+import re
+from collections import defaultdict, namedtuple
+
+DEFAULT_THRESHOLD = 0.75
+
+# A token that begins another, as `cust` does `customer`
+PREFIX_SIMILARITY = 0.9
+
+# A token spelled within another, as `amt` is within `amount`
+ABBREVIATION_SIMILARITY = 0.8
+
+# A source column and how closely its name matches, from 0 to 1
+Match = namedtuple('Match', ['column', 'confidence'])
+
+TOKEN_PATTERN = re.compile(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+')
+VOWELS = re.compile(r'(?<=.)[aeiou]')
+
+
+def name_tokens(name):
+    """
+    A column name's words, split on underscores, case changes and digits
+
+    >>> name_tokens('custID_2')
+    ['cust', 'id', '2']
+    >>> name_tokens('HTTPServerName')
+    ['http', 'server', 'name']
+    """
+
+    return [token.lower() for token in TOKEN_PATTERN.findall(name)]
+
+
+def trigrams(text):
+    """
+    Letter trigrams of `text`, with its ends marked
+
+    >>> sorted(trigrams('amt'))
+    ['$am', 'amt', 'mt$']
+    """
+
+    padded = '${}$'.format(text)
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def token_keys(token):
+    """
+    Keys to file a token under: its trigrams, and those of its consonants,
+    which abbreviations tend to keep
+
+    >>> sorted(token_keys('qty') & token_keys('quantity'))
+    ['#ty$', 'ty$']
+    """
+
+    return trigrams(token) | {'#' + gram
+                              for gram in trigrams(VOWELS.sub('', token))}
+
+
+def is_abbreviation(short, long):
+    """Whether `short` is spelled, in order, within `long`"""
+
+    letters = iter(long)
+    return all(letter in letters for letter in short)
+
+
+def abbreviates(token, other):
+    """
+    Whether the shorter of two tokens, of two letters or more, is spelled
+    within the longer, starting with the same letter
+
+    Such tokens may share no trigram at all, as `pct` and `percent` do not.
+
+    >>> abbreviates('percent', 'pct')
+    True
+    """
+
+    (short, long) = sorted((token, other), key=len)
+    return (len(short) > 1 and short[0] == long[0] and
+            is_abbreviation(short, long))
+
+
+def token_similarity(token, other):
+    """
+    How alike two tokens are, from 0 to 1
+
+    >>> token_similarity('cust', 'customer')
+    0.9
+    >>> token_similarity('qty', 'quantity')
+    0.8
+    >>> token_similarity('1', '2')
+    0.0
+    """
+
+    if token == other:
+        return 1.0
+    if abbreviates(token, other):
+        (short, long) = sorted((token, other), key=len)
+        if long.startswith(short):
+            return PREFIX_SIMILARITY
+        return ABBREVIATION_SIMILARITY
+    (grams, other_grams) = (trigrams(token), trigrams(other))
+    return 2.0 * len(grams & other_grams) / (len(grams) + len(other_grams))
+
+
+def name_similarity(tokens, other_tokens):
+    """
+    How alike two names, split into tokens, are, from 0 to 1
+
+    Tokens are paired off, most alike first; tokens left unpaired count
+    against the match.
+
+    >>> name_similarity(['cust', 'id'], ['customer', 'id'])
+    0.95
+    >>> name_similarity(['customer', 'id'], ['customerid'])
+    1.0
+    """
+
+    if ''.join(tokens) == ''.join(other_tokens):
+        return 1.0
+    pairs = sorted(((token_similarity(token, other), i, j)
+                    for (i, token) in enumerate(tokens)
+                    for (j, other) in enumerate(other_tokens)),
+                   reverse=True)
+    (paired, other_paired, total) = (set(), set(), 0.0)
+    for (similarity, i, j) in pairs:
+        if i not in paired and j not in other_paired:
+            paired.add(i)
+            other_paired.add(j)
+            total += similarity
+    return round(2 * total / (len(tokens) + len(other_tokens)), 4)
+
+
+class ColumnIndex(object):
+    """
+    Source columns, filed for finding those with names like a given one.
+
+    Build one per run, over every source table it uses, and search it for
+    each destination column.
+
+    Args:
+        tables (iterable): `Table`s of the source columns
+
+    >>> from sql_insert_writer.metadata import Table
+    >>> index = ColumnIndex([Table.from_rows('src', [['cust_id', 'int'],
+    ...                                              ['AMT', 'numeric'],
+    ...                                              ['note', 'text']])])
+    >>> [(match.column.column_name, match.confidence)
+    ...  for match in index.search('customer_id')]
+    [('cust_id', 0.95)]
+    """
+
+    def __init__(self, tables):
+        self.tokens = {}
+        # Key: set of (column, position of the token filed under it)
+        self.postings = defaultdict(set)
+        # First letter: set of (column, position, token), for abbreviations
+        self.initials = defaultdict(set)
+        # Tokens run together: columns, for names differing only in
+        # separators and case, which share few trigrams token by token
+        self.joined = defaultdict(list)
+        for table in tables:
+            for col in table:
+                tokens = name_tokens(col.column_name)
+                self.tokens[col] = tokens
+                self.joined[''.join(tokens)].append(col)
+                for (position, token) in enumerate(tokens):
+                    for key in token_keys(token):
+                        self.postings[key].add((col, position))
+                    self.initials[token[0]].add((col, position, token))
+
+    def candidates(self, tokens, threshold=DEFAULT_THRESHOLD):
+        """
+        Columns whose names could match one split into `tokens` with at
+        least `threshold` confidence
+
+        Tokens pair off one to one, each pair adding at most 1, and only a
+        pair sharing a trigram, or in which one token `abbreviates()` the
+        other, adds anything.  So a column is a candidate only if enough of
+        the name's tokens, and enough of its own, are alike in one of those
+        ways: `name_similarity()` could not otherwise reach `threshold`.
+        """
+
+        # Column: (positions of `tokens`, positions of its own tokens)
+        # alike
+        shared = defaultdict(lambda: (set(), set()))
+
+        def pair(col, position, col_position):
+            (positions, col_positions) = shared[col]
+            positions.add(position)
+            col_positions.add(col_position)
+
+        for (position, token) in enumerate(tokens):
+            for key in token_keys(token):
+                for (col, col_position) in self.postings.get(key, ()):
+                    pair(col, position, col_position)
+            for (col, col_position, col_token) in self.initials.get(
+                    token[0], ()):
+                if abbreviates(token, col_token):
+                    pair(col, position, col_position)
+        result = set(self.joined.get(''.join(tokens), ()))
+        for (col, (positions, col_positions)) in shared.items():
+            pairs = min(len(positions), len(col_positions))
+            if 2.0 * pairs / (len(tokens) + len(self.tokens[col])) \
+                    >= threshold:
+                result.add(col)
+        return result
+
+    def search(self, column_name, table_names=None,
+               threshold=DEFAULT_THRESHOLD):
+        """
+        Source columns whose names resemble `column_name`
+
+        Args:
+            column_name (str): Name to match
+            table_names (collection): Tables to match columns of; all if None
+            threshold (float): Lowest confidence to accept
+
+        Returns:
+            list: `Match`es, best first
+        """
+
+        tokens = name_tokens(column_name)
+        matches = []
+        for col in self.candidates(tokens, threshold):
+            if table_names is not None and col.table_name not in table_names:
+                continue
+            confidence = name_similarity(tokens, self.tokens[col])
+            if confidence >= threshold:
+                matches.append(Match(col, confidence))
+        return sorted(matches, key=lambda match: (-match.confidence,
+                                                  match.column.column_name))
+
+
+def approximate_matches(column_index,
+                        destination_columns,
+                        sources,
+                        source_columns,
+                        threshold=DEFAULT_THRESHOLD):
+    """
+    Approximate matches for the destination columns without an exact one.
+
+    Each source column is used once at most, and none already matched
+    exactly.  The most confident matches are made first; among equally
+    confident ones, sources listed first take precedence.
+
+    Args:
+        column_index (ColumnIndex): Index of at least the `sources`' columns
+        destination_columns (Table): Columns of the table to INSERT into
+        sources (list): Names of tables to select from, in order of preference
+        source_columns (dict): Column name: source column of exact matches,
+            as from `merge_source_columns()`
+        threshold (float): Lowest confidence to accept
+
+    Returns:
+        dict: Destination column name: `Match`
+    """
+
+    used = set(source_columns[col.column_name]
+               for col in destination_columns
+               if col.column_name in source_columns)
+    rank = {table_name: number for (number, table_name)
+            in enumerate(sources)}
+    proposals = []
+    for (position, dest_col) in enumerate(destination_columns):
+        if dest_col.column_name in source_columns:
+            continue
+        for match in column_index.search(dest_col.column_name, rank,
+                                         threshold):
+            if match.column not in used:
+                proposals.append((-match.confidence,
+                                  rank[match.column.table_name], position,
+                                  dest_col.column_name, match))
+    matches = {}
+    for (_, _, _, column_name, match) in sorted(proposals,
+                                                key=lambda p: p[:3]):
+        if column_name not in matches and match.column not in used:
+            matches[column_name] = match
+            used.add(match.column)
+    return matches
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""Column metadata, as returned by the database, the cache and schema files."""
+
+from collections import namedtuple
+
+Column = namedtuple('Column', ['table_name', 'column_name', 'data_type'])
+
+# `column_names` of `table_name` reference `ref_column_names` of
+# `ref_table_name`, pairwise; both are tuples
+ForeignKey = namedtuple('ForeignKey', ['table_name', 'column_names',
+                                       'ref_table_name', 'ref_column_names'])
+
+
+class Table(object):
+    """
+    The columns of one table, in order; immutable.
+
+    Behaves as a sequence of `Column`s, and looks columns up by name through
+    an index built on first use.
+
+    Args:
+        name (str): Table name
+        columns (iterable): `Column`s, or anything with `table_name`,
+            `column_name` and `data_type` attributes, like database rows
+
+    >>> table = Table.from_rows('pet', [['name', 'text'], ['kg', 'numeric']])
+    >>> [col.column_name for col in table]
+    ['name', 'kg']
+    >>> table.column('kg').data_type
+    'numeric'
+    >>> table.to_rows()
+    [['name', 'text'], ['kg', 'numeric']]
+    """
+
+    __slots__ = ('name', 'columns', '_index')
+
+    def __init__(self, name, columns):
+        columns = tuple(col if isinstance(col, Column) else
+                        Column(col.table_name, col.column_name, col.data_type)
+                        for col in columns)
+        object.__setattr__(self, 'name', name)
+        object.__setattr__(self, 'columns', columns)
+        object.__setattr__(self, '_index', None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Table is immutable')
+
+    @classmethod
+    def from_rows(cls, name, rows):
+        """Builds a table from `[column_name, data_type]` pairs"""
+        return cls(name, (Column(name, column_name, data_type)
+                          for (column_name, data_type) in rows))
+
+    def to_rows(self):
+        """`[column_name, data_type]` pairs, for serializing as JSON"""
+        return [[col.column_name, col.data_type] for col in self.columns]
+
+    @property
+    def index(self):
+        """Dict of column name: `Column`"""
+        if self._index is None:
+            # Where names repeat, the last column wins, as in a dict display
+            object.__setattr__(self, '_index', {col.column_name: col
+                                                for col in self.columns})
+        return self._index
+
+    def column(self, column_name, default=None):
+        """The column named `column_name`, or `default` if none is"""
+        return self.index.get(column_name, default)
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def __len__(self):
+        return len(self.columns)
+
+    def __getitem__(self, position):
+        return self.columns[position]
+
+    def __eq__(self, other):
+        return (isinstance(other, Table) and self.name == other.name and
+                self.columns == other.columns)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.name, self.columns))
+
+    def __repr__(self):
+        return 'Table({!r}, {!r})'.format(self.name, list(self.columns))
+
+
+def group_by_table(rows):
+    """Groups column metadata rows into dict of table name: `Table`"""
+
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row.table_name, []).append(row)
+    return {table_name: Table(table_name, columns)
+            for (table_name, columns) in grouped.items()}
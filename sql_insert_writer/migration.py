@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""Orders INSERT statements for many tables so foreign keys are satisfied."""
+
+from sql_insert_writer import batch
+from sql_insert_writer.sql_insert_writer import InsertWriter
+
+
+class CyclicDependencyError(Exception):
+    pass
+
+
+def dependency_levels(table_names, foreign_keys_by_table):
+    """
+    Sorts tables into levels, each after every level holding a table its
+    foreign keys reference.
+
+    Only references among `table_names` count; a table referencing itself
+    is placed as if it did not.  Tables within a level do not depend on each
+    other, so may be loaded concurrently.
+
+    Args:
+        table_names (list): Tables to sort
+        foreign_keys_by_table (dict): Table name: list of `ForeignKey`, as
+            from `keys.foreign_keys()`
+
+    Returns:
+        list: Lists of table names, one per level, each in the order given
+
+    >>> from sql_insert_writer.metadata import ForeignKey
+    >>> fks = {'pet': [ForeignKey('pet', ('species',), 'species', ('id',))]}
+    >>> dependency_levels(['pet', 'owner', 'species'], fks)
+    [['owner', 'species'], ['pet']]
+    """
+
+    unique_names = []
+    for table_name in table_names:
+        if table_name not in unique_names:
+            unique_names.append(table_name)
+
+    depends_on = {}
+    for table_name in unique_names:
+        depends_on[table_name] = set(
+            foreign_key.ref_table_name
+            for foreign_key in foreign_keys_by_table.get(table_name, [])
+            if foreign_key.ref_table_name in unique_names)
+        depends_on[table_name].discard(table_name)
+
+    levels = []
+    placed = set()
+    remaining = unique_names
+    while remaining:
+        level = [table_name for table_name in remaining
+                 if depends_on[table_name] <= placed]
+        if not level:
+            raise CyclicDependencyError(
+                'Foreign keys form a cycle among: {}'.format(
+                    ', '.join(remaining)))
+        levels.append(level)
+        placed.update(level)
+        remaining = [table_name for table_name in remaining
+                     if table_name not in placed]
+    return levels
+
+
+def order_jobs(jobs, foreign_keys_by_table):
+    """
+    Groups (destination, sources) `jobs` into levels by their destination
+    tables' foreign keys, as `dependency_levels()` does
+
+    Returns:
+        list: Lists of jobs, one per level, each in the order given
+    """
+
+    levels = dependency_levels([destination for (destination, _) in jobs],
+                               foreign_keys_by_table)
+    level_of = {table_name: number
+                for (number, level) in enumerate(levels)
+                for table_name in level}
+    result = [[] for _ in levels]
+    for job in jobs:
+        result[level_of[job[0]]].append(job)
+    return result
+
+
+def render_migration(db_url,
+                     job_levels,
+                     columns,
+                     qualify=False,
+                     type_cast=False,
+                     foreign_keys=None):
+    """
+    Renders an INSERT statement for each job, level by level.
+
+    Args:
+        db_url (str): Database URL in SQLAlchemy format; used only for dialect
+        job_levels (list): Lists of (destination, sources) jobs, as from
+            `order_jobs()`
+        columns (dict): Table name: `Table`, as from `col_data()`, for every
+            table in `job_levels`
+        qualify (bool): Qualify column names with table name even if only
+            one table
+        type_cast (bool): Cast values to destination data type where needed
+        foreign_keys (dict): Table name: list of `ForeignKey`, for JOINed
+            sources; see `batch.render_batch()`
+
+    Yields:
+        tuple: (level number, counting from 1; destination; SQL statement)
+    """
+
+    for (number, jobs) in enumerate(job_levels, 1):
+        results = batch.render_batch(db_url=db_url,
+                                     jobs=jobs,
+                                     columns=columns,
+                                     qualify=qualify,
+                                     type_cast=type_cast,
+                                     foreign_keys=foreign_keys)
+        for (destination, result) in results:
+            yield (number, destination, result)
+
+
+def migration_script(results, level_count):
+    """
+    Joins `render_migration()`'s statements into one script, with a comment
+    heading each level
+
+    Yields:
+        str: Successive pieces of the script
+    """
+
+    current = None
+    for (number, destination, result) in results:
+        if number != current:
+            current = number
+            yield ('\n-- Level {} of {}: statements in this level are '
+                   'independent, and may run concurrently\n'.format(
+                       number, level_count))
+        yield result + ';\n'
+
+
+def level_file_names(results, level_count):
+    """
+    Renames `render_migration()`'s destinations with their level number,
+    like `2_pet`, so files written by `batch.write_batch()` sort in order
+
+    Yields:
+        tuple: (file name, SQL statement)
+    """
+
+    width = len(str(level_count))
+    for (number, destination, result) in results:
+        yield ('{:0{}}_{}'.format(number, width, destination), result)
+
+
+def generate_migration(db_url,
+                       jobs,
+                       qualify=False,
+                       type_cast=False,
+                       cache=None,
+                       concurrency=1):
+    """
+    Generates INSERT statements for many destination tables, ordered so
+    that each table is loaded after the tables its foreign keys reference.
+
+    Args:
+        db_url (str): Database URL in SQLAlchemy format
+        jobs (list): (destination, sources) pairs; a destination without
+            sources gets an `INSERT INTO... VALUES` statement
+        qualify (bool): Qualify column names with table name even if only
+            one table
+        type_cast (bool): Cast values to destination data type where needed
+        cache (SchemaCache): Cache of column metadata to consult first;
+            foreign keys are always read from the database
+        concurrency (int): Number of tables to query metadata for at once;
+            see `InsertWriter`
+
+    Returns:
+        list: Lists of (destination, SQL statement), one list per level;
+            statements within a level may run concurrently
+
+    Raises:
+        CyclicDependencyError: If the destinations' foreign keys form a cycle
+    """
+
+    with InsertWriter(db_url, cache=cache,
+                      concurrency=concurrency) as writer:
+        columns = writer.col_data_for_tables(batch.job_table_names(jobs))
+        destinations = sorted(set(destination for (destination, _) in jobs))
+        job_levels = order_jobs(
+            jobs, writer.foreign_keys_for_tables(destinations))
+        source_foreign_keys = writer.foreign_keys_for_tables(
+            batch.joined_table_names(jobs))
+    result = [[] for _ in job_levels]
+    for (number, destination, sql) in render_migration(
+            db_url=writer.db_url,
+            job_levels=job_levels,
+            columns=columns,
+            qualify=qualify,
+            type_cast=type_cast,
+            foreign_keys=source_foreign_keys):
+        result[number - 1].append((destination, sql))
+    return result
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""Parameterized INSERT statements, for binding many rows with a driver."""
+
+from sql_insert_writer.sql_insert_writer import (INDENT,
+                                                 INSERT_FROM_VALUES_TEMPLATE,
+                                                 VALUES_TUPLE_TEMPLATE,
+                                                 InsertWriter, cast,
+                                                 db_engine_name, remove_last)
+
+# DB-API paramstyles, plus PostgreSQL's own `$1` for PREPARE
+PLACEHOLDERS = {
+    'qmark': lambda number, name: '?',
+    'format': lambda number, name: '%s',
+    'numeric': lambda number, name: ':{}'.format(number),
+    'named': lambda number, name: ':{}'.format(name),
+    'pyformat': lambda number, name: '%({})s'.format(name),
+    'prepare': lambda number, name: '${}'.format(number),
+}
+
+PARAMSTYLES = tuple(sorted(PLACEHOLDERS))
+
+# Paramstyles of the usual driver for each dialect: sqlite3, psycopg2, PyMySQL
+DEFAULT_PARAMSTYLES = {
+    'postgresql': 'format',
+    'sqlite': 'qmark',
+    'mysql': 'format',
+}
+
+
+def render_parameterized(db_url,
+                         destination,
+                         columns,
+                         paramstyle=None,
+                         type_cast=False,
+                         annotate=True):
+    """
+    Renders an `INSERT INTO... VALUES` SQL statement with a parameter for
+    each destination column, in the order of `col_data()`.
+
+    Args:
+        db_url (str): Database URL in SQLAlchemy format; used only for dialect
+        destination (str): Name of table to INSERT into
+        columns (dict): Table name: `Table`, as from `col_data()`, including
+            the destination
+        paramstyle (str): One of `PARAMSTYLES`: a DB-API paramstyle, or
+            'prepare' for a PostgreSQL `PREPARE` statement named
+            `insert_<destination>`; defaults to that of the dialect's usual
+            driver
+        type_cast (bool): Cast parameters to destination data type
+        annotate (bool): Lay the statement out over several lines, with
+            `-- ==>` comments; if False, write it on one line without any,
+            so drivers that rewrite INSERTs for `executemany()` recognize it
+
+    Returns:
+        str: A SQL statement
+
+    >>> from sql_insert_writer.metadata import Table
+    >>> columns = {'pet': Table.from_rows('pet', [('name', 'text')])}
+    >>> print(render_parameterized('sqlite://', 'pet', columns, 'named'))
+    <BLANKLINE>
+    INSERT INTO pet (
+      name
+    )
+    VALUES
+    (
+      :name  -- ==> name
+    )
+    >>> render_parameterized('mysql://', 'pet', columns, annotate=False)
+    'INSERT INTO pet (name) VALUES (%s)'
+    """
+
+    engine_name = db_engine_name(db_url)
+    paramstyle = paramstyle or DEFAULT_PARAMSTYLES.get(engine_name, 'qmark')
+    if paramstyle not in PLACEHOLDERS:
+        raise ValueError('Unknown paramstyle {}; use one of {}'.format(
+            paramstyle, ', '.join(PARAMSTYLES)))
+    if paramstyle == 'prepare' and engine_name != 'postgresql':
+        raise ValueError('PREPARE statements are generated only for '
+                         'PostgreSQL')
+    placeholder = PLACEHOLDERS[paramstyle]
+
+    column_names = []
+    source_exprs = []
+
+    for (number, dest_col) in enumerate(columns[destination], 1):
+        column_names.append(dest_col.column_name)
+        source_expr = placeholder(number, dest_col.column_name)
+        if type_cast:
+            source_expr = cast(source_expr,
+                               new_type=dest_col.data_type,
+                               db_url=db_url)
+        source_exprs.append(source_expr)
+
+    if annotate:
+        dest_column_block = ',\n'.join(INDENT + column_name
+                                       for column_name in column_names)
+        source_column_block = '\n'.join(
+            '{}{},  -- ==> {}'.format(INDENT, source_expr, column_name)
+            for (source_expr, column_name) in zip(source_exprs, column_names))
+        source_column_block = remove_last(source_column_block, ',')
+        result = INSERT_FROM_VALUES_TEMPLATE.format(
+            destination=destination,
+            dest_column_block=dest_column_block,
+            source_column_blocks=VALUES_TUPLE_TEMPLATE.format(
+                source_column_block=source_column_block))
+    else:
+        result = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            destination, ', '.join(column_names), ', '.join(source_exprs))
+    if paramstyle == 'prepare':
+        # Parameter types are inferred from the destination columns
+        result = 'PREPARE {} AS{}{}'.format(prepared_name(destination),
+                                            '' if annotate else ' ', result)
+    return result
+
+
+def prepared_name(destination):
+    """
+    Name of the PREPAREd statement inserting into `destination`
+
+    >>> prepared_name('public.pet')
+    'insert_public_pet'
+    """
+
+    return 'insert_' + destination.replace('.', '_')
+
+
+class InsertStatement(object):
+    """
+    A parameterized INSERT statement, and the order of its parameters.
+
+    Rows are bound in the statement's column order without rendering or
+    parsing any SQL again, so one statement serves any number of rows::
+
+        statement = generate_insert_statement(db_url, 'pet')
+        cursor.executemany(statement.sql, statement.iter_params(rows))
+
+    Args:
+        sql (str): The statement, as from `render_parameterized()`; best
+            without comments, which keep some drivers from batching rows
+        column_names (list): Destination column names, in parameter order
+        paramstyle (str): Paramstyle of `sql`
+    """
+
+    __slots__ = ('sql', 'column_names', 'paramstyle', '_by_name')
+
+    def __init__(self, sql, column_names, paramstyle):
+        self.sql = sql
+        self.column_names = tuple(column_names)
+        self.paramstyle = paramstyle
+        self._by_name = paramstyle in ('named', 'pyformat')
+
+    def __repr__(self):
+        return 'InsertStatement({!r}, {!r}, {!r})'.format(
+            self.sql, self.column_names, self.paramstyle)
+
+    def params(self, row):
+        """
+        Parameters for one row, in the form the paramstyle calls for: a dict
+        for named styles, otherwise a tuple
+
+        Args:
+            row: A dict of column name: value, with a value for every
+                column; or a sequence of values already in column order
+
+        Raises:
+            ValueError: If a dict `row` lacks a column.  A parameter cannot
+                stand for `DEFAULT`, and sending NULL instead would bypass
+                the column's default, so give a value, if only None.
+        """
+
+        if isinstance(row, dict):
+            missing = [column_name for column_name in self.column_names
+                       if column_name not in row]
+            if missing:
+                raise ValueError('Row has no value for column {}'.format(
+                    ', '.join(missing)))
+            if self._by_name:
+                return {column_name: row[column_name]
+                        for column_name in self.column_names}
+            return tuple(row[column_name] for column_name in self.column_names)
+        if self._by_name:
+            return dict(zip(self.column_names, row))
+        return tuple(row)
+
+    def iter_params(self, rows):
+        """Parameters for each of `rows`, as for `executemany()`"""
+
+        params = self.params
+        for row in rows:
+            yield params(row)
+
+
+def insert_statement(db_url,
+                     destination,
+                     columns,
+                     paramstyle=None,
+                     type_cast=False):
+    """
+    Builds an `InsertStatement` from known metadata; arguments as for
+    `render_parameterized()`
+
+    The statement is written on one line without comments, which PyMySQL
+    and mysqlclient need in order to turn `executemany()` into multi-row
+    INSERTs.
+    """
+
+    engine_name = db_engine_name(db_url)
+    paramstyle = paramstyle or DEFAULT_PARAMSTYLES.get(engine_name, 'qmark')
+    sql = render_parameterized(db_url=db_url,
+                               destination=destination,
+                               columns=columns,
+                               paramstyle=paramstyle,
+                               type_cast=type_cast,
+                               annotate=False)
+    return InsertStatement(sql=sql,
+                           column_names=[col.column_name
+                                         for col in columns[destination]],
+                           paramstyle=paramstyle)
+
+
+def generate_insert_statement(db_url,
+                              destination,
+                              paramstyle=None,
+                              type_cast=False,
+                              cache=None,
+                              schema=None):
+    """
+    Generates a parameterized `INSERT INTO... VALUES` statement.
+
+    Args:
+        db_url (str): Database URL in SQLAlchemy format
+        destination (str): Name of table to INSERT into
+        paramstyle (str): One of `PARAMSTYLES`; see `render_parameterized()`
+        type_cast (bool): Cast parameters to destination data type
+        cache (SchemaCache): Cache of column metadata to consult first
+        schema (Schema): Metadata to use instead of connecting to a database;
+            `db_url` may then be omitted
+
+    Returns:
+        InsertStatement: The statement and its parameters' order
+    """
+
+    with InsertWriter(db_url, cache=cache, schema=schema) as writer:
+        columns = writer.col_data_for_tables([destination, ])
+    return insert_statement(db_url=writer.db_url,
+                            destination=destination,
+                            columns=columns,
+                            paramstyle=paramstyle,
+                            type_cast=type_cast)
@@ -0,0 +1,366 @@
+# -*- coding: utf-8 -*-
+"""Splits `INSERT INTO... SELECT FROM` statements into independent pieces."""
+
+import time
+from collections import namedtuple
+from decimal import Decimal
+
+from sql_insert_writer.data import literal
+from sql_insert_writer.keys import primary_key
+from sql_insert_writer.sql_insert_writer import (PG_TABLE_OID,
+                                                 InsertWriter,
+                                                 db_engine_name,
+                                                 render_from_tables)
+
+PARTITION_METHODS = ('range', 'hash')
+
+DEFAULT_WORKERS = 4
+
+# Outcome of running one statement of `run_partitioned()`; `rowcount` is
+# None, and `error` the exception, if it failed
+PartResult = namedtuple('PartResult', ['number', 'rowcount', 'seconds',
+                                       'error'])
+
+
+class NoKeyError(Exception):
+    pass
+
+
+def choose_key(db, table_name, key=None):
+    """The column to split `table_name` on: `key`, or its primary key's
+    first"""
+
+    if key:
+        return key
+    primary_key_columns = primary_key(db, table_name)
+    if not primary_key_columns:
+        raise NoKeyError('No primary key on {}; name a key column'.format(
+            table_name))
+    return primary_key_columns[0]
+
+
+def quantiles_ntile(db, table_name, key, chunks):
+    """The first `key` of each of `chunks` runs of equally many rows, after
+    the first; one `ntile()` window query, which sorts the key once"""
+
+    qry = '''SELECT min(boundary) AS boundary
+             FROM (SELECT {0} AS boundary,
+                          ntile(:chunks) OVER (ORDER BY {0}) AS part
+                   FROM {1} WHERE {0} IS NOT NULL) AS parts
+             WHERE part > 1
+             GROUP BY part
+             ORDER BY part'''.format(key, table_name)
+    return [row.boundary for row in db.query(qry, chunks=chunks)]
+
+
+def quantiles_postgresql(db, table_name, key, chunks):
+    """Quantiles of `key` from the planner's histogram, which reads no rows;
+    from `ntile()` if the table has not been analyzed"""
+
+    qry = '''SELECT s.histogram_bounds::text::text[] AS bounds
+             FROM (SELECT CAST(:table_name AS text) AS table_name) AS n
+             JOIN pg_catalog.pg_class c ON (c.oid = {})
+             JOIN pg_catalog.pg_namespace ns ON (ns.oid = c.relnamespace)
+             JOIN pg_catalog.pg_stats s ON (s.schemaname = ns.nspname
+                                            AND s.tablename = c.relname
+                                            AND s.attname = :key)'''.format(
+        PG_TABLE_OID)
+    rows = db.query(qry, table_name=table_name, key=key).all()
+    bounds = rows[0].bounds if rows else None
+    if not bounds:
+        return quantiles_ntile(db, table_name, key, chunks)
+    # Histogram buckets each hold about as many rows
+    return [bounds[len(bounds) * i // chunks] for i in range(1, chunks)]
+
+
+quantile_functions = {
+    'postgresql': quantiles_postgresql,
+    'sqlite': quantiles_ntile,
+    'mysql': quantiles_ntile,
+}
+
+
+def key_boundaries(db, table_name, key, chunks):
+    """
+    Finds up to `chunks - 1` values of `key` that split `table_name` into
+    `chunks` ranges.
+
+    Numeric keys are split evenly between their minimum and maximum, which
+    costs one indexed query.  Other keys are split into ranges of about
+    equal row counts, all found at once: on PostgreSQL, from the planner's
+    histogram of the key in `pg_stats`; elsewhere (or before PostgreSQL has
+    analyzed the table) with one `ntile()` window query, which reads and
+    sorts the key once.
+
+    Returns:
+        list: Ascending boundary values
+    """
+
+    qry = 'SELECT min({0}) AS lo, max({0}) AS hi FROM {1}'.format(key,
+                                                                  table_name)
+    bounds = db.query(qry).all()[0]
+    (lo, hi) = (bounds.lo, bounds.hi)
+    if lo is None or chunks < 2:
+        return []
+
+    if isinstance(lo, int) and not isinstance(lo, bool):
+        span = hi - lo + 1
+        boundaries = [lo + span * i // chunks for i in range(1, chunks)]
+    elif isinstance(lo, (float, Decimal)):
+        boundaries = [lo + (hi - lo) * i / chunks for i in range(1, chunks)]
+    else:
+        db_type = db_engine_name(db.db_url)
+        quantile_function = quantile_functions.get(db_type)
+        if not quantile_function:
+            raise NotImplementedError('{} not supported'.format(db_type))
+        # Already ascending; histogram bounds come back as text, so are
+        # compared only for equality
+        result = []
+        for boundary in quantile_function(db, table_name, key, chunks):
+            if boundary != lo and (not result or boundary != result[-1]):
+                result.append(boundary)
+        return result
+
+    result = []
+    for boundary in boundaries:
+        if boundary > lo and (not result or boundary > result[-1]):
+            result.append(boundary)
+    return result
+
+
+def range_conditions(key_expr, boundaries, db_url):
+    """
+    WHERE conditions for consecutive ranges of `key_expr` split at
+    `boundaries`; together they cover every row, including NULL keys
+
+    >>> range_conditions('id', [100, 200], 'sqlite://')
+    ['id < 100 OR id IS NULL', 'id >= 100 AND id < 200', 'id >= 200']
+    """
+
+    if not boundaries:
+        return ['1 = 1']
+    bounds = [literal(boundary, db_url) for boundary in boundaries]
+    conditions = ['{0} < {1} OR {0} IS NULL'.format(key_expr, bounds[0])]
+    for (lower, upper) in zip(bounds, bounds[1:]):
+        conditions.append('{0} >= {1} AND {0} < {2}'.format(key_expr, lower,
+                                                            upper))
+    conditions.append('{} >= {}'.format(key_expr, bounds[-1]))
+    return conditions
+
+
+def hash_bucket_postgresql(key_expr, partitions):
+    # Masking the sign bit keeps the hash non-negative, where abs() could
+    # overflow; mod() rather than %, which drivers may take for a parameter
+    return 'mod(hashtext({}::text) & 2147483647, {})'.format(
+        key_expr, partitions)
+
+
+def hash_bucket_mysql(key_expr, partitions):
+    return 'mod(crc32({}), {})'.format(key_expr, partitions)
+
+
+def hash_bucket_sqlite(key_expr, partitions):
+    # SQLite has no hash function; integer keys are spread by value, and
+    # all others land in a single partition
+    return '(({0} % {1}) + {1}) % {1}'.format(key_expr, partitions)
+
+
+hash_bucket_functions = {
+    'postgresql': hash_bucket_postgresql,
+    'sqlite': hash_bucket_sqlite,
+    'mysql': hash_bucket_mysql,
+}
+
+
+def hash_conditions(key_expr, partitions, db_url):
+    """
+    WHERE conditions for `partitions` buckets of a hash of `key_expr`;
+    together they cover every row, NULL keys falling in the first
+
+    Unlike ranges, buckets need no query of the data to find, and stay even
+    however the key's values are distributed.
+
+    >>> hash_conditions('id', 2, 'postgresql://')[1]
+    'mod(hashtext(id::text) & 2147483647, 2) = 1'
+    """
+
+    db_type = db_engine_name(db_url)
+    hash_bucket_function = hash_bucket_functions.get(db_type)
+    if not hash_bucket_function:
+        raise NotImplementedError('{} not supported'.format(db_type))
+    bucket = hash_bucket_function(key_expr, partitions)
+    conditions = ['{} = {}'.format(bucket, number)
+                  for number in range(partitions)]
+    conditions[0] += ' OR {} IS NULL'.format(key_expr)
+    return conditions
+
+
+def key_expression(sources, key, qualify=False):
+    """The key column of the first source, qualified as the SELECT will be"""
+
+    if len(sources) > 1 or qualify:
+        return '{}.{}'.format(sources[0], key)
+    return key
+
+
+def render_partitioned(db_url,
+                       destination,
+                       sources,
+                       columns,
+                       conditions,
+                       qualify=False,
+                       type_cast=False,
+                       foreign_keys=None,
+                       match_threshold=None):
+    """
+    Renders one `INSERT INTO... SELECT FROM... WHERE` statement per condition.
+
+    Args:
+        db_url (str): Database URL in SQLAlchemy format; used only for dialect
+        destination (str): Name of table to INSERT into
+        sources (list): Names of tables to select from, in order of preference
+        columns (dict): Table name: column metadata, as from `col_data()`,
+            for the destination and all sources
+        conditions (list): WHERE conditions, one for each statement
+        qualify (bool): Qualify column names with table name even if only
+            one table
+        type_cast (bool): Cast values to destination data type where needed
+        foreign_keys (dict): Table name: list of `ForeignKey`, as from
+            `keys.foreign_keys()`, for the sources; fills JOIN conditions
+        match_threshold (float): If given, also match source columns named
+            only approximately like destination columns; see
+            `match_source_columns()`
+
+    Returns:
+        list: SQL statements, each labelled and ending with `;`
+    """
+
+    insert = render_from_tables(db_url=db_url,
+                                destination=destination,
+                                sources=sources,
+                                columns=columns,
+                                qualify=qualify,
+                                type_cast=type_cast,
+                                foreign_keys=foreign_keys,
+                                match_threshold=match_threshold)
+    return ['-- Part {} of {}{}\nWHERE {};'.format(number, len(conditions),
+                                                   insert, condition)
+            for (number, condition) in enumerate(conditions, 1)]
+
+
+def generate_chunked(db_url,
+                     destination,
+                     sources,
+                     chunks,
+                     key=None,
+                     qualify=False,
+                     type_cast=False,
+                     cache=None,
+                     method='range',
+                     match_threshold=None):
+    """
+    Generates `INSERT INTO... SELECT FROM` statements for consecutive ranges,
+    or hash buckets, of the first source's key.
+
+    Each statement is independent, so they may be run one at a time (and
+    resumed after the last one completed), or in parallel.
+
+    Args:
+        db_url (str): Database URL in SQLAlchemy format
+        destination (str): Name of table to INSERT into
+        sources (list): Names of tables to select from, in order of preference
+        chunks (int): Number of statements to split into; fewer are produced
+            if the key has fewer distinct values
+        key (str): Column of the first source to split on; defaults to the
+            first column of its primary key
+        qualify (bool): Qualify column names with table name even if only
+            one table
+        type_cast (bool): Cast values to destination data type where needed
+        cache (SchemaCache): Cache of column metadata to consult first
+        method (str): 'range' to split the key into ranges, or 'hash' into
+            hash buckets (see `hash_conditions()`)
+        match_threshold (float): If given, also match source columns named
+            only approximately like destination columns; see
+            `match_source_columns()`
+
+    Returns:
+        list: SQL statements
+    """
+
+    with InsertWriter(db_url, cache=cache) as writer:
+        columns = writer.col_data_for_tables([destination, ] + list(sources))
+        foreign_keys = (writer.foreign_keys_for_tables(sources)
+                        if len(sources) > 1 else None)
+        key = choose_key(writer.db, sources[0], key)
+        if method == 'hash':
+            conditions = hash_conditions(
+                key_expression(sources, key, qualify), chunks, db_url)
+        else:
+            boundaries = key_boundaries(writer.db, sources[0], key, chunks)
+            conditions = range_conditions(
+                key_expression(sources, key, qualify), boundaries, db_url)
+    return render_partitioned(db_url=db_url,
+                              destination=destination,
+                              sources=sources,
+                              columns=columns,
+                              conditions=conditions,
+                              qualify=qualify,
+                              type_cast=type_cast,
+                              foreign_keys=foreign_keys,
+                              match_threshold=match_threshold)
+
+
+def run_partitioned(db_url, statements, workers=DEFAULT_WORKERS,
+                    progress=None, **engine_kwargs):
+    """
+    Runs independent statements, as from `render_partitioned()`, at most
+    `workers` at a time, each in its own transaction on its own pooled
+    connection
+
+    A statement that fails is rolled back and reported, without stopping
+    the others; once it is fixed, only the failed statements need running
+    again.
+
+    Args:
+        db_url (str): Database URL in SQLAlchemy format
+        statements (list): SQL statements
+        workers (int): Most statements to run at once
+        progress (callable): Called with each `PartResult` as its statement
+            finishes
+        **engine_kwargs: Passed to SQLAlchemy's `create_engine`
+
+    Returns:
+        list: A `PartResult` for each statement, in order
+    """
+
+    import sqlalchemy
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    if db_engine_name(db_url) != 'sqlite':  # SQLite files are not pooled
+        engine_kwargs.setdefault('pool_size', workers)
+        engine_kwargs.setdefault('max_overflow', 0)
+    engine = sqlalchemy.create_engine(db_url, **engine_kwargs)
+
+    def run(number, statement):
+        start = time.perf_counter()
+        try:
+            with engine.begin() as conn:
+                rowcount = conn.execute(statement).rowcount
+        except Exception as err:  # reported with the part, not fatal
+            return PartResult(number, None, time.perf_counter() - start, err)
+        return PartResult(number, rowcount, time.perf_counter() - start,
+                          None)
+
+    results = []
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(run, number, statement)
+                       for (number, statement) in enumerate(statements, 1)]
+            for future in as_completed(futures):
+                result = future.result()
+                if progress:
+                    progress(result)
+                results.append(result)
+    finally:
+        engine.dispose()
+    return sorted(results, key=lambda result: result.number)
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""Times the phases of generating SQL, and counts the work done in each."""
+
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class Profiler(object):
+    """
+    Accumulates seconds spent per phase, and counters, over a run.
+
+    Phases are 'connect', 'col_data' (metadata lookups), 'foreign_keys',
+    'versions' (checking for schema changes), 'merge' (matching source
+    columns to destination columns), 'sample' (sampling values for casts),
+    'render', 'explain', 'analyze', 'execute' and 'run' (executing the
+    chunks of a partitioned statement).  Counters are 'queries', 'tables',
+    'rows_fetched' (of metadata), 'cache_hits' and 'bytes_rendered'.
+
+    Args:
+        hooks (list): Callables to forward each measurement to, as
+            `hook(kind, name, value)`, where `kind` is 'timing' (with
+            `value` in seconds) or 'counter' (with `value` an increment);
+            for instance, to send them on to a metrics system
+    """
+
+    def __init__(self, hooks=()):
+        self.timings = OrderedDict()
+        self.counters = OrderedDict()
+        self.hooks = list(hooks)
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def _record(self, totals, kind, name, value):
+        with self._lock:
+            totals[name] = totals.get(name, 0) + value
+        for hook in self.hooks:
+            hook(kind, name, value)
+
+    def count(self, name, amount=1):
+        """Adds `amount` to counter `name`"""
+        self._record(self.counters, 'counter', name, amount)
+
+    @contextmanager
+    def phase(self, name):
+        """Context manager adding the time spent inside it to phase `name`"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(self.timings, 'timing', name,
+                         time.perf_counter() - start)
+
+    def iter_phase(self, name, chunks):
+        """
+        Passes through the strings of iterable `chunks`, adding the time
+        spent producing them to phase `name`, and their length to
+        'bytes_rendered'
+        """
+
+        chunks = iter(chunks)
+        while True:
+            with self.phase(name):
+                chunk = next(chunks, None)
+            if chunk is None:
+                return
+            self.count('bytes_rendered', len(chunk))
+            yield chunk
+
+    def report(self):
+        """Human-readable summary of timings and counters"""
+
+        lines = ['{:<16} {:>10.4f} s'.format(name, seconds)
+                 for (name, seconds) in self.timings.items()]
+        lines.append('{:<16} {:>10.4f} s'.format('total',
+                                                 sum(self.timings.values())))
+        lines.extend('{:<16} {:>10}'.format(name, value)
+                     for (name, value) in self.counters.items())
+        return '\n'.join(lines)
+
+
+class CountingDatabase(object):
+    """
+    Wraps a `records.Database` (or `PooledConnection`), counting the queries
+    run through it in `profiler`
+    """
+
+    def __init__(self, db, profiler):
+        self._db = db
+        self._profiler = profiler
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+    def query(self, query, **params):
+        self._profiler.count('queries')
+        return self._db.query(query, **params)
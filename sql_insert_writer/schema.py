@@ -0,0 +1,391 @@
+# -*- coding: utf-8 -*-
+"""Table metadata from DDL scripts and JSON snapshots, for use offline."""
+
+import json
+import re
+
+from sql_insert_writer.metadata import Column, Table
+from sql_insert_writer.sql_insert_writer import (BadDBNameError,
+                                                 col_data_for_tables,
+                                                 db_engine_name)
+
+SNAPSHOT_FORMAT = 'sql_insert_writer schema snapshot'
+
+
+class Schema(object):
+    """
+    Column metadata for a set of tables, standing in for a live database.
+
+    Pass as `schema=` to the generating functions to work without any
+    database connection.
+
+    Args:
+        dialect (str): Database engine name, like 'postgresql'
+        tables (dict): Table name: `Table`, as from `col_data()`
+    """
+
+    def __init__(self, dialect, tables):
+        self.dialect = dialect
+        self.tables = tables
+
+    @property
+    def db_url(self):
+        """Stand-in database URL, naming only the dialect"""
+        return '{}://'.format(self.dialect)
+
+    @classmethod
+    def from_database(cls, db_url, table_names, cache=None):
+        """Snapshots metadata for `table_names` from a live database"""
+
+        return cls(dialect=db_engine_name(db_url),
+                   tables=col_data_for_tables(db_url, table_names, cache))
+
+    def col_data_bulk(self, table_names):
+        """Metadata for several tables' columns, as from `col_data_bulk()`"""
+
+        result = {}
+        for table_name in table_names:
+            columns = (self.tables.get(table_name) or
+                       self.tables.get(table_name.lower()))
+            if not columns:
+                raise BadDBNameError(
+                    'No table {} in schema file'.format(table_name))
+            result[table_name] = columns
+        return result
+
+    def write(self, outfile):
+        """Writes this schema to `outfile` as a JSON snapshot"""
+
+        tables = {table_name: [{'column_name': col.column_name,
+                                'data_type': col.data_type}
+                               for col in columns]
+                  for (table_name, columns) in self.tables.items()}
+        json.dump({'format': SNAPSHOT_FORMAT,
+                   'dialect': self.dialect,
+                   'tables': tables},
+                  outfile, indent=2, sort_keys=True)
+
+
+def read_snapshot(snapshot):
+    """Builds a `Schema` from the parsed contents of a JSON snapshot"""
+
+    tables = {table_name: Table.from_rows(table_name,
+                                          ((col['column_name'],
+                                            col['data_type'])
+                                           for col in columns))
+              for (table_name, columns) in snapshot['tables'].items()}
+    return Schema(dialect=snapshot['dialect'], tables=tables)
+
+
+def load_schema(path, dialect=None):
+    """
+    Reads a schema file: a JSON snapshot, or a script of CREATE TABLEs
+
+    Args:
+        path (str): File to read; `pg_dump --schema-only`, SQLite `.schema`
+            and MySQL `SHOW CREATE TABLE` output are all understood
+        dialect (str): Database engine the DDL was written for; guessed
+            from the DDL if not given
+
+    Returns:
+        Schema
+    """
+
+    with open(path) as infile:
+        text = infile.read()
+    if text.lstrip().startswith('{'):
+        return read_snapshot(json.loads(text))
+    dialect = dialect or guess_dialect(text)
+    return Schema(dialect=dialect, tables=parse_ddl(text, dialect))
+
+
+def guess_dialect(ddl):
+    """
+    Guesses which database engine a DDL script was written for
+
+    >>> guess_dialect('CREATE TABLE `pet` (id int) ENGINE=InnoDB;')
+    'mysql'
+    """
+
+    if re.search(r'pg_dump|search_path|\bserial\b|::|OWNER TO', ddl,
+                 re.IGNORECASE):
+        return 'postgresql'
+    if re.search(r'`|\bENGINE\s*=|\bAUTO_INCREMENT\b', ddl, re.IGNORECASE):
+        return 'mysql'
+    return 'sqlite'
+
+
+def quoted_end(sql, pos):
+    """Position just past the quoted string or identifier starting at `pos`"""
+
+    quote = sql[pos]
+    end = sql.find(quote, pos + 1)
+    while end != -1 and sql[end + 1:end + 2] == quote:  # doubled quote
+        end = sql.find(quote, end + 2)
+    return len(sql) if end == -1 else end + 1
+
+
+QUOTES = '\'"`'
+
+
+def strip_comments(sql):
+    """
+    Removes `--` and `/* */` comments from `sql`, leaving quoted text alone
+
+    >>> strip_comments("SELECT '--', 1 -- one")
+    "SELECT '--', 1 "
+    """
+
+    kept = []
+    pos = 0
+    while pos < len(sql):
+        if sql.startswith('--', pos):
+            end = sql.find('\n', pos)
+            pos = len(sql) if end == -1 else end
+        elif sql.startswith('/*', pos):
+            end = sql.find('*/', pos)
+            pos = len(sql) if end == -1 else end + 2
+        elif sql[pos] in QUOTES:
+            end = quoted_end(sql, pos)
+            kept.append(sql[pos:end])
+            pos = end
+        else:
+            kept.append(sql[pos])
+            pos += 1
+    return ''.join(kept)
+
+
+def unquoted_positions(sql, start=0):
+    """
+    Yields (position, parenthesis depth) for each character of comment-free
+    `sql` that is not inside quotes, beginning at `start`
+    """
+
+    depth = 0
+    pos = start
+    while pos < len(sql):
+        if sql[pos] in QUOTES:
+            pos = quoted_end(sql, pos)
+            continue
+        if sql[pos] == '(':
+            depth += 1
+        elif sql[pos] == ')':
+            depth -= 1
+        yield (pos, depth)
+        pos += 1
+
+
+def split_top_level(sql):
+    """
+    Splits `sql` on commas outside parentheses and quotes
+
+    >>> split_top_level("a numeric(10, 2), b text DEFAULT 'x,y'")
+    ['a numeric(10, 2)', " b text DEFAULT 'x,y'"]
+    """
+
+    parts = []
+    prev = 0
+    for (pos, depth) in unquoted_positions(sql):
+        if sql[pos] == ',' and depth == 0:
+            parts.append(sql[prev:pos])
+            prev = pos + 1
+    parts.append(sql[prev:])
+    return parts
+
+
+IDENTIFIER = r'(?:[\w$]+|"(?:[^"]|"")+"|`[^`]+`|\[[^\]]+\])'
+
+CREATE_TABLE = re.compile(
+    r'\bCREATE\s+(?:(?:GLOBAL|LOCAL)\s+)?'
+    r'(?:(?:TEMP|TEMPORARY|UNLOGGED)\s+)?TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?'
+    r'(?P<name>{0}(?:\s*\.\s*{0})*)\s*\('.format(IDENTIFIER),
+    re.IGNORECASE)
+
+# Table elements beginning with these words are constraints, not columns
+CONSTRAINT_WORDS = {'constraint', 'primary', 'foreign', 'unique', 'check',
+                    'exclude', 'key', 'index', 'fulltext', 'spatial', 'like',
+                    'period'}
+
+# The data type ends where the first of these column constraints begins
+END_OF_TYPE = re.compile(
+    r'\s+(?:NOT|NULL|DEFAULT|PRIMARY|REFERENCES|UNIQUE|CHECK|CONSTRAINT|'
+    r'COLLATE|GENERATED|AUTO_INCREMENT|AUTOINCREMENT|COMMENT|ON|AS|'
+    r'CHARACTER\s+SET|IDENTITY)\b.*$',
+    re.IGNORECASE | re.DOTALL)
+
+
+def unquote(identifier):
+    """
+    Removes quoting from an identifier
+
+    >>> unquote('"Pet"'), unquote('`pet`'), unquote('pet')
+    ('Pet', 'pet', 'pet')
+    """
+
+    if identifier[:1] in '"`[':
+        return identifier[1:-1].replace('""', '"')
+    return identifier
+
+
+def parse_column(element):
+    """
+    Parses one element of a CREATE TABLE body into (column name, data type)
+
+    Returns None for table constraints.
+
+    >>> parse_column('  "kg" numeric(5, 2) NOT NULL DEFAULT 0')
+    ('kg', 'numeric(5, 2)')
+    """
+
+    match = re.match(r'\s*({})\s*(.*)$'.format(IDENTIFIER), element,
+                     re.DOTALL)
+    if not match:
+        return None
+    (name, rest) = match.groups()
+    if name.lower() in CONSTRAINT_WORDS:
+        return None
+    data_type = END_OF_TYPE.sub('', ' ' + rest.strip()).strip()
+    return (unquote(name), ' '.join(data_type.split()))
+
+
+POSTGRESQL_TYPE_ALIASES = {
+    'int': 'integer',
+    'int4': 'integer',
+    'serial': 'integer',
+    'serial4': 'integer',
+    'int2': 'smallint',
+    'smallserial': 'smallint',
+    'serial2': 'smallint',
+    'int8': 'bigint',
+    'bigserial': 'bigint',
+    'serial8': 'bigint',
+    'varchar': 'character varying',
+    'char': 'character',
+    'bpchar': 'character',
+    'bool': 'boolean',
+    'float4': 'real',
+    'float8': 'double precision',
+    'float': 'double precision',
+    'decimal': 'numeric',
+    'timestamp': 'timestamp without time zone',
+    'timestamptz': 'timestamp with time zone',
+    'time': 'time without time zone',
+    'timetz': 'time with time zone',
+    'varbit': 'bit varying',
+}
+
+POSTGRESQL_BUILTIN_TYPES = set(POSTGRESQL_TYPE_ALIASES.values()) | {
+    'bit', 'bytea', 'cidr', 'date', 'inet', 'interval', 'json', 'jsonb',
+    'macaddr', 'money', 'oid', 'text', 'tsquery', 'tsvector', 'uuid', 'xml',
+    'point', 'line', 'lseg', 'box', 'path', 'polygon', 'circle', 'name',
+    'int4range', 'int8range', 'numrange', 'tsrange', 'tstzrange', 'daterange',
+}
+
+SQLITE_STRICT_TYPES = {'INT', 'INTEGER', 'REAL', 'TEXT', 'BLOB', 'ANY'}
+
+MYSQL_TYPE_ALIASES = {
+    'integer': 'int',
+    'bool': 'tinyint',
+    'boolean': 'tinyint',
+    'dec': 'decimal',
+    'numeric': 'decimal',
+    'fixed': 'decimal',
+    'double precision': 'double',
+    'real': 'double',
+}
+
+
+def normalize_data_type(declared, dialect):
+    """
+    Converts a declared column type to the name the live database reports
+
+    PostgreSQL and MySQL report types as `information_schema.columns` does,
+    without length or precision; SQLite reports types as declared, except
+    that (since 3.37) it capitalizes the names allowed in STRICT tables.
+
+    >>> normalize_data_type('VARCHAR(20)', 'postgresql')
+    'character varying'
+    >>> normalize_data_type('timestamp(3) with time zone', 'postgresql')
+    'timestamp with time zone'
+    >>> normalize_data_type('INT(11) UNSIGNED', 'mysql')
+    'int'
+    >>> normalize_data_type('varchar(20)', 'sqlite')
+    'varchar(20)'
+    """
+
+    if dialect not in ('postgresql', 'mysql'):
+        if declared.upper() in SQLITE_STRICT_TYPES:
+            return declared.upper()
+        return declared
+    data_type = re.sub(r'\s*\([^)]*\)', '', declared.lower())
+    data_type = ' '.join(data_type.split())
+    if dialect == 'postgresql':
+        if data_type.endswith(']') or data_type.startswith('array'):
+            return 'ARRAY'
+        data_type = POSTGRESQL_TYPE_ALIASES.get(data_type, data_type)
+        if data_type not in POSTGRESQL_BUILTIN_TYPES:
+            return 'USER-DEFINED'
+        return data_type
+    data_type = re.sub(r'\s+(unsigned|signed|zerofill)\b', '', data_type)
+    return MYSQL_TYPE_ALIASES.get(data_type, data_type)
+
+
+def parse_ddl(ddl, dialect):
+    """
+    Reads the column definitions from the CREATE TABLE statements in `ddl`
+
+    Schema-qualified tables are listed both with and without their schema
+    name.  Other statements are ignored.
+
+    Args:
+        ddl (str): SQL script
+        dialect (str): Database engine the script was written for
+
+    Returns:
+        dict: Table name: `Table`, as from `col_data()`
+
+    >>> tables = parse_ddl('CREATE TABLE public.pet (id serial, name text)',
+    ...                    'postgresql')
+    >>> [(col.column_name, col.data_type) for col in tables['pet']]
+    [('id', 'integer'), ('name', 'text')]
+    """
+
+    ddl = strip_comments(ddl)
+    tables = {}
+    for match in CREATE_TABLE.finditer(ddl):
+        body_start = match.end()
+        body_end = len(ddl)
+        for (pos, depth) in unquoted_positions(ddl, body_start):
+            if depth < 0:
+                body_end = pos
+                break
+        names = [unquote(name.strip())
+                 for name in split_qualified(match.group('name'))]
+        columns = []
+        for element in split_top_level(ddl[body_start:body_end]):
+            column = parse_column(element)
+            if column:
+                columns.append(Column(names[-1], column[0],
+                                      normalize_data_type(column[1], dialect)))
+        columns = Table(names[-1], columns)
+        tables['.'.join(names)] = columns
+        tables.setdefault(names[-1], columns)
+    return tables
+
+
+def split_qualified(name):
+    """
+    Splits a possibly schema-qualified name on dots outside quotes
+
+    >>> split_qualified('public."my.table"')
+    ['public', '"my.table"']
+    """
+
+    parts = []
+    prev = 0
+    for (pos, depth) in unquoted_positions(name):
+        if name[pos] == '.':
+            parts.append(name[prev:pos])
+            prev = pos + 1
+    parts.append(name[prev:])
+    return parts
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Serves INSERT statements over a Unix socket, keeping connections and
+table metadata warm between requests.
+
+Each request is one line of JSON, mirroring the command line's arguments::
+
+    {"db": "postgresql://localhost/pets", "destination": "pet",
+     "sources": ["animal"], "tuples": 1, "qualify": false, "cast": false}
+
+and is answered with one line of JSON: `{"sql": "..."}` or
+`{"error": "..."}`.  Only `destination` is required; `db` defaults to the
+server's database.  `"refresh": true` fetches the tables' metadata again.
+"""
+
+import json
+import os
+import socket
+import socketserver
+import stat
+import threading
+
+from sql_insert_writer.sql_insert_writer import InsertWriter, db_engine_name
+from sql_insert_writer.versions import changed_tables, schema_versions
+
+
+class ServerError(Exception):
+    pass
+
+
+class WarmWriter(object):
+    """An `InsertWriter`, with the version of each table it has looked up"""
+
+    def __init__(self, db_url, concurrency=1):
+        engine_kwargs = {}
+        if db_engine_name(db_url) == 'sqlite':
+            # Requests arrive on different threads, but one at a time
+            engine_kwargs['connect_args'] = {'check_same_thread': False}
+        self.writer = InsertWriter(db_url, concurrency=concurrency,
+                                   **engine_kwargs)
+        self.versions = {}
+        self.lock = threading.Lock()
+
+    def refresh(self, table_names):
+        """Forgets metadata for any of `table_names` changed since last seen"""
+
+        # Read before any metadata, so a change in between is caught later
+        current = schema_versions(self.writer.db, table_names)
+        known = {table_name: self.versions[table_name]
+                 for table_name in table_names if table_name in self.versions}
+        changed = changed_tables(known, current)
+        if changed:
+            self.writer.invalidate(changed)
+        self.versions.update(current)
+        return changed
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = self.server.handle_request(
+                    json.loads(line.decode('utf-8')))
+            except Exception as err:  # reported to the client, not fatal
+                response = {'error': '{}: {}'.format(type(err).__name__, err)}
+            self.wfile.write((json.dumps(response) + '\n').encode('utf-8'))
+
+
+class InsertServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Generates INSERT statements on request, keeping one `InsertWriter` per
+    database URL.
+
+    Before each request, the tables named are checked for changes (see
+    `versions.schema_versions()`), and their metadata fetched again if they
+    have changed.
+
+    Args:
+        socket_path (str): File name of the Unix socket to listen on
+        db_url (str): Database URL for requests that do not name one
+        concurrency (int): Passed to each `InsertWriter`
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, db_url=None, concurrency=1):
+        self.db_url = db_url
+        self.concurrency = concurrency
+        self.writers = {}
+        self._writers_lock = threading.Lock()
+        socketserver.UnixStreamServer.__init__(self, socket_path,
+                                               RequestHandler)
+
+    def warm_writer(self, db_url):
+        with self._writers_lock:
+            if db_url not in self.writers:
+                self.writers[db_url] = WarmWriter(db_url, self.concurrency)
+            return self.writers[db_url]
+
+    def handle_request(self, request):
+        """Generates the SQL for one parsed request
+
+        Returns dict to send back as the response"""
+
+        db_url = request.get('db') or self.db_url
+        if not db_url:
+            raise ValueError('No database URL in request, and no default')
+        destination = request['destination']
+        sources = list(request.get('sources') or [])
+        table_names = [destination, ] + sources
+
+        warm = self.warm_writer(db_url)
+        with warm.lock:
+            if request.get('refresh'):
+                warm.writer.invalidate(table_names)
+            warm.refresh(table_names)
+            if sources:
+                sql = warm.writer.generate_from_tables(
+                    destination=destination,
+                    sources=sources,
+                    qualify=bool(request.get('qualify')),
+                    type_cast=bool(request.get('cast')))
+            else:
+                sql = warm.writer.generate_from_values(
+                    destination=destination,
+                    number_of_tuples=int(request.get('tuples') or 1),
+                    type_cast=bool(request.get('cast')))
+        return {'sql': sql}
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        for warm in self.writers.values():
+            warm.writer.close()
+        try:
+            os.remove(self.server_address)
+        except OSError:
+            pass
+
+
+def remove_stale_socket(socket_path):
+    """
+    Removes a socket file left behind by a server no longer running
+
+    Raises:
+        ServerError: If `socket_path` is not a socket, or a server is still
+            listening on it
+    """
+
+    if not os.path.exists(socket_path):
+        return
+    if not stat.S_ISSOCK(os.stat(socket_path).st_mode):
+        raise ServerError('{} exists and is not a socket'.format(
+            socket_path))
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+    except ConnectionRefusedError:
+        os.remove(socket_path)
+        return
+    finally:
+        client.close()
+    raise ServerError('A server is already running on {}'.format(
+        socket_path))
+
+
+def serve(socket_path, db_url=None, concurrency=1):
+    """
+    Serves requests on `socket_path` until interrupted
+
+    A socket file left behind by an earlier server is replaced, but not one
+    a server is still listening on.  The socket is accessible only to the
+    current user, since it can reach the database with the server's
+    credentials.
+    """
+
+    remove_stale_socket(socket_path)
+    old_umask = os.umask(0o077)
+    try:
+        server = InsertServer(socket_path, db_url=db_url,
+                              concurrency=concurrency)
+    finally:
+        os.umask(old_umask)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def send_request(socket_path, request):
+    """
+    Sends `request` (a dict) to the server at `socket_path`
+
+    Returns:
+        str: The SQL generated
+
+    Raises:
+        ServerError: With the server's message, if it could not generate SQL
+    """
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+        client.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        with client.makefile('rb') as infile:
+            response = json.loads(infile.readline().decode('utf-8'))
+    finally:
+        client.close()
+    if 'error' in response:
+        raise ServerError(response['error'])
+    return response['sql']
@@ -1,9 +1,17 @@
 # -*- coding: utf-8 -*-
 
-from attrdict import AttrDict
-import records
+# records and SQLAlchemy are imported only where a database is actually
+# queried, so that runs without one (`--help`, `--schema-file`, cached
+# metadata) start quickly.
 
-from sqlalchemy.exc import ResourceClosedError
+import warnings
+from collections import ChainMap
+
+from sql_insert_writer.joins import (JoinConditionWarning, join_graph,
+                                     join_tree, on_clause)
+from sql_insert_writer.matching import ColumnIndex, approximate_matches
+from sql_insert_writer.metadata import Column, Table, group_by_table
+from sql_insert_writer.profiling import CountingDatabase, Profiler
 
 
 class BadDBNameError(Exception):
@@ -18,14 +26,14 @@ def db_engine_name(db_url):
 
 
 def col_data_info_schema(db, table_name):
-    """Gets metadata for a PostgreSQL table's columns"""
+    """Gets metadata for a MySQL (or PostgreSQL) table's columns"""
 
     qry = '''SELECT table_name, column_name, data_type
              FROM information_schema.columns
              WHERE table_name=:table_name
              ORDER BY ordinal_position'''
 
-    return db.query(qry, table_name=table_name).all()
+    return Table(table_name, db.query(qry, table_name=table_name))
 
 
 def col_data_sqlite(db, table_name):
@@ -35,28 +43,134 @@ def col_data_sqlite(db, table_name):
     # Alas cannot use proper parameters here; not recognized in
     # the context of a PRAGMA statement
 
-    db.query(qry)
-    curs = db.db.connection.cursor()
+    from sqlalchemy.exc import ResourceClosedError
     try:
-        curs.execute(qry)
-        return [AttrDict({'table_name': table_name,
-                          'column_name': row.name,
-                          'data_type': row.type}) for row in db.query(qry)]
+        return Table(table_name, (Column(table_name, row.name, row.type)
+                                  for row in db.query(qry)))
     except ResourceClosedError:  # thus SQLite reacts to nonexistent table
-        return []
+        return Table(table_name, ())
+
+
+# Resolves `n.table_name` as a query naming it would: as `schema.table`, or
+# through `search_path`.  A name only matching a quoted identifier, like
+# `Pet`, resolves too, as `information_schema` lookups by name did.
+PG_TABLE_OID = ('COALESCE(to_regclass(n.table_name), '
+                'to_regclass(quote_ident(n.table_name)))')
+
+
+def col_data_pg_catalog_bulk(db, table_names):
+    """Gets metadata for several PostgreSQL tables' columns in one query
+
+    Reads `pg_catalog` directly, avoiding the privilege checks
+    `information_schema.columns` makes of every relation.  Data types are
+    named as `information_schema` names them."""
+
+    table_names = sorted(set(table_names))
+    if not table_names:
+        return {}
+    (placeholders, params) = table_name_params(table_names)
+    qry = '''SELECT n.table_name, a.attname AS column_name,
+                    CASE WHEN t.typtype = 'd' THEN
+                           CASE WHEN bt.typelem <> 0 AND bt.typlen = -1
+                                  THEN 'ARRAY'
+                                WHEN nbt.nspname = 'pg_catalog'
+                                  THEN format_type(t.typbasetype, NULL)
+                                ELSE 'USER-DEFINED' END
+                         WHEN t.typelem <> 0 AND t.typlen = -1 THEN 'ARRAY'
+                         WHEN nt.nspname = 'pg_catalog'
+                           THEN format_type(a.atttypid, NULL)
+                         ELSE 'USER-DEFINED' END AS data_type
+             FROM unnest(ARRAY[{}]) AS n (table_name)
+             JOIN pg_catalog.pg_attribute a ON (a.attrelid = {})
+             JOIN pg_catalog.pg_type t ON (t.oid = a.atttypid)
+             JOIN pg_catalog.pg_namespace nt ON (nt.oid = t.typnamespace)
+             LEFT JOIN pg_catalog.pg_type bt
+               ON (t.typtype = 'd' AND bt.oid = t.typbasetype)
+             LEFT JOIN pg_catalog.pg_namespace nbt
+               ON (nbt.oid = bt.typnamespace)
+             WHERE a.attnum > 0
+             AND NOT a.attisdropped
+             ORDER BY n.table_name, a.attnum'''
+    qry = qry.format(placeholders, PG_TABLE_OID)
+
+    return group_by_table(db.query(qry, **params))
+
+
+def col_data_pg_catalog(db, table_name):
+    """Gets metadata for a PostgreSQL table's columns from `pg_catalog`"""
+
+    return col_data_pg_catalog_bulk(db, [table_name, ]).get(
+        table_name, Table(table_name, ()))
 
 
 col_data_functions = {
-    'postgresql': col_data_info_schema,
+    'postgresql': col_data_pg_catalog,
     'sqlite': col_data_sqlite,
     'mysql': col_data_info_schema,
 }
 
 
+def table_name_params(table_names):
+    """
+    Bind parameters for a list of table names
+
+    Returns (placeholders, params): placeholder text for an `IN (...)`
+    list, and the dict of parameter values to go with it
+
+    >>> table_name_params(['tab1', 'tab2'])[0]
+    ':table_name_0, :table_name_1'
+    """
+
+    names = ['table_name_{}'.format(i) for i in range(len(table_names))]
+    placeholders = ', '.join(':' + name for name in names)
+    return (placeholders, dict(zip(names, table_names)))
+
+
+def col_data_info_schema_bulk(db, table_names):
+    """Gets metadata for several MySQL (or PostgreSQL) tables' columns in one
+    query"""
+
+    (placeholders, params) = table_name_params(table_names)
+    qry = '''SELECT table_name, column_name, data_type
+             FROM information_schema.columns
+             WHERE table_name IN ({})
+             ORDER BY table_name, ordinal_position'''.format(placeholders)
+
+    return group_by_table(db.query(qry, **params))
+
+
+def col_data_sqlite_bulk(db, table_names):
+    """Gets metadata for several SQLite tables' columns in one query
+
+    Uses the `pragma_table_info` table-valued function (SQLite 3.16+),
+    which unlike the PRAGMA statement accepts bind parameters"""
+
+    (placeholders, params) = table_name_params(table_names)
+    selects = ['''SELECT :{0} AS table_name, name AS column_name,
+                       type AS data_type, cid
+                FROM pragma_table_info(:{0})'''.format(name)
+               for name in sorted(params)]
+    qry = '\nUNION ALL\n'.join(selects) + '\nORDER BY table_name, cid'
+
+    return group_by_table(db.query(qry, **params))
+
+
+# Most tables looked up by a single bulk query; SQLite limits the number
+# of terms in a compound SELECT to 500
+BULK_QUERY_MAX_TABLES = 200
+
+bulk_col_data_functions = {
+    'postgresql': col_data_pg_catalog_bulk,
+    'sqlite': col_data_sqlite_bulk,
+    'mysql': col_data_info_schema_bulk,
+}
+
+
 def col_data(db, table_name):
     """Gets metadata for a table's columns
 
-    Returns list, each element having .table, name, .column_name, .data_type attributes"""
+    Returns a `Table`: a sequence of `Column`s, each having .table_name,
+    .column_name, .data_type attributes"""
 
     db_type = db_engine_name(db.db_url)
     col_data_function = col_data_functions.get(db_type)
@@ -71,6 +185,81 @@ def col_data(db, table_name):
     return result
 
 
+def col_data_bulk(db, table_names):
+    """Gets metadata for several tables' columns, in one query if possible
+
+    Returns dict of table name: `Table`, as from `col_data()`"""
+
+    db_type = db_engine_name(db.db_url)
+    bulk_col_data_function = bulk_col_data_functions.get(db_type)
+    if not bulk_col_data_function:
+        return {table_name: col_data(db, table_name)
+                for table_name in table_names}
+
+    result = {}
+    for start in range(0, len(table_names), BULK_QUERY_MAX_TABLES):
+        result.update(bulk_col_data_function(
+            db, table_names[start:start + BULK_QUERY_MAX_TABLES]))
+    for table_name in table_names:
+        if not result.get(table_name):
+            raise BadDBNameError('No table {} in database'.format(table_name))
+
+    return result
+
+
+class PooledConnection(object):
+    """
+    A connection checked out of `engine`'s pool, which can stand in for a
+    `records.Database` in the `col_data` functions
+    """
+
+    def __init__(self, engine, db_url):
+        self.db_url = db_url
+        self.db = engine.connect()
+
+    def query(self, query, **params):
+        import records
+        from sqlalchemy import text
+        cursor = self.db.execute(text(query), **params)
+        return records.RecordCollection(records.Record(cursor.keys(), row)
+                                        for row in cursor)
+
+    def close(self):
+        self.db.close()
+
+
+def col_data_concurrently(engine, db_url, table_names, max_workers):
+    """Gets metadata for several tables' columns, querying for each table
+    at the same time, on up to `max_workers` threads and pooled connections
+
+    Returns dict of table name: `Table`, as from `col_data()`"""
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    def fetch(table_name):
+        conn = PooledConnection(engine, db_url)
+        try:
+            return col_data(conn, table_name)
+        finally:
+            conn.close()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(table_names, executor.map(fetch, table_names)))
+
+
+def col_data_for_tables(db_url, table_names, cache=None, schema=None):
+    """Gets metadata for the columns of several tables
+
+    Returns dict of table name: `Table`, as from `col_data()`.
+    If `schema` (a `Schema`, as from a schema file) is given, the metadata
+    comes from it alone.  Otherwise tables found in `cache` (a `SchemaCache`)
+    are not looked up, and the database is only connected to if some table
+    is missing from the cache."""
+
+    with InsertWriter(db_url, cache=cache, schema=schema) as writer:
+        return writer.col_data_for_tables(table_names)
+
+
 INSERT_TEMPLATE = '''
 INSERT INTO {destination} (
 {dest_column_block}
@@ -106,11 +295,29 @@ def no_value(db_url):
 INDENT = ' ' * 2
 
 
-def build_from_clause(sources):
-    """Given a list of table names, connects them with JOINs"""
+def build_from_clause(sources, foreign_keys=None):
+    """Given a list of table names, connects them with JOINs
+
+    Each JOIN's condition follows the shortest path of `foreign_keys` (dict
+    of table name: list of `ForeignKey`) among the sources to the first.  A
+    table with no such path gets a blank condition to fill in, a comment,
+    and a `JoinConditionWarning`."""
 
     from_clause = [sources[0]]
-    for join_to in sources[1:]:
+    (joins, unreachable) = join_tree(sources,
+                                     join_graph(sources, foreign_keys or {}))
+    for (join_to, parent, conditions) in joins:
+        from_clause.append('JOIN {} ON ({})'.format(
+            join_to, on_clause(join_to, parent, conditions[0])))
+        for pairs in conditions[1:]:
+            from_clause.append('  -- or ON ({})'.format(
+                on_clause(join_to, parent, pairs)))
+    for join_to in unreachable:
+        warnings.warn('No foreign key links {} to {}; fill in its JOIN '
+                      'condition'.format(join_to, sources[0]),
+                      JoinConditionWarning)
+        from_clause.append('-- No foreign key links {} to {}'.format(
+            join_to, sources[0]))
         from_clause.append('JOIN {} ON ({}. = {}.)'.format(join_to, sources[0],
                                                            join_to))
     return '\n'.join(from_clause)
@@ -121,44 +328,112 @@ def cast(column_str, new_type, db_url):
     engine_name = db_engine_name(db_url)
     if engine_name == 'postgresql':
         return '{}::{}'.format(column_str, new_type)
-    elif engine_name == 'mysql':
+    else:
         return 'CAST({} AS {})'.format(column_str, new_type)
 
 
-def generate_from_tables(db_url,
-                         destination,
+def merge_source_columns(sources, columns):
+    """Column name: metadata of the source column it will be selected from
+
+    Each column should have only one source - sources listed first take
+    precedence.  Looks through each source's own index rather than copying
+    them all into one dict."""
+
+    return ChainMap(*[columns[source].index for source in sources])
+
+
+def match_source_columns(destination,
                          sources,
-                         qualify=False,
-                         type_cast=False):
+                         columns,
+                         threshold,
+                         column_index=None):
     """
-    Generates an `INSERT INTO... SELECT FROM` SQL statement.
+    Like `merge_source_columns()`, adding approximate matches for the
+    destination columns no source column is named exactly like.
 
     Args:
-        db_url (str): Database URL in SQLAlchemy format
         destination (str): Name of table to INSERT into
         sources (list): Names of tables to select from, in order of preference
+        columns (dict): Table name: column metadata, as from `col_data()`,
+            for the destination and all sources
+        threshold (float): Lowest confidence, from 0 to 1, to accept
+        column_index (ColumnIndex): Index of the sources' columns, if one
+            was already built for the run
+
+    Returns:
+        tuple: (source_columns, confidences): column name: source column
+            metadata, and destination column name: confidence of each
+            approximate match
+    """
+
+    source_columns = merge_source_columns(sources, columns)
+    if column_index is None:
+        column_index = ColumnIndex(columns[source] for source in sources)
+    matches = approximate_matches(column_index, columns[destination],
+                                  sources, source_columns, threshold)
+    return (source_columns.new_child({name: match.column for (name, match)
+                                      in matches.items()}),
+            {name: match.confidence for (name, match) in matches.items()})
+
+
+def render_from_tables(db_url,
+                       destination,
+                       sources,
+                       columns,
+                       qualify=False,
+                       type_cast=False,
+                       source_columns=None,
+                       foreign_keys=None,
+                       cast_columns=None,
+                       notes=None,
+                       match_threshold=None,
+                       confidences=None,
+                       column_index=None):
+    """
+    Renders an `INSERT INTO... SELECT FROM` SQL statement from known metadata.
+
+    Args:
+        db_url (str): Database URL in SQLAlchemy format; used only for dialect
+        destination (str): Name of table to INSERT into
+        sources (list): Names of tables to select from, in order of preference
+        columns (dict): Table name: column metadata, as from `col_data()`,
+            for the destination and all sources
         qualify (bool): Qualify column names with table name even if only one table
         type_cast (bool): Cast values to destination data type where needed
+        source_columns (dict): Result of `merge_source_columns()`, if
+            already computed
+        foreign_keys (dict): Table name: list of `ForeignKey`, as from
+            `keys.foreign_keys()`, for the sources; fills JOIN conditions
+        cast_columns (set): Names of the destination columns to cast, as
+            from `casts.cast_plan()`, in place of `type_cast`'s guess
+        notes (dict): Destination column name: note to add to its comment
+        match_threshold (float): If given, also match source columns named
+            only approximately like destination columns, with at least
+            this confidence
+        confidences (dict): Destination column name: confidence of its
+            approximate match, as from `match_source_columns()`, if
+            `source_columns` came from there
+        column_index (ColumnIndex): Index of the sources' columns to match
+            approximately against, if already built
 
     Returns:
         str: A SQL statement
 
     """
 
-    db = records.Database(db_url)
-
     dest_column_block = []
     source_column_block = []
 
-    # Each column should have only one source - sources listed first take
-    # precedence
-    source_columns = {}
-    for source in reversed(sources):
-        source_columns.update({col.column_name: col
-                               for col in col_data(db, source)})
+    if source_columns is None:
+        if match_threshold is None:
+            source_columns = merge_source_columns(sources, columns)
+        else:
+            (source_columns, confidences) = match_source_columns(
+                destination, sources, columns, match_threshold,
+                column_index=column_index)
 
     qualify = (len(sources) > 1) or qualify
-    for dest_col in col_data(db, destination):
+    for dest_col in columns[destination]:
         dest_column_block.append(INDENT + dest_col.column_name)
         source_col = source_columns.get(dest_col.column_name)
         if source_col:
@@ -169,23 +444,75 @@ def generate_from_tables(db_url,
                 source_expr = source_col.column_name
         else:
             source_expr = no_value(db_url)
-        if type_cast and ((not source_col) or
-                          source_col.data_type != dest_col.data_type):
+        if cast_columns is not None:
+            cast_needed = dest_col.column_name in cast_columns
+        else:
+            cast_needed = type_cast and (
+                (not source_col) or
+                source_col.data_type != dest_col.data_type)
+        if cast_needed:
             source_expr = cast(source_expr,
                                new_type=dest_col.data_type,
                                db_url=db_url)
-        source_column_block.append('{}{},  -- ==> {}'.format(
-            INDENT, source_expr, dest_col.column_name))
+        annotation = dest_col.column_name
+        if confidences and dest_col.column_name in confidences:
+            annotation += ' (match {:.2f})'.format(
+                confidences[dest_col.column_name])
+        if notes and dest_col.column_name in notes:
+            annotation += ' ({})'.format(notes[dest_col.column_name])
+        source_column_block.append((source_expr, annotation))
 
     dest_column_block = ',\n'.join(dest_column_block)
-    source_column_block = '\n'.join(source_column_block)
-    source_column_block = remove_last(source_column_block, ',')
+    # Commas placed line by line, since notes may hold commas of their own
+    separators = [','] * (len(source_column_block) - 1) + ['']
+    source_column_block = '\n'.join(
+        '{}{}{}  -- ==> {}'.format(INDENT, source_expr, separator, annotation)
+        for ((source_expr, annotation), separator)
+        in zip(source_column_block, separators))
 
-    from_clause = build_from_clause(sources)
+    from_clause = build_from_clause(sources, foreign_keys)
 
     return INSERT_TEMPLATE.format(**locals())
 
 
+def generate_from_tables(db_url,
+                         destination,
+                         sources,
+                         qualify=False,
+                         type_cast=False,
+                         cache=None,
+                         schema=None,
+                         match_threshold=None):
+    """
+    Generates an `INSERT INTO... SELECT FROM` SQL statement.
+
+    Args:
+        db_url (str): Database URL in SQLAlchemy format
+        destination (str): Name of table to INSERT into
+        sources (list): Names of tables to select from, in order of preference
+        qualify (bool): Qualify column names with table name even if only
+            one table
+        type_cast (bool): Cast values to destination data type where needed
+        cache (SchemaCache): Cache of column metadata to consult first
+        schema (Schema): Metadata to use instead of connecting to a database;
+            `db_url` may then be omitted
+        match_threshold (float): If given, also match source columns named
+            only approximately like destination columns, with at least
+            this confidence, which the comments show
+
+    Returns:
+        str: A SQL statement
+
+    """
+
+    with InsertWriter(db_url, cache=cache, schema=schema) as writer:
+        return writer.generate_from_tables(destination=destination,
+                                           sources=sources,
+                                           qualify=qualify,
+                                           type_cast=type_cast,
+                                           match_threshold=match_threshold)
+
+
 VALUES_TUPLE_TEMPLATE = '''(
 {source_column_block}
 )'''
@@ -198,29 +525,37 @@ VALUES
 {source_column_blocks}'''
 
 
-def generate_from_values(db_url,
-                         destination,
-                         number_of_tuples=1,
-                         type_cast=False):
+# Tuples are yielded in groups of about this many characters
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def iter_render_from_values(db_url,
+                            destination,
+                            columns,
+                            number_of_tuples=1,
+                            type_cast=False):
     """
-    Generates an `INSERT INTO... VALUES` SQL statement.
+    Renders an `INSERT INTO... VALUES` SQL statement piece by piece.
+
+    Memory use does not grow with `number_of_tuples`, so the statement can
+    be written out as it is produced.
 
     Args:
-        db_url (str): Database URL in SQLAlchemy format
+        db_url (str): Database URL in SQLAlchemy format; used only for dialect
         destination (str): Name of table to INSERT into
+        columns (dict): Table name: column metadata, as from `col_data()`,
+            including the destination
         number_of_tuples (int): Number of tuples in VALUES clause
         type_cast (bool): Cast values to destination data type
 
-    Returns:
-        str: A SQL statement
+    Yields:
+        str: Successive pieces of a SQL statement
     """
 
-    db = records.Database(db_url)
-
     dest_column_block = []
     source_column_block = []
 
-    for dest_col in col_data(db, destination):
+    for dest_col in columns[destination]:
         dest_column_block.append(INDENT + dest_col.column_name)
         source_expr = no_value(db_url)
         if type_cast:
@@ -233,8 +568,316 @@ def generate_from_values(db_url,
     dest_column_block = ',\n'.join(dest_column_block)
     source_column_block = '\n'.join(source_column_block)
     source_column_block = remove_last(source_column_block, ',')
-    source_column_blocks = [VALUES_TUPLE_TEMPLATE.format(**locals()),
-                            ] * number_of_tuples
-    source_column_blocks = ',\n'.join(source_column_blocks)
+    values_tuple = VALUES_TUPLE_TEMPLATE.format(**locals())
+
+    yield INSERT_FROM_VALUES_TEMPLATE.format(
+        destination=destination,
+        dest_column_block=dest_column_block,
+        source_column_blocks=values_tuple)
+
+    remaining = number_of_tuples - 1
+    tuples_per_chunk = max(1, STREAM_CHUNK_SIZE // len(values_tuple))
+    chunk = ',\n' + values_tuple
+    while remaining > 0:
+        count = min(remaining, tuples_per_chunk)
+        yield chunk * count
+        remaining -= count
+
+
+def iter_generate_from_values(db_url,
+                              destination,
+                              number_of_tuples=1,
+                              type_cast=False,
+                              cache=None,
+                              schema=None):
+    """
+    Generates an `INSERT INTO... VALUES` SQL statement piece by piece.
+
+    Memory use does not grow with `number_of_tuples`, so the statement can
+    be written out as it is produced.
+
+    Args:
+        db_url (str): Database URL in SQLAlchemy format
+        destination (str): Name of table to INSERT into
+        number_of_tuples (int): Number of tuples in VALUES clause
+        type_cast (bool): Cast values to destination data type
+        cache (SchemaCache): Cache of column metadata to consult first
+        schema (Schema): Metadata to use instead of connecting to a database;
+            `db_url` may then be omitted
+
+    Yields:
+        str: Successive pieces of a SQL statement
+    """
+
+    # Metadata is fetched before the writer closes; rendering needs none
+    with InsertWriter(db_url, cache=cache, schema=schema) as writer:
+        return writer.iter_generate_from_values(
+            destination=destination,
+            number_of_tuples=number_of_tuples,
+            type_cast=type_cast)
+
 
-    return INSERT_FROM_VALUES_TEMPLATE.format(**locals())
+def generate_from_values(db_url,
+                         destination,
+                         number_of_tuples=1,
+                         type_cast=False,
+                         cache=None,
+                         schema=None):
+    """
+    Generates an `INSERT INTO... VALUES` SQL statement.
+
+    Args:
+        db_url (str): Database URL in SQLAlchemy format
+        destination (str): Name of table to INSERT into
+        number_of_tuples (int): Number of tuples in VALUES clause
+        type_cast (bool): Cast values to destination data type
+        cache (SchemaCache): Cache of column metadata to consult first
+        schema (Schema): Metadata to use instead of connecting to a database;
+            `db_url` may then be omitted
+
+    Returns:
+        str: A SQL statement
+    """
+
+    return ''.join(iter_generate_from_values(db_url=db_url,
+                                             destination=destination,
+                                             number_of_tuples=number_of_tuples,
+                                             type_cast=type_cast,
+                                             cache=cache,
+                                             schema=schema))
+
+
+class InsertWriter(object):
+    """
+    Generates INSERT statements against one database, reusing its connection.
+
+    The writer owns a pooled SQLAlchemy engine, connected when first needed,
+    and remembers the metadata of every table it has looked up, so that many
+    statements can be generated without reconnecting or repeating catalog
+    queries.  Call `close()`, or use it as a context manager, when done.
+
+    Args:
+        db_url (str): Database URL in SQLAlchemy format
+        cache (SchemaCache): Cache of column metadata to consult first
+        schema (Schema): Metadata to use instead of connecting to a database;
+            `db_url` may then be omitted
+        concurrency (int): Number of tables whose metadata may be queried
+            at once, each on its own thread and pooled connection; with the
+            default of 1, tables are looked up together in bulk queries
+        profiler (Profiler): Where to time connecting, metadata lookups and
+            rendering, and count queries and rows; by default a new one,
+            available as `profiler`
+        **engine_kwargs: Passed to SQLAlchemy's `create_engine`, like
+            `pool_size`; for `concurrency` above the pool's size plus
+            overflow, threads wait their turn for a connection
+    """
+
+    def __init__(self, db_url=None, cache=None, schema=None, concurrency=1,
+                 profiler=None, **engine_kwargs):
+        if schema is not None:
+            db_url = db_url or schema.db_url
+        self.db_url = db_url
+        self.cache = cache
+        self.schema = schema
+        self.concurrency = concurrency
+        self.profiler = profiler if profiler is not None else Profiler()
+        self.engine_kwargs = engine_kwargs
+        self._db = None
+        self._col_data = {}
+        self._foreign_keys = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc, val, traceback):
+        self.close()
+
+    @property
+    def db(self):
+        """The `records.Database`, connected on first use; queries are
+        counted"""
+        if self._db is None:
+            import records
+            with self.profiler.phase('connect'):
+                self._db = CountingDatabase(
+                    records.Database(self.db_url, **self.engine_kwargs),
+                    self.profiler)
+        return self._db
+
+    def close(self):
+        """Closes the connection and disposes of the engine's pool"""
+        if self._db is not None:
+            self._db.close()
+            self._db._engine.dispose()
+            self._db = None
+
+    def col_data_for_tables(self, table_names):
+        """Gets metadata for the columns of several tables
+
+        Returns dict of table name: `Table`, as from `col_data()`.  Each
+        table is looked up only once per writer: in `schema` if given,
+        otherwise in `cache` and then the database."""
+
+        missing = []
+        for table_name in table_names:
+            if table_name not in self._col_data and table_name not in missing:
+                missing.append(table_name)
+
+        if missing:
+            if self.schema is not None:
+                fetched = self.schema.col_data_bulk(missing)
+            else:
+                fetched = (self.cache.get(self.db_url, missing)
+                           if self.cache else {})
+                self.profiler.count('cache_hits', len(fetched))
+                uncached = [table_name for table_name in missing
+                            if table_name not in fetched]
+                if uncached:
+                    from_db = self._query_col_data(uncached)
+                    if self.cache:
+                        self.cache.put(self.db_url, from_db)
+                    fetched.update(from_db)
+            self._col_data.update(fetched)
+
+        return {table_name: self._col_data[table_name]
+                for table_name in table_names}
+
+    def _query_col_data(self, table_names):
+        db = self.db
+        with self.profiler.phase('col_data'):
+            if self.concurrency > 1 and len(table_names) > 1:
+                result = col_data_concurrently(db._engine, self.db_url,
+                                               table_names, self.concurrency)
+                self.profiler.count('queries', len(table_names))
+            else:
+                result = col_data_bulk(db, table_names)
+        self.profiler.count('tables', len(result))
+        self.profiler.count('rows_fetched',
+                            sum(len(cols) for cols in result.values()))
+        return result
+
+    def foreign_keys_for_tables(self, table_names):
+        """Gets the foreign keys of several tables
+
+        Returns dict of table name: list of `ForeignKey`, as from
+        `keys.foreign_keys()`.  Each table is looked up only once per writer;
+        with a `schema`, no foreign keys are known."""
+
+        from sql_insert_writer.keys import foreign_keys
+
+        missing = [table_name for table_name in set(table_names)
+                   if table_name not in self._foreign_keys]
+        if missing:
+            fetched = {}
+            if self.schema is None:
+                with self.profiler.phase('foreign_keys'):
+                    fetched = foreign_keys(self.db, sorted(missing))
+            for table_name in missing:
+                self._foreign_keys[table_name] = fetched.get(table_name, [])
+
+        return {table_name: self._foreign_keys[table_name]
+                for table_name in table_names}
+
+    def invalidate(self, table_names=None):
+        """Forgets metadata for `table_names` (default all), here and in
+        `cache`"""
+
+        if table_names is None:
+            self._col_data.clear()
+            self._foreign_keys.clear()
+        else:
+            for table_name in table_names:
+                self._col_data.pop(table_name, None)
+                self._foreign_keys.pop(table_name, None)
+        if self.cache:
+            self.cache.invalidate(self.db_url, table_names)
+
+    def explain(self, sql):
+        """EXPLAINs `sql` without running it, over the connection the
+        writer's metadata was fetched on
+
+        See `explain.estimate()`."""
+
+        from sql_insert_writer.explain import estimate
+        with self.profiler.phase('explain'):
+            return estimate(self.db.db, self.db_url, sql)
+
+    def analyze(self, sql):
+        """Runs `sql` in a transaction then rolled back, measuring it
+
+        See `explain.analyze()`."""
+
+        from sql_insert_writer.explain import analyze
+        with self.profiler.phase('analyze'):
+            return analyze(self.db.db, self.db_url, sql)
+
+    def execute(self, sql):
+        """Runs and commits `sql`, measuring it
+
+        See `explain.run()`."""
+
+        from sql_insert_writer.explain import run
+        with self.profiler.phase('execute'):
+            return run(self.db.db, sql, commit=True)
+
+    def generate_from_tables(self,
+                             destination,
+                             sources,
+                             qualify=False,
+                             type_cast=False,
+                             match_threshold=None):
+        """Generates an `INSERT INTO... SELECT FROM` SQL statement.
+
+        See `generate_from_tables()`."""
+
+        columns = self.col_data_for_tables([destination, ] + list(sources))
+        foreign_keys = (self.foreign_keys_for_tables(sources)
+                        if len(sources) > 1 else None)
+        confidences = None
+        with self.profiler.phase('merge'):
+            if match_threshold is None:
+                source_columns = merge_source_columns(sources, columns)
+            else:
+                (source_columns, confidences) = match_source_columns(
+                    destination, sources, columns, match_threshold)
+        with self.profiler.phase('render'):
+            result = render_from_tables(db_url=self.db_url,
+                                        destination=destination,
+                                        sources=sources,
+                                        columns=columns,
+                                        qualify=qualify,
+                                        type_cast=type_cast,
+                                        source_columns=source_columns,
+                                        foreign_keys=foreign_keys,
+                                        confidences=confidences)
+        self.profiler.count('bytes_rendered', len(result))
+        return result
+
+    def iter_generate_from_values(self,
+                                  destination,
+                                  number_of_tuples=1,
+                                  type_cast=False):
+        """Generates an `INSERT INTO... VALUES` SQL statement piece by piece.
+
+        See `iter_generate_from_values()`."""
+
+        columns = self.col_data_for_tables([destination, ])
+        return self.profiler.iter_phase('render', iter_render_from_values(
+            db_url=self.db_url,
+            destination=destination,
+            columns=columns,
+            number_of_tuples=number_of_tuples,
+            type_cast=type_cast))
+
+    def generate_from_values(self,
+                             destination,
+                             number_of_tuples=1,
+                             type_cast=False):
+        """Generates an `INSERT INTO... VALUES` SQL statement.
+
+        See `generate_from_values()`."""
+
+        return ''.join(self.iter_generate_from_values(
+            destination=destination,
+            number_of_tuples=number_of_tuples,
+            type_cast=type_cast))
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""Cheap signals that tables' definitions have changed."""
+
+from sql_insert_writer.sql_insert_writer import (BULK_QUERY_MAX_TABLES,
+                                                 PG_TABLE_OID, db_engine_name,
+                                                 table_name_params)
+
+
+def schema_versions_postgresql(db, table_names):
+    """Hashes of several PostgreSQL tables' column definitions, read
+    straight from the catalog; names resolve as for `col_data()`"""
+
+    (placeholders, params) = table_name_params(table_names)
+    qry = '''SELECT n.table_name,
+                    md5(string_agg(a.attname || ' ' ||
+                                   format_type(a.atttypid, a.atttypmod),
+                                   ',' ORDER BY a.attnum)) AS version
+             FROM unnest(ARRAY[{}]) AS n (table_name)
+             JOIN pg_catalog.pg_attribute a ON (a.attrelid = {})
+             WHERE a.attnum > 0
+             AND NOT a.attisdropped
+             GROUP BY n.table_name'''.format(placeholders, PG_TABLE_OID)
+
+    return {row.table_name: row.version for row in db.query(qry, **params)}
+
+
+def schema_versions_mysql(db, table_names):
+    """Hashes of several MySQL tables' column definitions"""
+
+    (placeholders, params) = table_name_params(table_names)
+    qry = '''SELECT table_name AS table_name,
+                    md5(group_concat(column_name, ' ', column_type
+                                     ORDER BY ordinal_position)) AS version
+             FROM information_schema.columns
+             WHERE table_schema = DATABASE()
+             AND table_name IN ({})
+             GROUP BY table_name'''.format(placeholders)
+
+    return {row.table_name: row.version for row in db.query(qry, **params)}
+
+
+def schema_versions_sqlite(db, table_names):
+    """SQLite's schema version, which changes with any table's definition;
+    the same for every table"""
+
+    version = db.query('PRAGMA schema_version').all()[0].schema_version
+    return {table_name: version for table_name in table_names}
+
+
+schema_version_functions = {
+    'postgresql': schema_versions_postgresql,
+    'sqlite': schema_versions_sqlite,
+    'mysql': schema_versions_mysql,
+}
+
+
+def schema_versions(db, table_names):
+    """Gets a token for each table's definition, which changes when it does
+
+    Returns dict of table name: token; tables not found are omitted.  Tokens
+    are only comparable with others for the same table and database."""
+
+    db_type = db_engine_name(db.db_url)
+    schema_version_function = schema_version_functions.get(db_type)
+    if not schema_version_function:
+        raise NotImplementedError('{} not supported'.format(db_type))
+
+    result = {}
+    for start in range(0, len(table_names), BULK_QUERY_MAX_TABLES):
+        result.update(schema_version_function(
+            db, table_names[start:start + BULK_QUERY_MAX_TABLES]))
+    return result
+
+
+def changed_tables(known, current):
+    """
+    Names of tables whose tokens in `current` differ from those in `known`
+
+    >>> changed_tables({'pet': 1, 'owner': 1}, {'pet': 2, 'owner': 1})
+    ['pet']
+    """
+
+    return sorted(table_name for (table_name, version) in known.items()
+                  if current.get(table_name) != version)
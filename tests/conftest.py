@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""Fixtures shared by the `sql_insert_writer` tests."""
+
+import os
+import sqlite3
+import tempfile
+
+import pytest
+import pytest_postgresql  # noqa: F401 - provides the `postgresql` fixture
+
+from helpers import PG_CTL_MISSING, TABLE_DEFINITIONS, create_fk_tables
+
+
+def dsn_to_url(engine, dsn):
+    """
+    Converts a DSN to a SQLAlchemy-style database URL
+
+    pytest_postgresql connection only available in DSN form, like
+    'dbname=tests user=postgres host=127.0.0.1 port=41663'
+    """
+    params = dict(s.split('=') for s in dsn.split())
+    return '{engine}://{user}@{host}:{port}/{dbname}'.format(engine=engine,
+                                                             **params)
+
+
+# pytest-postgresql works locally, but it contains an unshakeable
+# assumption that it needs to locally manage postgres instances with
+# a local installation of `pg_ctl`, which is incompatible with CircleCI.
+
+
+@pytest.mark.skipif(PG_CTL_MISSING, reason='PostgreSQL not installed locally')
+@pytest.fixture
+def pg_url(postgresql):
+    cur = postgresql.cursor()
+    for table_definition in TABLE_DEFINITIONS:
+        cur.execute(table_definition)
+    postgresql.commit()
+    db_url = dsn_to_url('postgresql', postgresql.dsn)
+    return db_url
+
+
+@pytest.fixture
+def sqlite_url(request):
+    sqlite_file = tempfile.NamedTemporaryFile(delete=False)
+
+    def teardown():
+        os.unlink(sqlite_file.name)
+
+    request.addfinalizer(teardown)
+
+    conn = sqlite3.connect(sqlite_file.name)
+    cur = conn.cursor()
+    for table_definition in TABLE_DEFINITIONS:
+        cur.execute(table_definition)
+    conn.commit()
+    return 'sqlite:///' + sqlite_file.name
+
+
+@pytest.fixture
+def fk_sqlite_url(sqlite_url):
+    return create_fk_tables(sqlite_url)
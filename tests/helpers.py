@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Constants and helpers shared by the `sql_insert_writer` tests."""
+
+import subprocess
+
+import sqlalchemy
+
+try:
+    subprocess.check_output('command -v pg_ctl', shell=True)
+    # sorry for the double-negative, but it's convenient later
+    PG_CTL_MISSING = False
+except subprocess.CalledProcessError:
+    PG_CTL_MISSING = True
+
+TABLE_DEFINITIONS = [
+    'CREATE TABLE tab1 (col1 serial primary key, col2 text, col3 text, '
+    'col4 text)',
+    'CREATE TABLE tab2 (col1 serial primary key, col3 text, col4 text)',
+    'CREATE TABLE tab3 (col1 serial primary key, col2 text, col4 text)',
+    'CREATE TABLE tab4 (col1 serial primary key, col2 text, col3 text)',
+    'CREATE TABLE tab5 (col1 serial primary key, datecol1 date, '
+    'intcol1 integer, col2 text)',
+    'CREATE TABLE tab5_all_text (col1 serial primary key, datecol1 text, '
+    'intcol1 text, col2 text)',
+]
+
+# Tables linked by foreign keys, and staging tables to copy them from
+FK_TABLE_DEFINITIONS = [
+    'CREATE TABLE species (id integer primary key, name text)',
+    'CREATE TABLE owner (id integer primary key, name text)',
+    '''CREATE TABLE pet (id integer primary key, name text,
+                         species_id integer REFERENCES species (id),
+                         owner_id integer REFERENCES owner)''',
+    '''CREATE TABLE visit (id integer primary key,
+                           pet_id integer REFERENCES pet (id),
+                           follows_id integer REFERENCES visit (id))''',
+]
+
+STAGING_DATA = [
+    'CREATE TABLE staging_species (id integer, name text)',
+    'CREATE TABLE staging_owner (id integer, name text)',
+    'CREATE TABLE staging_pet (id integer, name text, species_id integer, '
+    'owner_id integer)',
+    'CREATE TABLE staging_visit (id integer, pet_id integer, '
+    'follows_id integer)',
+    "INSERT INTO staging_species VALUES (1, 'cat')",
+    "INSERT INTO staging_owner VALUES (1, 'Ann')",
+    "INSERT INTO staging_pet VALUES (1, 'Tom', 1, 1)",
+    'INSERT INTO staging_visit VALUES (1, 1, NULL)',
+]
+
+
+def create_fk_tables(db_url):
+    engine = sqlalchemy.create_engine(db_url)
+    with engine.begin() as conn:
+        for definition in FK_TABLE_DEFINITIONS + STAGING_DATA:
+            conn.execute(definition)
+    engine.dispose()
+    return db_url
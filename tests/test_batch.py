@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for `sql_insert_writer.batch`."""
+
+import pytest
+
+from click.testing import CliRunner
+
+from sql_insert_writer import batch, cli, sql_insert_writer
+
+JOBS = [('tab1', ['tab2']), ('tab5', ['tab5_all_text']), ('tab2', [])]
+
+
+def test_generate_batch(sqlite_url):
+    results = list(batch.generate_batch(sqlite_url, JOBS))
+    assert [destination for (destination, sql) in results] == [
+        'tab1', 'tab5', 'tab2']
+    assert results[0][1] == sql_insert_writer.generate_from_tables(
+        sqlite_url, destination='tab1', sources=['tab2'])
+    assert 'FROM tab5_all_text' in results[1][1]
+    assert 'VALUES' in results[2][1]
+
+
+def test_generate_batch_bad_table_raises(sqlite_url):
+    with pytest.raises(sql_insert_writer.BadDBNameError):
+        list(batch.generate_batch(sqlite_url,
+                                  JOBS + [('tab1', ['no_such_table'])]))
+
+
+def test_write_batch(sqlite_url, tmpdir):
+    results = batch.generate_batch(sqlite_url, JOBS + [('tab1', ['tab3'])])
+    paths = batch.write_batch(results, str(tmpdir))
+    assert sorted(path.basename for path in tmpdir.listdir()) == [
+        'tab1.sql', 'tab1_2.sql', 'tab2.sql', 'tab5.sql']
+    assert len(paths) == 4
+    assert 'FROM tab3' in tmpdir.join('tab1_2.sql').read()
+
+
+def test_batch_file_names_unique():
+    file_names = batch.batch_file_names(['pet', 'pet', 'pet_2', 'pet'])
+    assert file_names == ['pet.sql', 'pet_2.sql', 'pet_2_2.sql', 'pet_3.sql']
+
+
+def test_batch_command_line(sqlite_url, tmpdir):
+    manifest = tmpdir.join('manifest.txt')
+    manifest.write('# destination sources...\ntab1 tab2 tab3\n\ntab4\n')
+    runner = CliRunner()
+
+    result = runner.invoke(cli.main, ['--manifest', str(manifest),
+                                      '--db', sqlite_url])
+    assert result.exit_code == 0
+    assert result.output.count('INSERT INTO') == 2
+    assert 'JOIN tab3' in result.output
+
+    output_dir = tmpdir.join('out')
+    result = runner.invoke(cli.main, ['--manifest', str(manifest),
+                                      '--output-dir', str(output_dir),
+                                      '--db', sqlite_url])
+    assert result.exit_code == 0
+    assert sorted(path.basename for path in output_dir.listdir()) == [
+        'tab1.sql', 'tab4.sql']
+
+    result = runner.invoke(cli.main, ['tab1', '--manifest', str(manifest),
+                                      '--db', sqlite_url])
+    assert result.exit_code == 2
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for `sql_insert_writer.casts`."""
+
+import sqlite3
+
+import pytest
+
+from click.testing import CliRunner
+
+from sql_insert_writer import casts, cli
+from sql_insert_writer.sql_insert_writer import InsertWriter
+
+from helpers import PG_CTL_MISSING
+
+
+@pytest.fixture
+def text_sqlite_url(sqlite_url):
+    conn = sqlite3.connect(sqlite_url[len('sqlite:///'):])
+    conn.executemany('INSERT INTO tab5_all_text (datecol1, intcol1, col2) '
+                     'VALUES (?, ?, ?)',
+                     [('2020-01-02', '5', 'a'), ('not a date', 'x', 'b'),
+                      (None, ' 7 ', 'c')])
+    conn.execute('CREATE TABLE wide (col1 bigint, intcol1 numeric, '
+                 'datecol1 timestamp)')
+    conn.execute("INSERT INTO wide VALUES (1, 3000000000, '2020-01-02')")
+    conn.commit()
+    return sqlite_url
+
+
+def infer(db_url, destination, sources, **kwargs):
+    with InsertWriter(db_url) as writer:
+        columns = writer.col_data_for_tables([destination, ] + sources)
+        return casts.infer_casts(writer.db, destination, sources, columns,
+                                 **kwargs)
+
+
+def test_needs_cast():
+    assert not casts.needs_cast('character varying', 'text')
+    assert not casts.needs_cast('date', 'timestamp without time zone')
+    assert not casts.needs_cast('integer', 'text')
+    assert casts.needs_cast('text', 'integer')
+    assert casts.needs_cast('USER-DEFINED', 'text')
+
+
+def test_boolean_validators():
+    for value in (0, 1, True, 'yes', ' F '):
+        assert casts.validator_for('sqlite', 'boolean')(value, 'boolean')
+    assert not casts.validator_for('sqlite', 'boolean')(2, 'boolean')
+    assert casts.validator_for('postgresql', 'boolean')(-2, 'boolean')
+    assert not casts.validator_for('postgresql', 'bool')('maybe', 'bool')
+    assert casts.validator_for('postgresql', 'text') is None
+
+
+def test_infer_casts_flags_failures(text_sqlite_url):
+    advice = infer(text_sqlite_url, 'tab5', ['tab5_all_text'])
+    assert list(advice) == ['datecol1', 'intcol1']
+    assert advice['datecol1'].cast
+    assert (advice['datecol1'].sampled, advice['datecol1'].failures,
+            advice['datecol1'].example) == (3, 1, 'not a date')
+    assert advice['intcol1'].example == 'x'
+
+    (cast_columns, notes) = casts.cast_plan(advice)
+    assert cast_columns == {'datecol1', 'intcol1'}
+    assert notes['intcol1'] == "1 of 3 sampled values will not convert, " \
+                               "like 'x'"
+
+
+def test_infer_casts_skips_implicit_conversions(text_sqlite_url):
+    advice = infer(text_sqlite_url, 'tab5', ['wide'])
+    assert not any(item.cast for item in advice.values())
+    assert advice['intcol1'].failures == 1  # too big for an integer
+    assert advice['datecol1'].failures == 0
+
+
+def test_sample_limits(text_sqlite_url):
+    advice = infer(text_sqlite_url, 'tab5', ['tab5_all_text'], sample_size=1)
+    assert advice['datecol1'].sampled == 1
+    advice = infer(text_sqlite_url, 'tab5', ['tab5_all_text'], time_budget=0)
+    assert advice['datecol1'].sampled == 0
+    assert advice['datecol1'].cast
+
+
+@pytest.mark.skipif(PG_CTL_MISSING, reason='PostgreSQL not installed locally')
+def test_infer_casts_pg(pg_url):
+    with InsertWriter(pg_url) as writer:
+        writer.db.query("INSERT INTO tab5_all_text (datecol1, intcol1) "
+                        "SELECT '2020-01-02', i::text "
+                        "FROM generate_series(1, 5000) i")
+        writer.db.query('ANALYZE tab5_all_text')
+        columns = writer.col_data_for_tables(['tab5', 'tab5_all_text'])
+        advice = casts.infer_casts(writer.db, 'tab5', ['tab5_all_text'],
+                                   columns, sample_size=100)
+    assert 0 < advice['intcol1'].sampled <= 100
+    assert advice['intcol1'].failures == 0
+
+
+def test_command_line_sample_casts(text_sqlite_url):
+    runner = CliRunner()
+    result = runner.invoke(cli.main, ['tab5', 'tab5_all_text',
+                                      '--sample-casts',
+                                      '--db', text_sqlite_url])
+    assert result.exit_code == 0
+    assert ("CAST(datecol1 AS date),  -- ==> datecol1 (1 of 3 sampled "
+            "values will not convert, like 'not a date')") in result.output
+    assert '  col2  -- ==> col2' in result.output
+    assert 'Warning: intcol1: 1 of 3' in result.output
+
+    result = runner.invoke(cli.main, ['tab5', '--sample-casts',
+                                      '--db', text_sqlite_url])
+    assert result.exit_code == 2
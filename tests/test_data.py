@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for `sql_insert_writer.data`."""
+
+import io
+import sqlite3
+
+import pytest
+from click.testing import CliRunner
+
+from sql_insert_writer import cli, data
+from sql_insert_writer.metadata import Table
+from sql_insert_writer.sql_insert_writer import BadDBNameError
+
+CSV = '''col1,col2,col4
+1,O'Hara,x
+2,,"comma, inside"
+3,third,z
+'''
+
+JSONL = '''{"col1": 1, "col2": "plain", "col3": {"nested": [1, 2]}}
+
+{"col1": 2, "col2": null, "col4": true}
+'''
+
+
+def test_csv_batches(sqlite_url):
+    rows = data.read_rows(io.StringIO(CSV), 'csv')
+    statements = list(data.iter_generate_from_data(sqlite_url, 'tab1', rows,
+                                                   batch_size=2))
+    assert len(statements) == 2
+    assert statements[0].count('-- ==> col1') == 2
+    assert statements[1].count('-- ==> col1') == 1
+    assert "'O''Hara',  -- ==> col2" in statements[0]
+    assert 'NULL,  -- ==> col3' in statements[0]
+
+
+def test_unknown_field(sqlite_url):
+    rows = data.read_rows(io.StringIO('col1,colum2\n1,x\n'), 'csv')
+    with pytest.raises(BadDBNameError):
+        list(data.iter_generate_from_data(sqlite_url, 'tab1', rows))
+
+
+def test_non_finite_numbers(sqlite_url):
+    rows = list(data.read_rows(io.StringIO('{"col1": 1, "col2": NaN}\n'),
+                               'jsonl'))
+    with pytest.raises(ValueError):
+        list(data.iter_generate_from_data(sqlite_url, 'tab1', rows))
+    assert data.literal(float('nan'), 'postgresql://') == "'NaN'"
+
+
+def test_generated_data_loads(sqlite_url):
+    rows = data.read_rows(io.StringIO(JSONL), 'jsonl')
+    conn = sqlite3.connect(sqlite_url[len('sqlite:///'):])
+    for statement in data.iter_generate_from_data(sqlite_url, 'tab1', rows):
+        conn.execute(statement)
+    assert conn.execute('SELECT col1, col2, col3, col4 FROM tab1 '
+                        'ORDER BY col1').fetchall() == [
+        (1, 'plain', '{"nested": [1, 2]}', None),
+        (2, None, None, '1'),
+    ]
+
+
+def test_data_command_line(sqlite_url, tmpdir):
+    data_file = tmpdir.join('rows.csv')
+    data_file.write(CSV)
+    runner = CliRunner()
+    result = runner.invoke(cli.main, ['tab1', '--data', str(data_file),
+                                      '--batch-size', 1, '--db', sqlite_url])
+    assert result.exit_code == 0
+    assert result.output.count('INSERT INTO tab1') == 3
+    assert "'comma, inside'  -- ==> col4" in result.output
+
+    result = runner.invoke(cli.main, ['tab1', 'tab2', '--data',
+                                      str(data_file), '--db', sqlite_url])
+    assert result.exit_code == 2
+
+    misspelled = tmpdir.join('misspelled.csv')
+    misspelled.write('col1,colum2\n1,x\n')
+    result = runner.invoke(cli.main, ['tab1', '--data', str(misspelled),
+                                      '--db', sqlite_url])
+    assert result.exit_code == 1
+    assert 'No column colum2 in table tab1' in result.output
+
+    result = runner.invoke(cli.main, ['tab1', '--bulk-load', '--data',
+                                      str(data_file), '--db', sqlite_url])
+    assert result.exit_code == 0
+    assert result.output.startswith('BEGIN TRANSACTION;')
+
+    result = runner.invoke(cli.main, ['tab1', '--bulk-load',
+                                      '--db', sqlite_url])
+    assert result.exit_code == 2
+
+
+def test_bulk_load_postgresql_copy():
+    columns = {'tab1': Table.from_rows('tab1', [(name, 'text') for name in
+                                                ('col1', 'col2', 'col3',
+                                                 'col4')])}
+    data_file = io.StringIO('col4,col1\nx,1\ny,2\n')
+    script = ''.join(data.iter_render_bulk_load('postgresql://', 'tab1',
+                                                columns, data_file))
+    assert ('COPY tab1 (\n  col4,  -- ==> col4 (field 1)\n'
+            '  col1  -- ==> col1 (field 2)\n)') in script
+    assert script.endswith('FROM STDIN WITH (FORMAT csv);\nx,1\ny,2\n\\.\n')
+
+    # No newline at the end of the file
+    script = ''.join(data.iter_render_bulk_load(
+        'postgresql://', 'tab1', columns, io.StringIO('col4,col1\nx,1\ny,2')))
+    assert script.endswith(';\nx,1\ny,2\n\\.\n')
+
+    script = ''.join(data.iter_render_bulk_load('mysql://', 'tab1', columns))
+    assert "LOAD DATA LOCAL INFILE 'tab1.csv'" in script
+    assert '  col4  -- ==> col4 (field 4)' in script
+
+    with pytest.raises(BadDBNameError):
+        list(data.iter_render_bulk_load('postgresql://', 'tab1', columns,
+                                        io.StringIO('col1,nope\n')))
+
+
+def test_bulk_load_sqlite_transaction(sqlite_url):
+    data_file = io.StringIO(CSV)
+    script = ''.join(data.iter_generate_bulk_load(sqlite_url, 'tab1',
+                                                  data_file, batch_size=2))
+    assert script.startswith('BEGIN TRANSACTION;')
+    assert script.count('INSERT INTO tab1') == 2
+    conn = sqlite3.connect(sqlite_url[len('sqlite:///'):])
+    conn.executescript(script)
+    assert conn.execute('SELECT count(*) FROM tab1').fetchone() == (3, )
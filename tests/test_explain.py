@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for `sql_insert_writer.explain`."""
+
+import sqlite3
+
+import pytest
+
+from click.testing import CliRunner
+
+from sql_insert_writer import cli, explain
+from sql_insert_writer.sql_insert_writer import InsertWriter
+
+from helpers import PG_CTL_MISSING
+
+STATEMENT = 'INSERT INTO tab1 (col1, col3) SELECT col1, col3 FROM tab2'
+
+
+@pytest.fixture
+def filled_sqlite_url(sqlite_url):
+    conn = sqlite3.connect(sqlite_url[len('sqlite:///'):])
+    conn.executemany('INSERT INTO tab2 (col1, col3) VALUES (?, ?)',
+                     [(i, 'c3') for i in range(1, 11)])
+    conn.commit()
+    return sqlite_url
+
+
+def count_rows(db_url, table_name):
+    conn = sqlite3.connect(db_url[len('sqlite:///'):])
+    return conn.execute('SELECT count(*) FROM {}'.format(
+        table_name)).fetchone()[0]
+
+
+def test_estimate_sqlite(filled_sqlite_url):
+    with InsertWriter(filled_sqlite_url) as writer:
+        result = writer.explain(STATEMENT)
+    assert (result.rows, result.cost) == (None, None)
+    assert any('tab2' in line for line in result.plan)
+    assert count_rows(filled_sqlite_url, 'tab1') == 0
+
+
+def test_analyze_rolls_back(filled_sqlite_url):
+    with InsertWriter(filled_sqlite_url) as writer:
+        result = writer.analyze(STATEMENT)
+    assert (result.rows, result.committed) == (10, False)
+    assert count_rows(filled_sqlite_url, 'tab1') == 0
+
+
+def test_execute_commits(filled_sqlite_url):
+    with InsertWriter(filled_sqlite_url) as writer:
+        result = writer.execute(STATEMENT)
+    assert (result.rows, result.committed) == (10, True)
+    assert result.seconds >= 0
+    assert count_rows(filled_sqlite_url, 'tab1') == 10
+
+
+def test_estimate_unsupported():
+    with pytest.raises(NotImplementedError):
+        explain.estimate(None, 'oracle://', STATEMENT)
+
+
+@pytest.mark.skipif(PG_CTL_MISSING, reason='PostgreSQL not installed locally')
+def test_estimate_and_analyze_pg(pg_url):
+    with InsertWriter(pg_url) as writer:
+        writer.db.query("INSERT INTO tab2 (col3) SELECT 'c3' "
+                        "FROM generate_series(1, 100)")
+        writer.db.query('ANALYZE tab2')
+        estimate = writer.explain(STATEMENT)
+        outcome = writer.analyze(STATEMENT)
+        remaining = writer.db.query('SELECT count(*) AS n FROM tab1').all()
+    assert estimate.rows == 100
+    assert estimate.cost > 0
+    assert (outcome.rows, outcome.committed) == (100, False)
+    assert remaining[0].n == 0
+
+
+def test_command_line_explain(filled_sqlite_url):
+    runner = CliRunner()
+    result = runner.invoke(cli.main, ['tab1', 'tab2', '--analyze',
+                                      '--db', filled_sqlite_url])
+    assert result.exit_code == 0
+    assert 'INSERT INTO tab1' in result.output
+    assert 'Estimated rows and cost: not available' in result.output
+    assert 'Rows: 10 in ' in result.output
+    assert '(rolled back)' in result.output
+    assert count_rows(filled_sqlite_url, 'tab1') == 0
+
+    result = runner.invoke(cli.main, ['tab1', 'tab2', '--execute',
+                                      '--db', filled_sqlite_url])
+    assert result.exit_code == 0
+    assert '(committed)' in result.output
+    assert count_rows(filled_sqlite_url, 'tab1') == 10
+
+    # Run again, the statement breaks tab1's primary key
+    result = runner.invoke(cli.main, ['tab1', 'tab2', '--execute',
+                                      '--db', filled_sqlite_url])
+    assert result.exit_code == 1
+    assert 'UNIQUE constraint failed' in result.output
+
+    result = runner.invoke(cli.main, ['tab1', '--explain',
+                                      '--db', filled_sqlite_url])
+    assert result.exit_code == 2
+    result = runner.invoke(cli.main, ['tab1', 'tab2', '--analyze',
+                                      '--execute', '--db', filled_sqlite_url])
+    assert result.exit_code == 2
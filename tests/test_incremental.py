@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for `sql_insert_writer.incremental`."""
+
+import os
+import sqlite3
+
+from click.testing import CliRunner
+
+from sql_insert_writer import cli, incremental
+from sql_insert_writer.sql_insert_writer import InsertWriter
+
+JOBS = [('tab1', ['tab2']), ('tab3', []), ('tab4', ['tab5'])]
+
+
+def alter(db_url, sql):
+    conn = sqlite3.connect(db_url[len('sqlite:///'):])
+    conn.execute(sql)
+    conn.commit()
+    conn.close()
+
+
+def file_names(paths):
+    return sorted(os.path.basename(path) for path in paths)
+
+
+def test_regenerates_only_changed(sqlite_url, tmpdir):
+    output_dir = str(tmpdir.join('out'))
+    written = incremental.generate_incremental(sqlite_url, JOBS, output_dir)
+    assert file_names(written) == ['tab1.sql', 'tab3.sql', 'tab4.sql']
+    assert incremental.generate_incremental(sqlite_url, JOBS,
+                                            output_dir) == []
+
+    alter(sqlite_url, 'ALTER TABLE tab2 ADD COLUMN col5 text')
+    written = incremental.generate_incremental(sqlite_url, JOBS, output_dir)
+    assert file_names(written) == ['tab1.sql']
+
+    os.remove(os.path.join(output_dir, 'tab3.sql'))
+    written = incremental.generate_incremental(sqlite_url, JOBS, output_dir)
+    assert file_names(written) == ['tab3.sql']
+
+    written = incremental.generate_incremental(sqlite_url, JOBS, output_dir,
+                                               type_cast=True)
+    assert len(written) == 3
+    written = incremental.generate_incremental(sqlite_url, JOBS, output_dir,
+                                               type_cast=True, force=True)
+    assert len(written) == 3
+
+
+def test_unchanged_version_skips_lookup(sqlite_url, tmpdir):
+    output_dir = str(tmpdir.join('out'))
+    with InsertWriter(sqlite_url) as writer:
+        passes = incremental.watch(writer, JOBS, output_dir, interval=0,
+                                   passes=3)
+        assert len(next(passes)) == 3
+        tables_fetched = writer.profiler.counters['tables']
+        assert next(passes) == []
+        assert writer.profiler.counters['tables'] == tables_fetched
+
+        alter(sqlite_url, 'ALTER TABLE tab5 ADD COLUMN col5 text')
+        assert file_names(next(passes)) == ['tab4.sql']
+    with open(os.path.join(output_dir, 'tab4.sql')) as infile:
+        assert 'col5' not in infile.read()  # tab4 has no col5 to fill
+
+
+def test_command_line_incremental(sqlite_url, tmpdir):
+    manifest = tmpdir.join('manifest.txt')
+    manifest.write('tab1 tab2\ntab3\n')
+    output_dir = str(tmpdir.join('out'))
+    args = ['--manifest', str(manifest), '--output-dir', output_dir,
+            '--incremental', '--db', sqlite_url]
+    runner = CliRunner()
+    result = runner.invoke(cli.main, args)
+    assert result.exit_code == 0
+    assert result.output.count('Wrote ') == 2
+    result = runner.invoke(cli.main, args)
+    assert result.exit_code == 0
+    assert 'Wrote ' not in result.output
+
+    result = runner.invoke(cli.main, ['--manifest', str(manifest),
+                                      '--incremental', '--db', sqlite_url])
+    assert result.exit_code == 2
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for `sql_insert_writer.joins`."""
+
+import sqlite3
+
+import pytest
+
+from click.testing import CliRunner
+
+from sql_insert_writer import cli, sql_insert_writer
+from sql_insert_writer.joins import JoinConditionWarning, join_graph, join_tree
+from sql_insert_writer.metadata import ForeignKey
+
+FOREIGN_KEYS = {
+    'pet': [ForeignKey('pet', ('species_id', ), 'species', ('id', )),
+            ForeignKey('pet', ('owner_id', ), 'owner', ('id', ))],
+    'visit': [ForeignKey('visit', ('pet_id', ), 'pet', ('id', ))],
+}
+
+
+def test_join_tree_follows_shortest_paths():
+    sources = ['owner', 'visit', 'species', 'pet']
+    (joins, unreachable) = join_tree(sources,
+                                     join_graph(sources, FOREIGN_KEYS))
+    assert [(table, parent) for (table, parent, _) in joins] == [
+        ('pet', 'owner'), ('visit', 'pet'), ('species', 'pet')]
+    assert joins[0][2] == [[('owner_id', 'id')]]
+    assert unreachable == []
+
+
+def test_build_from_clause():
+    result = sql_insert_writer.build_from_clause(['visit', 'pet', 'owner'],
+                                                 FOREIGN_KEYS)
+    assert result == '\n'.join(['visit',
+                                'JOIN pet ON (visit.pet_id = pet.id)',
+                                'JOIN owner ON (pet.owner_id = owner.id)'])
+
+
+def test_build_from_clause_ambiguous():
+    foreign_keys = {'pet': FOREIGN_KEYS['pet'] + [
+        ForeignKey('pet', ('vet_id', ), 'owner', ('id', ))]}
+    result = sql_insert_writer.build_from_clause(['owner', 'pet'],
+                                                 foreign_keys)
+    assert 'JOIN pet ON (owner.id = pet.owner_id)' in result
+    assert '-- or ON (owner.id = pet.vet_id)' in result
+
+
+def test_no_path_warns():
+    with pytest.warns(JoinConditionWarning):
+        result = sql_insert_writer.build_from_clause(
+            ['pet', 'species', 'tab3'], FOREIGN_KEYS)
+    assert 'JOIN species ON (pet.species_id = species.id)' in result
+    assert '-- No foreign key links tab3 to pet\nJOIN tab3 ON (pet. = tab3.)' \
+        in result
+
+
+def test_generated_joins_run(fk_sqlite_url):
+    conn = sqlite3.connect(fk_sqlite_url[len('sqlite:///'):])
+    conn.executescript('''INSERT INTO species SELECT * FROM staging_species;
+                          INSERT INTO owner SELECT * FROM staging_owner;
+                          INSERT INTO pet SELECT * FROM staging_pet;
+                          DELETE FROM staging_pet;''')
+    conn.commit()
+    result = sql_insert_writer.generate_from_tables(
+        fk_sqlite_url, destination='staging_pet',
+        sources=['owner', 'species', 'pet'])
+    assert 'JOIN pet ON (owner.id = pet.owner_id)' in result
+    assert 'JOIN species ON (pet.species_id = species.id)' in result
+    conn.execute(result)
+    assert conn.execute('SELECT count(*) FROM staging_pet').fetchone() == (1, )
+
+
+def test_command_line_warns(sqlite_url):
+    runner = CliRunner()
+    result = runner.invoke(cli.main, ['tab1', 'tab2', 'tab3', '--db',
+                                      sqlite_url])
+    assert result.exit_code == 0
+    assert 'Warning: No foreign key links tab3 to tab2' in result.output
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for `sql_insert_writer.matching`."""
+
+import random
+import sqlite3
+
+import pytest
+
+from click.testing import CliRunner
+
+from sql_insert_writer import batch, cli, matching, sql_insert_writer
+from sql_insert_writer.metadata import Table
+
+LEGACY_TABLE_DEFINITIONS = [
+    'CREATE TABLE customer (customer_id integer, amount numeric, '
+    'order_qty integer, note text, col2 text)',
+    'CREATE TABLE legacy_customer (CUST_ID integer, AMT numeric, '
+    'ORDER_QUANTITY integer, col1 text)',
+    'CREATE TABLE legacy_extra (cust_id integer, col2 text, '
+    'note_text text)',
+]
+
+# Words shared among many column names, as in real schemas
+VOCABULARY = ('id name code date amount total price qty count status type '
+              'customer order product account invoice payment address city '
+              'country region created updated start end first last number '
+              'note desc').split()
+
+# Abbreviations of those words, some sharing no trigram with the word
+ABBREVIATIONS = 'amt at cnt cust dt nm num pct percent prc qt'.split()
+
+
+@pytest.fixture
+def legacy_sqlite_url(sqlite_url):
+    conn = sqlite3.connect(sqlite_url[len('sqlite:///'):])
+    for definition in LEGACY_TABLE_DEFINITIONS:
+        conn.execute(definition)
+    conn.commit()
+    return sqlite_url
+
+
+def test_name_similarity():
+    similarity = matching.name_similarity
+    tokens = matching.name_tokens
+    assert similarity(tokens('amount'), tokens('AMT')) == 0.8
+    assert similarity(tokens('order_qty'), tokens('ORDER_QUANTITY')) == 0.9
+    assert similarity(tokens('CustomerID'), tokens('customer_id')) == 1.0
+    assert similarity(tokens('col1'), tokens('col2')) < 0.75
+
+
+def test_search_compares_only_candidates(monkeypatch):
+    columns = [['field_{}'.format(number), 'text'] for number in range(1000)]
+    columns.append(['cust_id', 'integer'])
+    index = matching.ColumnIndex([Table.from_rows('wide', columns)])
+    compared = []
+    name_similarity = matching.name_similarity
+
+    def counting_similarity(tokens, other_tokens):
+        compared.append(other_tokens)
+        return name_similarity(tokens, other_tokens)
+
+    monkeypatch.setattr(matching, 'name_similarity', counting_similarity)
+    matches = index.search('customer_id')
+    assert [match.column.column_name for match in matches] == ['cust_id']
+    assert len(compared) == 1
+
+
+def test_search_prunes_shared_words(monkeypatch):
+    rng = random.Random(7)
+
+    def random_name():
+        return '_'.join(rng.sample(VOCABULARY + ABBREVIATIONS,
+                                   rng.randint(2, 3)))
+
+    tables = [Table.from_rows('src{}'.format(number),
+                              [[random_name(), 'text'] for _ in range(50)])
+              for number in range(20)]
+    index = matching.ColumnIndex(tables)
+    name_similarity = matching.name_similarity
+    compared = []
+
+    def counting_similarity(tokens, other_tokens):
+        compared.append(other_tokens)
+        return name_similarity(tokens, other_tokens)
+
+    monkeypatch.setattr(matching, 'name_similarity', counting_similarity)
+    for _ in range(200):
+        column_name = random_name()
+        tokens = matching.name_tokens(column_name)
+        scored = [matching.Match(col, name_similarity(tokens, col_tokens))
+                  for (col, col_tokens) in index.tokens.items()]
+        expected = {match for match in scored if match.confidence >= 0.75}
+        assert set(index.search(column_name)) == expected
+    # Nearly every column shares a word with every name; few are scored
+    assert len(compared) < 200 * 50
+
+
+def test_search_finds_abbreviations_without_shared_trigrams(tmpdir):
+    index = matching.ColumnIndex([Table.from_rows('src', [['pct', 'int'],
+                                                          ['at', 'int']])])
+    assert [(match.column.column_name, match.confidence)
+            for match in index.search('percent')] == [('pct', 0.8)]
+    assert [match.column.column_name
+            for match in index.search('amount')] == ['at']
+
+    db_file = str(tmpdir.join('abbreviations.db'))
+    conn = sqlite3.connect(db_file)
+    conn.execute('CREATE TABLE dst (percent integer)')
+    conn.execute('CREATE TABLE src (pct integer)')
+    conn.commit()
+    result = CliRunner().invoke(cli.main, ['dst', 'src', '--approximate',
+                                           '--db', 'sqlite:///' + db_file])
+    assert result.exit_code == 0
+    assert '  pct  -- ==> percent (match 0.80)' in result.output
+
+
+def test_approximate_matches():
+    columns = {
+        'dest': Table.from_rows('dest', [['customer_id', 'integer'],
+                                         ['cust_name', 'text'],
+                                         ['amount', 'numeric']]),
+        'src': Table.from_rows('src', [['cust_id', 'integer'],
+                                       ['customer_name', 'text'],
+                                       ['AMT', 'numeric']]),
+    }
+    (source_columns, confidences) = sql_insert_writer.match_source_columns(
+        'dest', ['src'], columns, threshold=0.75)
+    assert source_columns['customer_id'].column_name == 'cust_id'
+    assert source_columns['cust_name'].column_name == 'customer_name'
+    assert confidences == {'customer_id': 0.95, 'cust_name': 0.95,
+                           'amount': 0.8}
+
+    (_, confidences) = sql_insert_writer.match_source_columns(
+        'dest', ['src'], columns, threshold=0.9)
+    assert sorted(confidences) == ['cust_name', 'customer_id']
+
+
+def test_source_column_used_once():
+    columns = {
+        'dest': Table.from_rows('dest', [['cust_id', 'integer'],
+                                         ['customer', 'integer']]),
+        'src': Table.from_rows('src', [['customer_id', 'integer']]),
+    }
+    (source_columns, confidences) = sql_insert_writer.match_source_columns(
+        'dest', ['src'], columns, threshold=0.5)
+    assert list(confidences) == ['cust_id']
+    assert 'customer' not in source_columns
+
+
+def test_generate_from_tables_approximate(legacy_sqlite_url):
+    result = sql_insert_writer.generate_from_tables(
+        legacy_sqlite_url, 'customer', ['legacy_customer', 'legacy_extra'],
+        match_threshold=matching.DEFAULT_THRESHOLD)
+    assert 'legacy_customer.CUST_ID,  -- ==> customer_id (match 0.95)' \
+        in result
+    assert 'legacy_customer.AMT,  -- ==> amount (match 0.80)' in result
+    assert 'legacy_customer.ORDER_QUANTITY,  -- ==> order_qty ' \
+        '(match 0.90)' in result
+    # An unmatched extra word costs too much confidence
+    assert '  NULL,  -- ==> note' in result
+    # Exact matches are made as before
+    assert 'legacy_extra.col2  -- ==> col2' in result
+
+    result = sql_insert_writer.generate_from_tables(
+        legacy_sqlite_url, 'customer', ['legacy_customer'])
+    assert '  NULL,  -- ==> customer_id' in result
+
+
+def test_batch_approximate(legacy_sqlite_url):
+    results = list(batch.generate_batch(
+        legacy_sqlite_url, [('customer', ['legacy_customer']),
+                            ('customer', ['legacy_extra'])],
+        match_threshold=0.75))
+    assert '  CUST_ID,  -- ==> customer_id (match 0.95)' in results[0][1]
+    assert '  cust_id,  -- ==> customer_id (match 0.95)' in results[1][1]
+
+
+def test_command_line_approximate(legacy_sqlite_url):
+    runner = CliRunner()
+    result = runner.invoke(cli.main, ['customer', 'legacy_customer',
+                                      '--approximate',
+                                      '--match-threshold', '0.85',
+                                      '--db', legacy_sqlite_url])
+    assert result.exit_code == 0
+    assert '  CUST_ID,  -- ==> customer_id (match 0.95)' in result.output
+    assert '  NULL,  -- ==> amount' in result.output
+
+    result = runner.invoke(cli.main, ['customer', 'legacy_customer',
+                                      '--approximate',
+                                      '--match-threshold', '2',
+                                      '--db', legacy_sqlite_url])
+    assert result.exit_code == 2
+    result = runner.invoke(cli.main, ['customer', '--approximate',
+                                      '--db', legacy_sqlite_url])
+    assert result.exit_code == 2
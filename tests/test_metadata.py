@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for `sql_insert_writer.metadata`."""
+
+import json
+
+import pytest
+
+from sql_insert_writer import sql_insert_writer
+from sql_insert_writer.metadata import Column, Table, group_by_table
+
+
+def test_table_is_a_sequence_of_columns():
+    table = Table.from_rows('tab1', [('col1', 'integer'), ('col2', 'text')])
+    assert len(table) == 2
+    assert table[0] == Column('tab1', 'col1', 'integer')
+    assert [col.data_type for col in table] == ['integer', 'text']
+    assert table.column('col2').data_type == 'text'
+    assert table.column('nope') is None
+
+
+def test_table_is_immutable():
+    table = Table.from_rows('tab1', [('col1', 'integer')])
+    with pytest.raises(AttributeError):
+        table.name = 'tab2'
+    with pytest.raises(AttributeError):
+        table.extra = 1
+
+
+def test_round_trip_through_json():
+    table = Table.from_rows('tab1', [('col1', 'integer'), ('col2', 'text')])
+    rows = json.loads(json.dumps(table.to_rows()))
+    assert Table.from_rows('tab1', rows) == table
+
+
+def test_group_by_table():
+    rows = [Column('tab1', 'col1', 'integer'), Column('tab2', 'col1', 'text'),
+            Column('tab1', 'col2', 'text')]
+    result = group_by_table(rows)
+    assert sorted(result) == ['tab1', 'tab2']
+    assert [col.column_name for col in result['tab1']] == ['col1', 'col2']
+
+
+def test_providers_return_tables(sqlite_url):
+    with sql_insert_writer.InsertWriter(sqlite_url) as writer:
+        db = writer.db
+        single = sql_insert_writer.col_data(db, 'tab1')
+        bulk = sql_insert_writer.col_data_bulk(db, ['tab1', 'tab2'])
+    assert isinstance(single, Table)
+    assert all(isinstance(col, Column) for col in single)
+    assert bulk['tab1'] == single
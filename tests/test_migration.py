@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for `sql_insert_writer.migration` and foreign key lookups."""
+
+import os
+import sqlite3
+
+import pytest
+
+from click.testing import CliRunner
+
+from sql_insert_writer import cli, keys, migration
+from sql_insert_writer.metadata import ForeignKey
+from sql_insert_writer.sql_insert_writer import InsertWriter
+
+from helpers import PG_CTL_MISSING, create_fk_tables
+
+JOBS = [('visit', ['staging_visit']), ('pet', ['staging_pet']),
+        ('owner', ['staging_owner']), ('species', ['staging_species'])]
+
+
+def _test_foreign_keys(db_url):
+    with InsertWriter(db_url) as writer:
+        result = keys.foreign_keys(writer.db, ['pet', 'visit', 'species'])
+    assert sorted(result) == ['pet', 'visit']
+    assert sorted(result['pet']) == [
+        ForeignKey('pet', ('owner_id', ), 'owner', ('id', )),
+        ForeignKey('pet', ('species_id', ), 'species', ('id', ))]
+    assert ForeignKey('visit', ('follows_id', ), 'visit',
+                      ('id', )) in result['visit']
+
+
+@pytest.mark.skipif(PG_CTL_MISSING, reason='PostgreSQL not installed locally')
+def test_foreign_keys_pg(pg_url):
+    _test_foreign_keys(create_fk_tables(pg_url))
+
+
+def test_foreign_keys_sqlite(fk_sqlite_url):
+    _test_foreign_keys(fk_sqlite_url)
+
+
+@pytest.mark.skipif(PG_CTL_MISSING, reason='PostgreSQL not installed locally')
+def test_keys_resolve_schemas_pg(pg_url):
+    with InsertWriter(pg_url) as writer:
+        writer.db.query('CREATE SCHEMA other')
+        writer.db.query('CREATE TABLE other.tab1 (id integer primary key, '
+                        'tab2_id integer REFERENCES public.tab2 (col1))')
+        writer.db.query('CREATE TABLE other.tab2 (id integer primary key, '
+                        'tab1_id integer REFERENCES other.tab1 (id))')
+        assert keys.primary_key(writer.db, 'other.tab1') == ['id']
+        assert keys.primary_key(writer.db, 'tab1') == ['col1']
+        result = keys.foreign_keys(writer.db, ['other.tab1', 'other.tab2',
+                                               'tab1', 'tab2'])
+    # Keyed by the names asked for; nothing leaks between same-named tables
+    assert sorted(result) == ['other.tab1', 'other.tab2']
+    assert result['other.tab1'] == [
+        ForeignKey('other.tab1', ('tab2_id', ), 'tab2', ('col1', ))]
+    assert result['other.tab2'] == [
+        ForeignKey('other.tab2', ('tab1_id', ), 'other.tab1', ('id', ))]
+
+
+def test_dependency_levels_ignore_outside_and_self_references():
+    fks = {'pet': [ForeignKey('pet', ('owner_id', ), 'owner', ('id', )),
+                   ForeignKey('pet', ('parent_id', ), 'pet', ('id', ))]}
+    assert migration.dependency_levels(['pet'], fks) == [['pet']]
+
+
+def test_dependency_cycle():
+    fks = {'a': [ForeignKey('a', ('b_id', ), 'b', ('id', ))],
+           'b': [ForeignKey('b', ('a_id', ), 'a', ('id', ))]}
+    with pytest.raises(migration.CyclicDependencyError):
+        migration.dependency_levels(['a', 'b', 'c'], fks)
+
+
+def test_generate_migration_runs_in_order(fk_sqlite_url):
+    levels = migration.generate_migration(fk_sqlite_url, JOBS)
+    assert [[destination for (destination, _) in level]
+            for level in levels] == [['owner', 'species'], ['pet'], ['visit']]
+
+    conn = sqlite3.connect(fk_sqlite_url[len('sqlite:///'):])
+    conn.execute('PRAGMA foreign_keys = ON')
+    for level in levels:
+        for (_, sql) in level:
+            conn.execute(sql)
+    assert conn.execute('SELECT count(*) FROM visit').fetchone() == (1, )
+
+
+def test_command_line_fk_order(fk_sqlite_url, tmpdir):
+    manifest = tmpdir.join('manifest.txt')
+    manifest.write('\n'.join(' '.join([destination] + sources)
+                             for (destination, sources) in JOBS))
+    runner = CliRunner()
+    result = runner.invoke(cli.main, ['--manifest', str(manifest),
+                                      '--fk-order', '--db', fk_sqlite_url])
+    assert result.exit_code == 0
+    assert result.output.index('INSERT INTO owner') < result.output.index(
+        'INSERT INTO pet') < result.output.index('INSERT INTO visit')
+    assert '-- Level 3 of 3' in result.output
+
+    output_dir = str(tmpdir.join('out'))
+    result = runner.invoke(cli.main, ['--manifest', str(manifest),
+                                      '--fk-order', '--output-dir', output_dir,
+                                      '--db', fk_sqlite_url])
+    assert result.exit_code == 0
+    assert sorted(os.listdir(output_dir)) == ['1_owner.sql', '1_species.sql',
+                                              '2_pet.sql', '3_visit.sql']
+
+    result = runner.invoke(cli.main, ['pet', '--fk-order',
+                                      '--db', fk_sqlite_url])
+    assert result.exit_code == 2
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for `sql_insert_writer.partition`."""
+
+import sqlite3
+
+import pytest
+
+from click.testing import CliRunner
+
+from sql_insert_writer import cli, partition
+from sql_insert_writer.sql_insert_writer import InsertWriter
+
+from helpers import PG_CTL_MISSING
+
+
+@pytest.fixture
+def filled_sqlite_url(sqlite_url):
+    conn = sqlite3.connect(sqlite_url[len('sqlite:///'):])
+    conn.executemany('INSERT INTO tab2 (col1, col3, col4) VALUES (?, ?, ?)',
+                     [(i, 'c3-{:03}'.format(i), 'c4') for i in range(1, 101)])
+    conn.commit()
+    return sqlite_url
+
+
+def test_chunks_cover_every_row_once(filled_sqlite_url):
+    statements = partition.generate_chunked(filled_sqlite_url, 'tab1',
+                                            ['tab2'], chunks=4)
+    assert len(statements) == 4
+    assert statements[0].startswith('-- Part 1 of 4')
+    assert 'WHERE col1 >= 26 AND col1 < 51;' in statements[1]
+    conn = sqlite3.connect(filled_sqlite_url[len('sqlite:///'):])
+    for statement in statements:
+        conn.execute(statement)
+    assert conn.execute('SELECT count(*), count(DISTINCT col1) '
+                        'FROM tab1').fetchone() == (100, 100)
+
+
+def test_chunks_on_text_key(filled_sqlite_url):
+    statements = partition.generate_chunked(filled_sqlite_url, 'tab1',
+                                            ['tab2'], chunks=3, key='col3')
+    assert "col3 < 'c3-035' OR col3 IS NULL" in statements[0]
+    assert "col3 >= 'c3-035' AND col3 < 'c3-068'" in statements[1]
+    conn = sqlite3.connect(filled_sqlite_url[len('sqlite:///'):])
+    for statement in statements:
+        conn.execute(statement)
+    assert conn.execute('SELECT count(*) FROM tab1').fetchone() == (100, )
+
+
+@pytest.mark.skipif(PG_CTL_MISSING, reason='PostgreSQL not installed locally')
+def test_text_key_boundaries_pg(pg_url):
+    with InsertWriter(pg_url) as writer:
+        writer.db.query("INSERT INTO tab2 (col3) "
+                        "SELECT 'c3-' || lpad(i::text, 4, '0') "
+                        "FROM generate_series(1, 1000) i")
+        # Before ANALYZE, from ntile(); after, from the histogram
+        unanalyzed = partition.key_boundaries(writer.db, 'tab2', 'col3', 4)
+        writer.db.query('ANALYZE tab2')
+        analyzed = partition.key_boundaries(writer.db, 'public.tab2', 'col3',
+                                            4)
+    assert unanalyzed == ['c3-0251', 'c3-0501', 'c3-0751']
+    assert len(analyzed) == 3
+    assert analyzed == sorted(analyzed)
+
+
+def test_chunks_command_line(filled_sqlite_url):
+    runner = CliRunner()
+    result = runner.invoke(cli.main, ['tab1', 'tab2', 'tab3', '--chunks', 2,
+                                      '--db', filled_sqlite_url])
+    assert result.exit_code == 0
+    assert result.output.count('INSERT INTO tab1') == 2
+    assert 'WHERE tab2.col1 >= 51;' in result.output
+
+    result = runner.invoke(cli.main, ['tab1', '--chunks', 2,
+                                      '--db', filled_sqlite_url])
+    assert result.exit_code == 2
+
+
+def test_hash_partitions_cover_every_row_once(filled_sqlite_url):
+    conn = sqlite3.connect(filled_sqlite_url[len('sqlite:///'):])
+    conn.execute("INSERT INTO tab2 (col1, col3) VALUES (NULL, 'no key')")
+    conn.execute("INSERT INTO tab2 (col1, col3) VALUES (-7, 'negative')")
+    conn.commit()
+    statements = partition.generate_chunked(filled_sqlite_url, 'tab1',
+                                            ['tab2'], chunks=3,
+                                            method='hash')
+    assert len(statements) == 3
+    assert 'WHERE ((col1 % 3) + 3) % 3 = 2;' in statements[2]
+    for statement in statements:
+        conn.execute(statement)
+    assert conn.execute('SELECT count(*), count(DISTINCT col1) '
+                        'FROM tab1').fetchone() == (102, 101)
+
+
+def test_hash_conditions_by_dialect():
+    assert partition.hash_conditions('id', 2, 'mysql://')[0] == (
+        'mod(crc32(id), 2) = 0 OR id IS NULL')
+    with pytest.raises(NotImplementedError):
+        partition.hash_conditions('id', 2, 'oracle://')
+
+
+def test_run_partitioned(filled_sqlite_url):
+    statements = partition.generate_chunked(filled_sqlite_url, 'tab1',
+                                            ['tab2'], chunks=4)
+    statements.append('INSERT INTO no_such_table VALUES (1)')
+    finished = []
+    parts = partition.run_partitioned(filled_sqlite_url, statements,
+                                      workers=2, progress=finished.append)
+    assert sorted(finished, key=lambda part: part.number) == parts
+    assert [part.rowcount for part in parts[:4]] == [25, 25, 25, 25]
+    assert parts[4].number == 5 and parts[4].error is not None
+    conn = sqlite3.connect(filled_sqlite_url[len('sqlite:///'):])
+    assert conn.execute('SELECT count(*) FROM tab1').fetchone() == (100, )
+
+
+def test_run_command_line(filled_sqlite_url):
+    runner = CliRunner()
+    result = runner.invoke(cli.main, ['tab1', 'tab2', '--chunks', 3,
+                                      '--partition-by', 'hash', '--run',
+                                      '--workers', 2,
+                                      '--db', filled_sqlite_url])
+    assert result.exit_code == 0
+    assert 'INSERT INTO' not in result.output
+    assert 'Part 3 of 3: ' in result.output
+    conn = sqlite3.connect(filled_sqlite_url[len('sqlite:///'):])
+    assert conn.execute('SELECT count(*) FROM tab1').fetchone() == (100, )
+
+    result = runner.invoke(cli.main, ['tab1', 'tab2', '--run',
+                                      '--db', filled_sqlite_url])
+    assert result.exit_code == 2
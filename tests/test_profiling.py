@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for `sql_insert_writer.profiling`."""
+
+from sql_insert_writer.profiling import Profiler
+from sql_insert_writer.sql_insert_writer import InsertWriter
+
+
+def test_phases_and_counters():
+    profiler = Profiler()
+    with profiler.phase('render'):
+        pass
+    with profiler.phase('render'):
+        pass
+    profiler.count('queries')
+    profiler.count('queries', 2)
+    assert list(profiler.timings) == ['render']
+    assert profiler.timings['render'] >= 0
+    assert profiler.counters == {'queries': 3}
+    report = profiler.report()
+    assert 'render' in report
+    assert 'total' in report
+    assert 'queries' in report
+
+
+def test_hooks():
+    received = []
+    profiler = Profiler(hooks=[lambda *args: received.append(args)])
+    profiler.count('rows_fetched', 5)
+    with profiler.phase('connect'):
+        pass
+    assert received[0] == ('counter', 'rows_fetched', 5)
+    assert received[1][:2] == ('timing', 'connect')
+
+
+def test_iter_phase_counts_bytes():
+    profiler = Profiler()
+    assert list(profiler.iter_phase('render', ['ab', 'cde'])) == ['ab', 'cde']
+    assert profiler.counters['bytes_rendered'] == 5
+    assert 'render' in profiler.timings
+
+
+def test_insert_writer_profile(sqlite_url):
+    with InsertWriter(sqlite_url) as writer:
+        writer.generate_from_tables('tab1', ['tab2', 'tab3'])
+        writer.generate_from_values('tab1')
+    profiler = writer.profiler
+    assert list(profiler.timings) == ['connect', 'col_data', 'foreign_keys',
+                                      'merge', 'render']
+    assert profiler.counters['queries'] == 2
+    assert profiler.counters['tables'] == 3
+    assert profiler.counters['rows_fetched'] > 3
+    assert profiler.counters['bytes_rendered'] > 0
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for `sql_insert_writer.schema`."""
+
+import pytest
+import records
+
+from click.testing import CliRunner
+
+from sql_insert_writer import cli, sql_insert_writer
+from sql_insert_writer.schema import Schema, load_schema, parse_ddl
+
+from helpers import TABLE_DEFINITIONS
+
+PG_DUMP = '''
+--
+-- PostgreSQL database dump
+--
+
+SET search_path = public, pg_catalog;
+
+CREATE TABLE public.animal (
+    id integer NOT NULL,
+    kg numeric(5,2) DEFAULT 0.0,
+    "Name" character varying(40) COLLATE pg_catalog."default",
+    tags text[],
+    born timestamp(0) without time zone,
+    mood public.mood,
+    CONSTRAINT animal_kg_check CHECK ((kg > (0)::numeric))
+);
+
+ALTER TABLE public.animal OWNER TO postgres;
+'''
+
+
+def test_parse_pg_dump():
+    tables = parse_ddl(PG_DUMP, 'postgresql')
+    assert tables['animal'] is tables['public.animal']
+    assert [(col.column_name, col.data_type) for col in tables['animal']] == [
+        ('id', 'integer'),
+        ('kg', 'numeric'),
+        ('Name', 'character varying'),
+        ('tags', 'ARRAY'),
+        ('born', 'timestamp without time zone'),
+        ('mood', 'USER-DEFINED'),
+    ]
+
+
+def test_parse_ddl_matches_live_sqlite(sqlite_url):
+    tables = parse_ddl(';\n'.join(TABLE_DEFINITIONS), 'sqlite')
+    db = records.Database(sqlite_url)
+    for table_name in ('tab1', 'tab5'):
+        assert [(col.column_name, col.data_type)
+                for col in tables[table_name]] == [
+            (col.column_name, col.data_type)
+            for col in sql_insert_writer.col_data(db, table_name)]
+
+
+def test_generate_from_ddl_file(sqlite_url, tmpdir):
+    ddl_file = tmpdir.join('schema.sql')
+    ddl_file.write(';\n'.join(TABLE_DEFINITIONS) + ';\n')
+    schema = load_schema(str(ddl_file), dialect='sqlite')
+    assert sql_insert_writer.generate_from_tables(
+        None, 'tab1', ['tab2', 'tab3'], schema=schema) == \
+        sql_insert_writer.generate_from_tables(sqlite_url, 'tab1',
+                                               ['tab2', 'tab3'])
+    with pytest.raises(sql_insert_writer.BadDBNameError):
+        sql_insert_writer.generate_from_values(None, 'no_such_table',
+                                               schema=schema)
+
+
+def test_snapshot_round_trip(sqlite_url, tmpdir):
+    snapshot_file = tmpdir.join('schema.json')
+    with snapshot_file.open('w') as outfile:
+        Schema.from_database(sqlite_url, ['tab1', 'tab2']).write(outfile)
+    schema = load_schema(str(snapshot_file))
+    assert schema.dialect == 'sqlite'
+    assert sql_insert_writer.generate_from_values(
+        None, 'tab2', schema=schema) == \
+        sql_insert_writer.generate_from_values(sqlite_url, 'tab2')
+
+
+def test_schema_file_command_line(tmpdir):
+    ddl_file = tmpdir.join('schema.sql')
+    ddl_file.write(PG_DUMP)
+    runner = CliRunner()
+    result = runner.invoke(cli.main, ['animal', '--cast',
+                                      '--schema-file', str(ddl_file)],
+                           env={'DATABASE_URL': None})
+    assert result.exit_code == 0
+    assert 'DEFAULT::numeric,  -- ==> kg' in result.output
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for `sql_insert_writer.server` and `sql_insert_writer.versions`."""
+
+import socket
+import sqlite3
+import threading
+
+import pytest
+from click.testing import CliRunner
+
+from sql_insert_writer import cli, sql_insert_writer
+from sql_insert_writer.server import (InsertServer, ServerError,
+                                      remove_stale_socket, send_request)
+from sql_insert_writer.versions import schema_versions
+
+
+@pytest.fixture
+def server(sqlite_url, tmpdir):
+    socket_path = str(tmpdir.join('sql_insert_writer.sock'))
+    server = InsertServer(socket_path, db_url=sqlite_url)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_schema_versions_sqlite(sqlite_url):
+    with sql_insert_writer.InsertWriter(sqlite_url) as writer:
+        before = schema_versions(writer.db, ['tab1', 'tab2'])
+        writer.db.query('ALTER TABLE tab1 ADD COLUMN col5 text')
+        after = schema_versions(writer.db, ['tab1', 'tab2'])
+    assert before['tab1'] == before['tab2']
+    assert after['tab1'] != before['tab1']
+
+
+def test_serves_statements(server, sqlite_url):
+    result = send_request(server.server_address, {'destination': 'tab1',
+                                                  'sources': ['tab2']})
+    assert result == sql_insert_writer.generate_from_tables(
+        sqlite_url, destination='tab1', sources=['tab2'])
+
+    result = send_request(server.server_address, {'destination': 'tab1',
+                                                  'tuples': 2})
+    assert result.count('NULL  -- ==> col4') == 2
+
+    with pytest.raises(ServerError):
+        send_request(server.server_address, {'destination': 'nonesuch'})
+
+
+def test_schema_change_invalidates(server, sqlite_url):
+    request = {'destination': 'tab1'}
+    assert 'col5' not in send_request(server.server_address, request)
+    writer = server.warm_writer(sqlite_url).writer
+    queries = writer.profiler.counters['queries']
+    send_request(server.server_address, request)
+    # Only the schema version is checked, not the table's metadata
+    assert writer.profiler.counters['queries'] == queries + 1
+
+    conn = sqlite3.connect(sqlite_url[len('sqlite:///'):])
+    conn.execute('ALTER TABLE tab1 ADD COLUMN col5 text')
+    conn.commit()
+    assert 'NULL  -- ==> col5' in send_request(server.server_address,
+                                               request)
+
+
+def test_command_line_client(server):
+    runner = CliRunner()
+    result = runner.invoke(cli.main, ['tab1', 'tab2', '--server',
+                                      server.server_address])
+    assert result.exit_code == 0
+    assert 'tab2' in result.output
+
+    result = runner.invoke(cli.main, ['nonesuch', '--server',
+                                      server.server_address])
+    assert result.exit_code == 1
+    assert 'BadDBNameError' in result.output
+
+    for option in (['--profile'], ['--cache'], ['--concurrency', '2']):
+        result = runner.invoke(cli.main, ['tab1', '--server',
+                                          server.server_address] + option)
+        assert result.exit_code == 2
+
+
+def test_remove_stale_socket(server, tmpdir):
+    with pytest.raises(ServerError):
+        remove_stale_socket(server.server_address)
+    assert send_request(server.server_address, {'destination': 'tab1'})
+
+    stale_path = str(tmpdir.join('stale.sock'))
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(stale_path)
+    listener.close()
+    remove_stale_socket(stale_path)
+    assert not tmpdir.join('stale.sock').exists()
+
+    not_socket = tmpdir.join('not_socket')
+    not_socket.write('')
+    with pytest.raises(ServerError):
+        remove_stale_socket(str(not_socket))
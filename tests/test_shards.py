@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for `sql_insert_writer.shards`."""
+
+import os
+import sqlite3
+
+import pytest
+
+from click.testing import CliRunner
+
+from sql_insert_writer import cli, shards
+from sql_insert_writer.sql_insert_writer import BadDBNameError
+
+from helpers import TABLE_DEFINITIONS
+
+JOBS = [('tab1', ['tab2']), ('tab3', [])]
+
+
+@pytest.fixture
+def shard_urls(tmpdir):
+    """Three shards, the last of whose tab2 has drifted; and an empty one"""
+
+    urls = []
+    for name in ('a', 'b', 'c', 'empty'):
+        path = str(tmpdir.join(name + '.db'))
+        conn = sqlite3.connect(path)
+        if name != 'empty':
+            for table_definition in TABLE_DEFINITIONS:
+                conn.execute(table_definition)
+        if name == 'c':
+            conn.execute('ALTER TABLE tab2 ADD COLUMN col2 text')
+        conn.commit()
+        conn.close()
+        urls.append('sqlite:///' + path)
+    return urls
+
+
+def test_generate_for_shards(shard_urls):
+    (groups, errors) = shards.generate_for_shards(shard_urls, JOBS,
+                                                  max_workers=2)
+    assert [group.db_urls for group in groups] == [shard_urls[:2],
+                                                   shard_urls[2:3]]
+    assert '  NULL,  -- ==> col2' in groups[0].results[0][1]
+    assert '  col2,  -- ==> col2' in groups[1].results[0][1]
+    assert list(errors) == shard_urls[3:]
+    assert isinstance(errors[shard_urls[3]], BadDBNameError)
+
+
+def test_shard_report():
+    groups = [shards.ShardGroup(['sqlite:///a.db', 'postgresql://u:pw@h/d'],
+                                [])]
+    assert list(shards.shard_report(groups, 3)) == [
+        '-- Output 1 of 1: shared by 2 of 3 databases\n'
+        '--   sqlite:///a.db\n'
+        '--   postgresql://u:***@h/d']
+
+
+def test_command_line_shards(shard_urls, tmpdir):
+    shard_list = tmpdir.join('shards.txt')
+    shard_list.write('\n'.join(shard_urls[:3]))
+    runner = CliRunner()
+    result = runner.invoke(cli.main, ['tab1', 'tab2',
+                                      '--shards', str(shard_list)])
+    assert result.exit_code == 0
+    assert result.output.count('INSERT INTO tab1') == 2
+    assert '-- Output 1 of 2: shared by 2 of 3 databases' in result.output
+
+    output_dir = str(tmpdir.join('out'))
+    manifest = tmpdir.join('manifest.txt')
+    manifest.write('tab1 tab2\ntab3\n')
+    result = runner.invoke(cli.main, ['--manifest', str(manifest),
+                                      '--shards', str(shard_list),
+                                      '--output-dir', output_dir])
+    assert result.exit_code == 0
+    assert sorted(os.listdir(os.path.join(output_dir, 'output_1'))) == [
+        'shards.txt', 'tab1.sql', 'tab3.sql']
+    with open(os.path.join(output_dir, 'output_2', 'shards.txt')) as infile:
+        assert infile.read() == shard_urls[2] + '\n'
+
+    shard_list.write('\n'.join(shard_urls))
+    result = runner.invoke(cli.main, ['tab3', '--shards', str(shard_list)])
+    assert result.exit_code == 1
+    assert '1 of 4 databases failed' in result.output
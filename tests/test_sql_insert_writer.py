@@ -3,78 +3,21 @@
 """Tests for `sql_insert_writer` package."""
 
 import os
-import subprocess
 import sqlite3
+import subprocess
+import sys
 import tempfile
 
 import pytest
-import pytest_postgresql
+import records
 
 from click import BadOptionUsage
 from click.testing import CliRunner
 
 from sql_insert_writer import cli, sql_insert_writer
+from sql_insert_writer.cache import SchemaCache
 
-try:
-    subprocess.check_output('command -v pg_ctl', shell=True)
-    PG_CTL_MISSING = False  # sorry for the double-negative, but it's convenient later
-except subprocess.CalledProcessError:
-    PG_CTL_MISSING = True
-
-
-def dsn_to_url(engine, dsn):
-    """
-    Converts a DSN to a SQLAlchemy-style database URL
-
-    pytest_postgresql connection only available in DSN form, like
-    'dbname=tests user=postgres host=127.0.0.1 port=41663'
-    """
-    params = dict(s.split('=') for s in dsn.split())
-    return '{engine}://{user}@{host}:{port}/{dbname}'.format(engine=engine,
-                                                             **params)
-
-
-TABLE_DEFINITIONS = [
-    'CREATE TABLE tab1 (col1 serial primary key, col2 text, col3 text, col4 text)',
-    'CREATE TABLE tab2 (col1 serial primary key, col3 text, col4 text)',
-    'CREATE TABLE tab3 (col1 serial primary key, col2 text, col4 text)',
-    'CREATE TABLE tab4 (col1 serial primary key, col2 text, col3 text)',
-    'CREATE TABLE tab5 (col1 serial primary key, datecol1 date, intcol1 integer, col2 text)',
-    'CREATE TABLE tab5_all_text (col1 serial primary key, datecol1 text, intcol1 text, col2 text)',
-]
-
-# pytest-postgresql works locally, but it contains an unshakeable
-# assumption that it needs to locally manage postgres instances with
-# a local installation of `pg_ctl`, which is incompatible with CircleCI.
-
-
-@pytest.mark.skipif(PG_CTL_MISSING, reason='PostgreSQL not installed locally')
-@pytest.fixture
-def pg_url(postgresql):
-    cur = postgresql.cursor()
-    for table_definition in TABLE_DEFINITIONS:
-        cur.execute(table_definition)
-    postgresql.commit()
-    db_url = dsn_to_url('postgresql', postgresql.dsn)
-    return db_url
-
-
-@pytest.fixture
-def sqlite_url(request):
-    sqlite_file = tempfile.NamedTemporaryFile(delete=False)
-
-    def teardown():
-        os.unlink(sqlite_file.name)
-
-    request.addfinalizer(teardown)
-
-    conn = sqlite3.connect(sqlite_file.name)
-    cur = conn.cursor()
-    for table_definition in TABLE_DEFINITIONS:
-        cur.execute(table_definition)
-    conn.commit()
-    return 'sqlite:///' + sqlite_file.name
-
+from helpers import PG_CTL_MISSING
 
 # test INSERT... VALUES, one tuple
 
@@ -119,6 +62,15 @@ def test_generate_multiple_value_tuples_sqlite(sqlite_url):
     assert result.count('NULL  -- ==> col4') == 4
     assert result.count('VALUES') == 1
 
+
+def test_streamed_value_tuples_match_whole_statement(sqlite_url):
+    chunks = list(sql_insert_writer.iter_generate_from_values(
+        sqlite_url, destination='tab2', number_of_tuples=5000))
+    assert len(chunks) > 2
+    assert ''.join(chunks) == sql_insert_writer.generate_from_values(
+        sqlite_url, destination='tab2', number_of_tuples=5000)
+    assert ''.join(chunks).count('NULL  -- ==> col4') == 5000
+
 # test INSERT INTO... SELECT..., from one table
 
 
@@ -249,6 +201,127 @@ def test_type_casting_insert_from(pg_url):
     assert 'col2  -- ==> col2' in result
 
 
+def _test_col_data_bulk(db_url):
+    db = records.Database(db_url)
+    result = sql_insert_writer.col_data_bulk(db, ['tab1', 'tab5'])
+    assert [col.column_name for col in result['tab1']] == [
+        'col1', 'col2', 'col3', 'col4']
+    assert [col.column_name for col in result['tab5']] == [
+        'col1', 'datecol1', 'intcol1', 'col2']
+    with pytest.raises(sql_insert_writer.BadDBNameError):
+        sql_insert_writer.col_data_bulk(db, ['tab1', 'no_such_table'])
+
+
+@pytest.mark.skipif(PG_CTL_MISSING, reason='PostgreSQL not installed locally')
+def test_col_data_bulk_pg(pg_url):
+    _test_col_data_bulk(pg_url)
+
+
+def test_col_data_bulk_sqlite(sqlite_url):
+    _test_col_data_bulk(sqlite_url)
+
+
+@pytest.mark.skipif(PG_CTL_MISSING, reason='PostgreSQL not installed locally')
+def test_col_data_pg_catalog_matches_info_schema(pg_url):
+    db = records.Database(pg_url)
+    db.query("CREATE DOMAIN dollars AS numeric(10, 2)")
+    db.query("CREATE TYPE mood AS ENUM ('ok', 'meh')")
+    db.query('CREATE TABLE "Odd" (a varchar(5), b int[], c dollars, '
+             'd mood, e timestamp with time zone, f bigserial)')
+    db.query('ALTER TABLE "Odd" DROP COLUMN b')
+    for table_name in ('tab5', 'Odd'):
+        assert sql_insert_writer.col_data_pg_catalog(db, table_name) == \
+            sql_insert_writer.col_data_info_schema(db, table_name)
+
+
+@pytest.mark.skipif(PG_CTL_MISSING, reason='PostgreSQL not installed locally')
+def test_col_data_pg_catalog_resolves_schemas(pg_url):
+    db = records.Database(pg_url)
+    db.query('CREATE SCHEMA other')
+    db.query('CREATE TABLE other.tab1 (other_col text)')
+    result = sql_insert_writer.col_data_bulk(db, ['tab1', 'other.tab1'])
+    assert [col.column_name for col in result['tab1']] == [
+        'col1', 'col2', 'col3', 'col4']
+    assert [col.column_name for col in result['other.tab1']] == ['other_col']
+
+    db.query('CREATE TABLE other.only_other (x text)')
+    with pytest.raises(sql_insert_writer.BadDBNameError):
+        sql_insert_writer.col_data(db, 'only_other')
+    db = records.Database(
+        pg_url, connect_args={'options': '-c search_path=other,public'})
+    assert [col.column_name for col in
+            sql_insert_writer.col_data(db, 'only_other')] == ['x']
+
+
+def test_col_data_sqlite_single_table(sqlite_url):
+    db = records.Database(sqlite_url)
+    result = sql_insert_writer.col_data(db, 'tab2')
+    assert [col.column_name for col in result] == ['col1', 'col3', 'col4']
+    with pytest.raises(sql_insert_writer.BadDBNameError):
+        sql_insert_writer.col_data(db, 'no_such_table')
+
+
+def test_cached_metadata_skips_database(sqlite_url, tmpdir):
+    cache = SchemaCache(directory=str(tmpdir))
+    sql_insert_writer.generate_from_values(sqlite_url, destination='tab1',
+                                           cache=cache)
+    conn = sqlite3.connect(sqlite_url[len('sqlite:///'):])
+    conn.execute('ALTER TABLE tab1 ADD COLUMN col5 text')
+    conn.commit()
+    result = sql_insert_writer.generate_from_values(
+        sqlite_url, destination='tab1', cache=cache)
+    assert 'col5' not in result
+
+    cache.invalidate(sqlite_url, ['tab1'])
+    result = sql_insert_writer.generate_from_values(
+        sqlite_url, destination='tab1', cache=cache)
+    assert 'NULL  -- ==> col5' in result
+
+
+def test_insert_writer_reuses_connection_and_metadata(sqlite_url):
+    with sql_insert_writer.InsertWriter(sqlite_url) as writer:
+        result = writer.generate_from_tables('tab1', ['tab2'])
+        assert result == sql_insert_writer.generate_from_tables(
+            sqlite_url, destination='tab1', sources=['tab2'])
+        db = writer.db
+
+        conn = sqlite3.connect(sqlite_url[len('sqlite:///'):])
+        conn.execute('ALTER TABLE tab1 ADD COLUMN col5 text')
+        conn.commit()
+        assert 'col5' not in writer.generate_from_values('tab1',
+                                                         number_of_tuples=2)
+        assert writer.db is db
+
+        writer.invalidate(['tab1'])
+        assert 'NULL  -- ==> col5' in writer.generate_from_values('tab1')
+    assert not db.open
+
+
+def _test_concurrent_col_data(db_url):
+    table_names = ['tab1', 'tab2', 'tab3', 'tab5']
+    with sql_insert_writer.InsertWriter(db_url, concurrency=3) as writer:
+        result = writer.col_data_for_tables(table_names)
+    with sql_insert_writer.InsertWriter(db_url) as writer:
+        expected = writer.col_data_for_tables(table_names)
+    for table_name in table_names:
+        assert [(col.column_name, col.data_type)
+                for col in result[table_name]] == [
+            (col.column_name, col.data_type) for col in expected[table_name]]
+
+    with pytest.raises(sql_insert_writer.BadDBNameError):
+        with sql_insert_writer.InsertWriter(db_url, concurrency=3) as writer:
+            writer.col_data_for_tables(['tab1', 'no_such_table'])
+
+
+@pytest.mark.skipif(PG_CTL_MISSING, reason='PostgreSQL not installed locally')
+def test_concurrent_col_data_pg(pg_url):
+    _test_concurrent_col_data(pg_url)
+
+
+def test_concurrent_col_data_sqlite(sqlite_url):
+    _test_concurrent_col_data(sqlite_url)
+
+
 @pytest.mark.skip
 def omit_autoincrementing_primary_keys(pg_url):
     assert False
@@ -280,12 +353,85 @@ def test_command_line_interface(sqlite_url):
     assert result.exit_code == 0
     assert 'tab2' in result.output
 
+    # test looking up table metadata concurrently
+    concurrent_result = runner.invoke(cli.main, ['tab1', 'tab2', 'tab3',
+                                                 'tab4', '--concurrency', 3,
+                                                 '--db', sqlite_url])
+    assert concurrent_result.exit_code == 0
+    assert concurrent_result.output == result.output
+
     # test that using --tuples with source tables raises nonzero exit code
     result = runner.invoke(cli.main, ['tab1', 'tab2',
                                       '--tuples', 2, '--db', sqlite_url])
     assert result.exit_code == 2
 
+    # test caching metadata, and refreshing it
+    cache_dir = tempfile.mkdtemp()
+    result = runner.invoke(cli.main, ['tab1', '--cache', '--cache-dir',
+                                      cache_dir, '--db', sqlite_url])
+    assert result.exit_code == 0
+    assert os.listdir(cache_dir)
+    result = runner.invoke(cli.main, ['tab1', '--refresh-schema',
+                                      '--cache-dir', cache_dir,
+                                      '--db', sqlite_url])
+    assert result.exit_code == 0
+    assert 'tab1' in result.output
+    result = runner.invoke(cli.main, ['tab1', '--refresh-schema',
+                                      '--cache-dir', cache_dir],
+                           env={'DATABASE_URL': None})
+    assert result.exit_code == 2
+    assert '--refresh-schema only with --db' in result.output
+
+    # test writing to an output file
+    output_file = os.path.join(tempfile.mkdtemp(), 'out.sql')
+    result = runner.invoke(cli.main, ['tab1', '--tuples', 3, '--output',
+                                      output_file, '--db', sqlite_url])
+    assert result.exit_code == 0
+    with open(output_file) as infile:
+        assert infile.read().count('NULL  -- ==> col4') == 3
+
+    # test profiling, whose report goes to stderr
+    result = runner.invoke(cli.main, ['tab1', 'tab2', '--profile', '--output',
+                                      output_file, '--db', sqlite_url])
+    assert result.exit_code == 0
+    assert 'col_data' in result.output
+    assert 'bytes_rendered' in result.output
+
     # test help
     help_result = runner.invoke(cli.main, ['--help'])
     assert help_result.exit_code == 0
     assert 'source' in help_result.output
+
+
+STARTUP_CHECK = """
+import sys
+from sql_insert_writer import cli
+try:
+    cli.main(sys.argv[1:])
+except SystemExit:
+    pass
+heavy = [name for name in ('sqlalchemy', 'records') if name in sys.modules]
+assert not heavy, heavy
+"""
+
+
+def _run_without_database(args, cwd=None):
+    env = dict(os.environ,
+               PYTHONPATH=os.path.dirname(os.path.dirname(
+                   os.path.abspath(__file__))))
+    return subprocess.run([sys.executable, '-c', STARTUP_CHECK] + args,
+                          cwd=cwd, env=env, stdout=subprocess.PIPE,
+                          stderr=subprocess.PIPE, universal_newlines=True)
+
+
+def test_startup_does_not_import_sqlalchemy(tmpdir):
+    """--help and offline runs never load SQLAlchemy"""
+
+    result = _run_without_database(['--help'])
+    assert result.returncode == 0, result.stderr
+
+    tmpdir.join('schema.sql').write('CREATE TABLE tab1 (col1 integer);')
+    result = _run_without_database(['--schema-file', 'schema.sql', 'tab1'],
+                                   cwd=str(tmpdir))
+    assert result.returncode == 0, result.stderr
+    assert 'col1' in result.stdout